@@ -0,0 +1,8 @@
+"""Mediciones de rendimiento para la aplicación de pedidos.
+
+Cada módulo se ejecuta de forma independiente, por ejemplo::
+
+    python -m benchmarks.lote_estados
+
+y escribe sus resultados como JSON en la salida estándar.
+"""
@@ -0,0 +1,135 @@
+"""Compara los perfiles de base ``desarrollo`` y ``produccion`` con carga mixta.
+
+Varios hilos reparten operaciones entre lecturas como la del consumidor
+(estado y ``updated_at`` por clave primaria) y escrituras como las de
+``actualizar/`` (leer el pedido y cambiar su estado dentro de una
+transacción). Cada operación cierra la petición con
+``close_old_connections``, como hace Django al terminar una, así que sin
+``CONN_MAX_AGE`` se abre una conexión nueva por operación. Se cuentan las
+operaciones que fallan con ``database is locked``.
+
+Las dos corridas usan archivos SQLite distintos porque WAL queda guardado
+en el archivo.
+
+Uso::
+
+    python -m benchmarks.base_concurrente [hilos] [operaciones_por_hilo] [porcentaje_escrituras]
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+def _medir(
+    perfil: str, ruta: str, hilos: int, operaciones: int, escrituras: int
+) -> Dict[str, Any]:
+    from django.conf import settings
+    from django.db import OperationalError, close_old_connections, connection, transaction
+    from django.utils import timezone
+
+    from orders.models import Order
+
+    # Se copian las opciones del perfil sobre la base de pruebas en uso, que
+    # comparte el diccionario con ``connection.settings_dict``.
+    base = settings.DATABASES["default"]
+    opciones_perfil = settings.PERFILES_BASE_DISPONIBLES[perfil]
+    base["CONN_MAX_AGE"] = opciones_perfil.get("CONN_MAX_AGE", 0)
+    base["CONN_HEALTH_CHECKS"] = opciones_perfil.get("CONN_HEALTH_CHECKS", False)
+    base["OPTIONS"] = dict(opciones_perfil.get("OPTIONS", {}))
+    base["TEST"]["NAME"] = ruta
+    settings.PEDIDOS_SQLITE_PRAGMAS = settings.PRAGMAS_SQLITE_POR_PERFIL[perfil]
+    connection.close()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    pedidos = [Order.objects.create(customer_name=f"Clienta {indice}").pk for indice in range(100)]
+    estados = Order.ORDEN_ESTADOS
+    cerrojo = threading.Lock()
+    bloqueos = 0
+    lecturas: List[float] = []
+    escritas: List[float] = []
+    conexiones_abiertas = 0
+
+    def trabajar(semilla: int) -> None:
+        nonlocal bloqueos, conexiones_abiertas
+        azar = random.Random(semilla)
+        propias_lecturas: List[float] = []
+        propias_escrituras: List[float] = []
+        propios_bloqueos = 0
+        abiertas = 0
+        try:
+            for _ in range(operaciones):
+                pedido_id = azar.choice(pedidos)
+                escribe = azar.randrange(100) < escrituras
+                if connection.connection is None:
+                    abiertas += 1
+                inicio = time.perf_counter()
+                try:
+                    if escribe:
+                        with transaction.atomic():
+                            pedido = Order.objects.only("status").get(pk=pedido_id)
+                            siguiente = estados[(estados.index(pedido.status) + 1) % len(estados)]
+                            Order.objects.filter(pk=pedido_id).update(
+                                status=siguiente, updated_at=timezone.now()
+                            )
+                    else:
+                        Order.objects.only("status", "updated_at").filter(pk=pedido_id).first()
+                except OperationalError:
+                    propios_bloqueos += 1
+                else:
+                    (propias_escrituras if escribe else propias_lecturas).append(
+                        time.perf_counter() - inicio
+                    )
+                close_old_connections()
+        finally:
+            connection.close()
+            with cerrojo:
+                lecturas.extend(propias_lecturas)
+                escritas.extend(propias_escrituras)
+                bloqueos += propios_bloqueos
+                conexiones_abiertas += abiertas
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(hilos) as ejecutor:
+        list(ejecutor.map(trabajar, range(hilos)))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        "perfil": perfil,
+        "hilos": hilos,
+        "operaciones": hilos * operaciones,
+        "operaciones_por_segundo": (len(lecturas) + len(escritas)) / duracion,
+        "bloqueos": bloqueos,
+        "conexiones_abiertas": conexiones_abiertas,
+        "lectura_p99_ms": percentiles(lecturas)["p99"] * 1000,
+        "escritura_p50_ms": percentiles(escritas)["p50"] * 1000,
+        "escritura_p99_ms": percentiles(escritas)["p99"] * 1000,
+    }
+
+
+def main() -> None:
+    carpeta = tempfile.mkdtemp()
+    preparar_entorno(nombre_base=os.path.join(carpeta, "inicial.sqlite3"))
+
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    operaciones = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    escrituras = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    resultados = [
+        _medir(perfil, os.path.join(carpeta, f"{perfil}.sqlite3"), hilos, operaciones, escrituras)
+        for perfil in ("desarrollo", "produccion")
+    ]
+    reportar("base_concurrente", resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Compara ``group_send`` entre la capa en memoria y la capa local por socket Unix.
+
+Conecta muchas clientas simuladas a ``ConsumidorSeguimientoPedido`` y mide la
+latencia hasta que todas reciben cada difusión y el caudal de mensajes
+entregados. Con la capa local también mide difusiones que salen de otro
+proceso, que es el caso que la capa en memoria no puede cubrir.
+
+Uso::
+
+    python -m benchmarks.capas_canales [clientas] [difusiones]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+def _emisor_externo(ruta: str, grupo: str, difusiones: int, listo: Any, seguir: Any) -> None:
+    """Proceso hijo que difunde por la capa local sin configurar Django."""
+
+    from orders.capa_local import CapaCanalesLocal
+
+    async def emitir() -> None:
+        capa = CapaCanalesLocal(ruta=ruta, autoiniciar=False)
+        await capa.group_send(grupo, {"type": "enviar_actualizacion", "texto": "{}"})
+        listo.set()
+        for _ in range(difusiones):
+            await asyncio.get_running_loop().run_in_executor(None, seguir.wait)
+            seguir.clear()
+            await capa.group_send(grupo, {"type": "enviar_actualizacion", "texto": "{}"})
+            listo.set()
+        await capa.close()
+
+    asyncio.run(emitir())
+
+
+async def _medir(nombre: str, clientas: int, difusiones: int, ruta: str = "") -> Dict[str, Any]:
+    from channels.layers import get_channel_layer
+    from channels.testing import WebsocketCommunicator
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+    from orders.models import Order
+    from orders.servicios import construir_mensaje_difusion, nombre_grupo_pedido
+
+    capa = get_channel_layer()
+    pedido = await Order.objects.acreate(customer_name="Laura")
+    grupo = nombre_grupo_pedido(pedido.pk)
+    mensaje = construir_mensaje_difusion(pedido)
+
+    inicio = time.perf_counter()
+    comunicadores: List[WebsocketCommunicator] = []
+    for _ in range(clientas):
+        comunicador = WebsocketCommunicator(
+            ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+        )
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        comunicadores.append(comunicador)
+    conexiones_por_segundo = clientas / (time.perf_counter() - inicio)
+
+    async def recibir_todas() -> None:
+        await asyncio.gather(*(c.receive_from(timeout=10) for c in comunicadores))
+
+    latencias: List[float] = []
+    inicio = time.perf_counter()
+    for _ in range(difusiones):
+        marca = time.perf_counter()
+        await capa.group_send(grupo, mensaje)
+        await recibir_todas()
+        latencias.append(time.perf_counter() - marca)
+    duracion = time.perf_counter() - inicio
+
+    resultado: Dict[str, Any] = {
+        "capa": nombre,
+        "clientas": clientas,
+        "conexiones_por_segundo": conexiones_por_segundo,
+        "mensajes_entregados_por_segundo": clientas * difusiones / duracion,
+        **{f"{clave}_ms": valor * 1000 for clave, valor in percentiles(latencias).items()},
+    }
+
+    if ruta:
+        contexto = multiprocessing.get_context("spawn")
+        listo, seguir = contexto.Event(), contexto.Event()
+        proceso = contexto.Process(
+            target=_emisor_externo, args=(ruta, grupo, difusiones, listo, seguir)
+        )
+        proceso.start()
+        bucle = asyncio.get_running_loop()
+        await bucle.run_in_executor(None, listo.wait)
+        listo.clear()
+        await recibir_todas()
+
+        latencias_externas: List[float] = []
+        for _ in range(difusiones):
+            marca = time.perf_counter()
+            seguir.set()
+            await recibir_todas()
+            latencias_externas.append(time.perf_counter() - marca)
+            await bucle.run_in_executor(None, listo.wait)
+            listo.clear()
+        await bucle.run_in_executor(None, proceso.join)
+        resultado.update(
+            {
+                f"otro_proceso_{clave}_ms": valor * 1000
+                for clave, valor in percentiles(latencias_externas).items()
+            }
+        )
+
+    for comunicador in comunicadores:
+        await comunicador.disconnect()
+    return resultado
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+    from django.test import override_settings
+
+    clientas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    difusiones = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    ruta = os.path.join(tempfile.mkdtemp(), "canales.sock")
+
+    resultados = []
+    capas = {
+        "memoria": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+        "local": {
+            "BACKEND": "orders.capa_local.CapaCanalesLocal",
+            "CONFIG": {"ruta": ruta, "capacity": 1000},
+        },
+    }
+    for nombre, configuracion in capas.items():
+        with override_settings(CHANNEL_LAYERS={"default": configuracion}):
+            from channels.layers import get_channel_layer
+
+            resultados.append(
+                async_to_sync(_medir)(
+                    nombre, clientas, difusiones, ruta if nombre == "local" else ""
+                )
+            )
+            async_to_sync(get_channel_layer().close)()
+    reportar("capas_canales", resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Carga escalonada de sockets de seguimiento y latencia de difusión.
+
+Abre conexiones a ``/ws/pedidos/<id>/`` en escalones crecientes y, en cada
+escalón, mide cuántas conexiones por segundo se aceptan, cuánta memoria
+residente ocupa cada socket y cuánto tarda un cambio de estado del pedido en
+llegar a cada una de las clientas (p50/p90/p99/máximo) y a la última.
+
+Hay dos modos:
+
+- ``memoria``: ``WebsocketCommunicator`` contra la aplicación ASGI completa en
+  el mismo proceso; los cambios se disparan con
+  ``SujetoPedido.aactualizar_estado``.
+- ``servidor``: un proceso Daphne local con su propia base SQLite de pruebas
+  y clientas WebSocket reales por TCP; los cambios se disparan con un POST a
+  ``pedidos/<id>/definir/``, como lo haría la consola. La memoria se mide en
+  el proceso del servidor.
+
+El resultado es JSON para poder compararlo entre versiones.
+
+Uso::
+
+    python -m benchmarks.carga_websocket [--modo memoria|servidor|ambos]
+        [--escalones 100,500,1000] [--difusiones 20] [--concurrencia 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+_TRAMA_CIERRE = b"\x88\x80" + os.urandom(4)
+
+
+def _ampliar_descriptores() -> None:
+    """Sube el límite blando de archivos abiertos hasta el límite duro."""
+
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if blando < duro:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+
+
+def _memoria_residente(pid: Optional[int] = None) -> int:
+    """Devuelve los bytes residentes del proceso ``pid`` (por defecto, este)."""
+
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as archivo:
+            return int(archivo.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        if pid is not None:
+            return 0
+        # Sin /proc solo queda el máximo histórico del propio proceso.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def _en_paralelo(
+    operaciones: Sequence[Callable[[], Awaitable[Any]]], concurrencia: int
+) -> List[Any]:
+    """Ejecuta las operaciones con a lo sumo ``concurrencia`` a la vez."""
+
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def limitada(operacion: Callable[[], Awaitable[Any]]) -> Any:
+        async with semaforo:
+            return await operacion()
+
+    return await asyncio.gather(*(limitada(operacion) for operacion in operaciones))
+
+
+async def _medir_difusion(
+    disparar: Callable[[], Awaitable[Any]],
+    esperas: Sequence[Callable[[], Awaitable[Any]]],
+) -> Tuple[List[float], float]:
+    """Dispara un cambio y devuelve la latencia de cada clienta y la de la última."""
+
+    latencias: List[float] = []
+
+    async def esperar(recibir: Callable[[], Awaitable[Any]]) -> None:
+        await recibir()
+        latencias.append(time.perf_counter() - marca)
+
+    pendientes = [asyncio.ensure_future(esperar(recibir)) for recibir in esperas]
+    # Deja que cada espera quede suscrita antes de disparar.
+    await asyncio.sleep(0)
+    marca = time.perf_counter()
+    await disparar()
+    await asyncio.gather(*pendientes)
+    return latencias, time.perf_counter() - marca
+
+
+def _resultado(
+    modo: str,
+    conexiones: int,
+    nuevas: int,
+    apertura: float,
+    bytes_por_conexion: float,
+    latencias: List[float],
+    completas: List[float],
+) -> Dict[str, Any]:
+    return {
+        "modo": modo,
+        "conexiones": conexiones,
+        "conexiones_por_segundo": nuevas / apertura if apertura else 0.0,
+        "bytes_por_conexion": bytes_por_conexion,
+        **{f"clienta_{clave}_ms": valor * 1000 for clave, valor in percentiles(latencias).items()},
+        **{f"todas_{clave}_ms": valor * 1000 for clave, valor in percentiles(completas).items()},
+    }
+
+
+async def _carga_en_memoria(
+    escalones: Sequence[int], difusiones: int, concurrencia: int
+) -> List[Dict[str, Any]]:
+    from channels.testing import WebsocketCommunicator
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+    from patrones.asgi import aplicacion
+
+    pedido = await Order.objects.acreate(customer_name="Laura")
+    estados = Order.ORDEN_ESTADOS
+    ruta = f"/ws/pedidos/{pedido.pk}/"
+    comunicadores: List[WebsocketCommunicator] = []
+    cambios = 0
+
+    async def conectar() -> WebsocketCommunicator:
+        comunicador = WebsocketCommunicator(aplicacion, ruta)
+        conectado, _ = await comunicador.connect(timeout=30)
+        if not conectado:
+            raise RuntimeError(f"No se pudo conectar a {ruta}")
+        await comunicador.receive_from(timeout=30)
+        return comunicador
+
+    async def disparar() -> None:
+        await SujetoPedido(pedido).aactualizar_estado(estados[cambios % len(estados)])
+
+    base = _memoria_residente()
+    resultados: List[Dict[str, Any]] = []
+    for escalon in escalones:
+        nuevas = escalon - len(comunicadores)
+        inicio = time.perf_counter()
+        comunicadores.extend(await _en_paralelo([conectar] * nuevas, concurrencia))
+        apertura = time.perf_counter() - inicio
+        bytes_por_conexion = (_memoria_residente() - base) / len(comunicadores)
+
+        latencias: List[float] = []
+        completas: List[float] = []
+        for _ in range(difusiones):
+            cambios += 1
+            por_clienta, completa = await _medir_difusion(
+                disparar, [lambda c=c: c.receive_from(timeout=30) for c in comunicadores]
+            )
+            latencias.extend(por_clienta)
+            completas.append(completa)
+        resultados.append(
+            _resultado(
+                "memoria", len(comunicadores), nuevas, apertura, bytes_por_conexion,
+                latencias, completas,
+            )
+        )
+
+    await asyncio.gather(*(c.disconnect() for c in comunicadores))
+    return resultados
+
+
+class _ClientaWebsocket:
+    """Clienta WebSocket mínima sobre ``asyncio`` que solo lee tramas de texto."""
+
+    def __init__(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        self.lector = lector
+        self.escritor = escritor
+
+    @classmethod
+    async def conectar(cls, puerto: int, ruta: str) -> "_ClientaWebsocket":
+        lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+        clave = base64.b64encode(os.urandom(16)).decode()
+        escritor.write(
+            (
+                f"GET {ruta} HTTP/1.1\r\n"
+                "Host: testserver\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {clave}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        respuesta = await lector.readuntil(b"\r\n\r\n")
+        if b" 101 " not in respuesta.split(b"\r\n", 1)[0]:
+            escritor.close()
+            raise RuntimeError(f"El servidor rechazó el socket: {respuesta[:80]!r}")
+        return cls(lector, escritor)
+
+    async def recibir(self) -> bytes:
+        """Devuelve la carga útil de la siguiente trama de texto."""
+
+        while True:
+            cabecera = await self.lector.readexactly(2)
+            largo = cabecera[1] & 0x7F
+            if largo == 126:
+                (largo,) = struct.unpack("!H", await self.lector.readexactly(2))
+            elif largo == 127:
+                (largo,) = struct.unpack("!Q", await self.lector.readexactly(8))
+            carga = await self.lector.readexactly(largo)
+            if cabecera[0] & 0x0F == 0x1:
+                return carga
+
+    async def cerrar(self) -> None:
+        self.escritor.write(_TRAMA_CIERRE)
+        self.escritor.close()
+        try:
+            await self.escritor.wait_closed()
+        except OSError:
+            pass
+
+
+async def _definir_estado(puerto: int, pedido_id: int, estado: str) -> None:
+    """Cambia el estado del pedido con un POST a la vista de la consola."""
+
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    cuerpo = json.dumps({"estado": estado}).encode()
+    escritor.write(
+        (
+            f"POST /pedidos/{pedido_id}/definir/ HTTP/1.1\r\n"
+            "Host: testserver\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode()
+        + cuerpo
+    )
+    estado_http = await lector.readline()
+    await lector.read()
+    escritor.close()
+    if b" 200 " not in estado_http:
+        raise RuntimeError(f"El POST de estado falló: {estado_http!r}")
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as sonda:
+        sonda.bind(("127.0.0.1", 0))
+        return sonda.getsockname()[1]
+
+
+def _servir(puerto: int, nombre_base: str) -> None:
+    """Proceso hijo: base de pruebas propia y Daphne escuchando en ``puerto``."""
+
+    _ampliar_descriptores()
+    preparar_entorno(nombre_base=nombre_base)
+
+    from orders.models import Order
+
+    pedido = Order.objects.create(customer_name="Laura")
+
+    from daphne.server import Server
+
+    from patrones.asgi import aplicacion
+
+    def listo() -> None:
+        print(json.dumps({"pedido": pedido.pk}), flush=True)
+
+    Server(
+        aplicacion,
+        endpoints=[f"tcp:port={puerto}:interface=127.0.0.1"],
+        ready_callable=listo,
+        verbosity=0,
+    ).run()
+
+
+async def _carga_con_servidor(
+    proceso: subprocess.Popen,
+    puerto: int,
+    pedido_id: int,
+    estados: Sequence[str],
+    escalones: Sequence[int],
+    difusiones: int,
+    concurrencia: int,
+) -> List[Dict[str, Any]]:
+    ruta = f"/ws/pedidos/{pedido_id}/"
+    clientas: List[_ClientaWebsocket] = []
+    cambios = 0
+
+    async def conectar() -> _ClientaWebsocket:
+        clienta = await _ClientaWebsocket.conectar(puerto, ruta)
+        await asyncio.wait_for(clienta.recibir(), 30)
+        return clienta
+
+    async def disparar() -> None:
+        await _definir_estado(puerto, pedido_id, estados[cambios % len(estados)])
+
+    base = _memoria_residente(proceso.pid)
+    resultados: List[Dict[str, Any]] = []
+    for escalon in escalones:
+        nuevas = escalon - len(clientas)
+        inicio = time.perf_counter()
+        clientas.extend(await _en_paralelo([conectar] * nuevas, concurrencia))
+        apertura = time.perf_counter() - inicio
+        bytes_por_conexion = (_memoria_residente(proceso.pid) - base) / len(clientas)
+
+        latencias: List[float] = []
+        completas: List[float] = []
+        for _ in range(difusiones):
+            cambios += 1
+            por_clienta, completa = await _medir_difusion(
+                disparar, [lambda c=c: asyncio.wait_for(c.recibir(), 30) for c in clientas]
+            )
+            latencias.extend(por_clienta)
+            completas.append(completa)
+        resultados.append(
+            _resultado(
+                "servidor", len(clientas), nuevas, apertura, bytes_por_conexion,
+                latencias, completas,
+            )
+        )
+
+    await asyncio.gather(*(clienta.cerrar() for clienta in clientas))
+    return resultados
+
+
+def _medir_con_servidor(
+    escalones: Sequence[int], difusiones: int, concurrencia: int
+) -> List[Dict[str, Any]]:
+    from orders.models import Order
+
+    puerto = _puerto_libre()
+    with tempfile.TemporaryDirectory() as carpeta:
+        proceso = subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.carga_websocket",
+                "--servir", str(puerto), os.path.join(carpeta, "carga.sqlite3"),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            linea = proceso.stdout.readline()
+            if not linea:
+                raise RuntimeError("El servidor Daphne terminó antes de quedar listo")
+            pedido_id = json.loads(linea)["pedido"]
+            return asyncio.run(
+                _carga_con_servidor(
+                    proceso, puerto, pedido_id, Order.ORDEN_ESTADOS,
+                    escalones, difusiones, concurrencia,
+                )
+            )
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+
+def main() -> None:
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument("--modo", choices=("memoria", "servidor", "ambos"), default="ambos")
+    argumentos.add_argument("--escalones", default="100,500,1000")
+    argumentos.add_argument("--difusiones", type=int, default=20)
+    argumentos.add_argument("--concurrencia", type=int, default=50)
+    argumentos.add_argument("--servir", nargs=2, metavar=("PUERTO", "BASE"), help=argparse.SUPPRESS)
+    opciones = argumentos.parse_args()
+
+    if opciones.servir:
+        _servir(int(opciones.servir[0]), opciones.servir[1])
+        return
+
+    _ampliar_descriptores()
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    escalones = sorted(int(escalon) for escalon in opciones.escalones.split(","))
+    resultados: List[Dict[str, Any]] = []
+    if opciones.modo in ("memoria", "ambos"):
+        resultados.extend(
+            async_to_sync(_carga_en_memoria)(escalones, opciones.difusiones, opciones.concurrencia)
+        )
+    if opciones.modo in ("servidor", "ambos"):
+        resultados.extend(
+            _medir_con_servidor(escalones, opciones.difusiones, opciones.concurrencia)
+        )
+    reportar("carga_websocket", resultados)
+
+
+if __name__ == "__main__":
+    main()
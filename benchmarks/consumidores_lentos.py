@@ -0,0 +1,152 @@
+"""Memoria y entrega con clientas de seguimiento que dejan de leer.
+
+Conecta ``lentas`` sockets a un mismo pedido cuyo transporte no acepta
+escrituras hasta el final, más una clienta rápida que mide la latencia de
+cada difusión. Compara dos consumidores:
+
+- ``directo``: el manejador espera ``send`` para cada mensaje, como antes de
+  la cola por conexión; los mensajes se acumulan en la capa de canales hasta
+  su capacidad y los siguientes se pierden.
+- ``combinado``: ``ConsumidorSeguimientoPedido`` con un único estado
+  pendiente por pedido.
+
+Informa la memoria asignada durante las difusiones (``tracemalloc``), los
+mensajes que quedan en la capa, cuántas clientas lentas reciben el último
+estado al destrabarse o fueron cerradas por atrasadas y la latencia de la
+clienta rápida.
+
+Uso::
+
+    python -m benchmarks.consumidores_lentos [lentas] [difusiones]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+async def _medir_variante(
+    nombre: str, base: type, pedido_id: int, textos: List[str], lentas: int, difusiones: int
+) -> Dict[str, Any]:
+    from channels.layers import get_channel_layer
+    from channels.testing import WebsocketCommunicator
+
+    capa = get_channel_layer()
+    compuerta = asyncio.Event()
+    trabadas: List[Any] = []
+
+    class Trabada(base):  # type: ignore[misc, valid-type]
+        async def connect(self) -> None:
+            await super().connect()
+            trabadas.append(self)
+
+        async def send(self, *args: Any, **kwargs: Any) -> None:
+            if self in trabadas:
+                await compuerta.wait()
+            await super().send(*args, **kwargs)
+
+    async def conectar(clase: type) -> Any:
+        comunicador = WebsocketCommunicator(clase.as_asgi(), f"/ws/pedidos/{pedido_id}/")
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido_id}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        return comunicador
+
+    rapida = await conectar(base)
+    lentas_conectadas = [await conectar(Trabada) for _ in range(lentas)]
+
+    grupo = f"pedido_{pedido_id}"
+    latencias: List[float] = []
+    tracemalloc.start()
+    inicial, _ = tracemalloc.get_traced_memory()
+    comienzo = time.perf_counter()
+    for indice in range(difusiones):
+        inicio = time.perf_counter()
+        await capa.group_send(
+            grupo, {"type": "enviar_actualizacion", "texto": textos[indice % len(textos)]}
+        )
+        await rapida.receive_from()
+        latencias.append(time.perf_counter() - inicio)
+    # Deja que las lentas procesen lo que ya tienen en la capa.
+    for _ in range(100):
+        await asyncio.sleep(0)
+    duracion = time.perf_counter() - comienzo
+    actual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    en_capa = sum(
+        capa.channels[consumidor.channel_name].qsize()
+        for consumidor in trabadas
+        if consumidor.channel_name in capa.channels
+    )
+
+    ultimo = textos[(difusiones - 1) % len(textos)]
+    compuerta.set()
+    con_ultimo = recibidos = cerradas = 0
+    for comunicador in lentas_conectadas:
+        mensaje = None
+        while not await comunicador.receive_nothing(timeout=0.01):
+            salida = await comunicador.receive_output()
+            if salida["type"] == "websocket.close":
+                cerradas += 1
+                break
+            mensaje = salida["text"]
+            recibidos += 1
+        con_ultimo += mensaje == ultimo
+        await comunicador.disconnect()
+    await rapida.disconnect()
+
+    return {
+        "consumidor": nombre,
+        "lentas": lentas,
+        "difusiones": difusiones,
+        "memoria_retenida_kb": round((actual - inicial) / 1024, 1),
+        "memoria_pico_kb": round((pico - inicial) / 1024, 1),
+        "mensajes_en_capa": en_capa,
+        "mensajes_por_lenta": recibidos / lentas,
+        "lentas_con_ultimo_estado": con_ultimo,
+        "lentas_cerradas": cerradas,
+        "segundos": round(duracion, 2),
+        "latencia_rapida_ms": {
+            clave: valor * 1000 for clave, valor in percentiles(latencias).items()
+        },
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+    from orders.models import Order
+    from orders.servicios import serializar_evento_seguimiento
+
+    lentas = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    difusiones = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    class ConsumidorDirecto(ConsumidorSeguimientoPedido):
+        async def enviar_actualizacion(self, evento: Dict[str, Any]) -> None:
+            await self.send(text_data=evento["texto"])
+
+    pedido = Order.objects.create(customer_name="Laura")
+    textos = []
+    for estado in Order.ORDEN_ESTADOS:
+        pedido.status = estado
+        textos.append(serializar_evento_seguimiento(pedido))
+
+    resultados = [
+        asyncio.run(_medir_variante(nombre, clase, pedido.pk, textos, lentas, difusiones))
+        for nombre, clase in (
+            ("directo", ConsumidorDirecto),
+            ("combinado", ConsumidorSeguimientoPedido),
+        )
+    ]
+    reportar("consumidores_lentos", resultados)
+
+
+if __name__ == "__main__":
+    main()
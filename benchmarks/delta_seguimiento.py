@@ -0,0 +1,120 @@
+"""Bytes por actualización de seguimiento: evento completo frente a delta.
+
+Primero compara, para cada transición de la máquina de estados, el tamaño en
+UTF-8 del evento completo y del delta y el tiempo de armar el mensaje de
+difusión con y sin delta. Luego conecta ``suscriptoras`` sockets a un pedido,
+recorre los estados con ``SujetoPedido.aactualizar_estado`` y suma los bytes
+que recibe cada clienta con el consumidor actual y con uno que siempre envía
+el evento completo, como antes de los deltas.
+
+Uso::
+
+    python -m benchmarks.delta_seguimiento [suscriptoras] [cambios]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from datetime import timedelta
+from typing import Any, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+_REPETICIONES = 100_000
+
+
+def _medir_formatos() -> List[Dict[str, Any]]:
+    from django.utils import timezone
+
+    from orders.models import Order
+    from orders.servicios import construir_mensaje_difusion
+
+    pedido = Order(pk=1, customer_name="Laura", updated_at=timezone.now())
+    anterior = pedido.updated_at - timedelta(seconds=1)
+    resultados = []
+    for previo, estado in zip(Order.ORDEN_ESTADOS, Order.ORDEN_ESTADOS[1:]):
+        pedido.status = estado
+        mensaje = construir_mensaje_difusion(pedido, anterior)
+        tiempos = {}
+        for nombre, argumentos in (("completo", ()), ("con_delta", (anterior,))):
+            inicio = time.perf_counter()
+            for _ in range(_REPETICIONES):
+                construir_mensaje_difusion(pedido, *argumentos)
+            tiempos[nombre] = (time.perf_counter() - inicio) / _REPETICIONES * 1e6
+        resultados.append(
+            {
+                "transicion": f"{previo}->{estado}",
+                "bytes_completo": len(mensaje["texto"].encode()),
+                "bytes_delta": len(mensaje["delta"].encode()),
+                "armar_mensaje_us": tiempos,
+            }
+        )
+    return resultados
+
+
+async def _medir_sockets(consumidor: type, suscriptoras: int, cambios: int) -> Dict[str, Any]:
+    from channels.testing import WebsocketCommunicator
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    pedido = await Order.objects.acreate(customer_name="Laura")
+    comunicadores = []
+    for _ in range(suscriptoras):
+        comunicador = WebsocketCommunicator(consumidor.as_asgi(), f"/ws/pedidos/{pedido.pk}/")
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        comunicadores.append(comunicador)
+
+    sujeto = SujetoPedido(pedido)
+    estados = Order.ORDEN_ESTADOS
+    total = deltas = 0
+    inicio = time.perf_counter()
+    for indice in range(1, cambios + 1):
+        await sujeto.aactualizar_estado(estados[indice % len(estados)])
+        for comunicador in comunicadores:
+            texto = await comunicador.receive_from()
+            total += len(texto.encode())
+            deltas += texto.startswith('{"tipo":"delta"')
+    duracion = time.perf_counter() - inicio
+
+    for comunicador in comunicadores:
+        await comunicador.disconnect()
+    mensajes = suscriptoras * cambios
+    return {
+        "consumidor": consumidor.__name__,
+        "suscriptoras": suscriptoras,
+        "cambios": cambios,
+        "bytes_por_mensaje": total / mensajes,
+        "bytes_por_cambio": total / cambios,
+        "proporcion_deltas": deltas / mensajes,
+        "ms_por_cambio": duracion / cambios * 1000,
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+
+    suscriptoras = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    cambios = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    class ConsumidorEventoCompleto(ConsumidorSeguimientoPedido):
+        def _elegir_texto(self, clave: int, evento: Dict[str, Any]) -> str:
+            return evento["texto"]
+
+    resultados = _medir_formatos()
+    resultados.extend(
+        async_to_sync(_medir_sockets)(consumidor, suscriptoras, cambios)
+        for consumidor in (ConsumidorEventoCompleto, ConsumidorSeguimientoPedido)
+    )
+    reportar("delta_seguimiento", resultados)
+
+
+if __name__ == "__main__":
+    main()
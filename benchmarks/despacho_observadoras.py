@@ -0,0 +1,83 @@
+"""Compara la notificación secuencial y concurrente con observadoras lentas.
+
+Simula adaptadores de correo, SMS o *webhooks* con una demora fija y mide la
+latencia de ``actualizar_estado`` en cada modo de despacho, con una
+observadora colgada que en modo concurrente queda acotada por su plazo.
+
+Uso::
+
+    python -m benchmarks.despacho_observadoras [observadoras] [demora_ms]
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+class _Adaptador:
+    """Observadora que tarda ``demora`` segundos en notificar."""
+
+    def __init__(self, nombre: str, demora: float) -> None:
+        self.nombre = nombre
+        self.demora = demora
+
+    def actualizar(self, pedido: Any) -> str:
+        time.sleep(self.demora)
+        return f"{self.nombre}: {pedido.status}"
+
+
+def _medir(modo: str, cantidad: int, demora: float, colgada: bool) -> Dict[str, Any]:
+    from django.test import override_settings
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    pedido = Order.objects.create(customer_name="Laura")
+    estados = list(Order.Status.values)
+    adaptadores = [_Adaptador(f"adaptador {indice}", demora) for indice in range(cantidad)]
+    if colgada:
+        adaptadores.insert(0, _Adaptador("colgada", 1.0))
+
+    muestras: List[float] = []
+    with override_settings(
+        PEDIDOS_DESPACHO_OBSERVADORAS=modo, PEDIDOS_OBSERVADORAS_TIEMPO_MAXIMO=demora * 4
+    ):
+        for indice in range(10):
+            sujeto = SujetoPedido(pedido)
+            for adaptador in adaptadores:
+                sujeto.agregar_observadora(adaptador)
+            inicio = time.perf_counter()
+            sujeto.actualizar_estado(estados[indice % len(estados)])
+            muestras.append(time.perf_counter() - inicio)
+
+    return {
+        "modo": modo,
+        "observadoras": len(adaptadores),
+        "con_observadora_colgada": colgada,
+        **{f"{clave}_ms": valor * 1000 for clave, valor in percentiles(muestras).items()},
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+    logging.getLogger("orders.observador").setLevel(logging.CRITICAL)
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    demora = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    reportar(
+        "despacho_observadoras",
+        [
+            _medir(modo, cantidad, demora, colgada)
+            for colgada in (False, True)
+            for modo in ("secuencial", "concurrente")
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
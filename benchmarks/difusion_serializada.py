@@ -0,0 +1,124 @@
+"""Mide el costo de difundir un evento según la cantidad de suscriptoras.
+
+Compara, por el mismo camino de envío (cola por conexión y ``send`` de
+texto), dos consumidores:
+
+- ``por_suscriptora``: el mensaje lleva el diccionario del evento y cada
+  socket lo codifica con :func:`orders.servicios.codificar_json`.
+- ``una_vez``: ``ConsumidorSeguimientoPedido`` reenvía el texto que el sujeto
+  serializó una sola vez con :func:`orders.servicios.construir_mensaje_difusion`.
+
+Las rondas de ambas variantes se alternan y se informa la mediana del tiempo
+de pared y del CPU del proceso por difusión, hasta que todas las suscriptoras
+reciben el mensaje.
+
+Uso::
+
+    python -m benchmarks.difusion_serializada [suscriptoras ...]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+_RONDAS = 50
+
+
+async def _conectar(consumidor: type, pedido_id: int, suscriptoras: int) -> List[Any]:
+    from channels.testing import WebsocketCommunicator
+
+    comunicadores = []
+    for _ in range(suscriptoras):
+        comunicador = WebsocketCommunicator(consumidor.as_asgi(), f"/ws/pedidos/{pedido_id}/")
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido_id}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        comunicadores.append(comunicador)
+    return comunicadores
+
+
+async def _difundir(
+    capa: Any, grupo: str, mensaje: Dict[str, Any], comunicadores: List[Any]
+) -> Tuple[float, float]:
+    pared, cpu = time.perf_counter(), time.process_time()
+    await capa.group_send(grupo, mensaje)
+    await asyncio.gather(*(comunicador.receive_from() for comunicador in comunicadores))
+    return (time.perf_counter() - pared) * 1000, (time.process_time() - cpu) * 1000
+
+
+async def _medir(pedido: Any, suscriptoras: int) -> Dict[str, Any]:
+    from channels.layers import get_channel_layer
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+    from orders.servicios import (
+        codificar_json,
+        construir_evento_seguimiento,
+        construir_mensaje_difusion,
+    )
+
+    class ConsumidorPorSuscriptora(ConsumidorSeguimientoPedido):
+        async def enviar_actualizacion(self, evento: Dict[str, Any]) -> None:
+            await self._encolar(self.pedido_id, codificar_json(evento["contenido"]))
+
+    capa = get_channel_layer()
+    variantes = {
+        "por_suscriptora": (
+            # Cada variante sigue su propio pedido para no recibir la otra.
+            await _conectar(ConsumidorPorSuscriptora, pedido[0].pk, suscriptoras),
+            f"pedido_{pedido[0].pk}",
+            {"type": "enviar_actualizacion", "contenido": construir_evento_seguimiento(pedido[0])},
+        ),
+        "una_vez": (
+            await _conectar(ConsumidorSeguimientoPedido, pedido[1].pk, suscriptoras),
+            f"pedido_{pedido[1].pk}",
+            construir_mensaje_difusion(pedido[1]),
+        ),
+    }
+
+    tiempos: Dict[str, Dict[str, List[float]]] = {
+        nombre: {"pared": [], "cpu": []} for nombre in variantes
+    }
+    for _ in range(_RONDAS):
+        for nombre, (comunicadores, grupo, mensaje) in variantes.items():
+            pared, cpu = await _difundir(capa, grupo, mensaje, comunicadores)
+            tiempos[nombre]["pared"].append(pared)
+            tiempos[nombre]["cpu"].append(cpu)
+
+    for comunicadores, _, _ in variantes.values():
+        for comunicador in comunicadores:
+            await comunicador.disconnect()
+
+    resultado: Dict[str, Any] = {"suscriptoras": suscriptoras}
+    for nombre, medidas in tiempos.items():
+        resultado[nombre] = {
+            "ms_por_difusion": round(statistics.median(medidas["pared"]), 3),
+            "cpu_ms_por_difusion": round(statistics.median(medidas["cpu"]), 3),
+        }
+    return resultado
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    from orders.models import Order
+
+    cantidades = [int(valor) for valor in sys.argv[1:]] or [1, 10, 100, 500]
+    pedidos = [
+        Order.objects.create(customer_name="Laura", status=Order.Status.SHIPPED) for _ in range(2)
+    ]
+    reportar(
+        "difusion_serializada",
+        [async_to_sync(_medir)(pedidos, cantidad) for cantidad in cantidades],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Utilidades compartidas por las mediciones de rendimiento."""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def preparar_entorno(nombre_base: Optional[str] = None) -> None:
+    """Configura Django y crea una base de datos de pruebas aislada.
+
+    Con ``nombre_base`` la base SQLite de pruebas se crea en ese archivo en lugar
+    de en memoria, lo que permite escrituras concurrentes desde varios hilos.
+    """
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "patrones.settings")
+
+    import django
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    if nombre_base is not None:
+        connection.settings_dict["TEST"]["NAME"] = nombre_base
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def cronometrar(funcion: Callable[[], Any], repeticiones: int = 1) -> Tuple[float, Any]:
+    """Ejecuta ``funcion`` y devuelve los segundos promedio y el último resultado."""
+
+    resultado = None
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) / repeticiones, resultado
+
+
+def percentiles(muestras: Sequence[float]) -> Dict[str, float]:
+    """Resume una serie de latencias en segundos con p50, p90 y p99."""
+
+    if not muestras:
+        return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    if len(muestras) == 1:
+        unica = float(muestras[0])
+        return {"p50": unica, "p90": unica, "p99": unica, "max": unica}
+    cortes = statistics.quantiles(muestras, n=100, method="inclusive")
+    return {
+        "p50": cortes[49],
+        "p90": cortes[89],
+        "p99": cortes[98],
+        "max": max(muestras),
+    }
+
+
+def reportar(nombre: str, resultados: List[Dict[str, Any]]) -> None:
+    """Escribe los resultados de una medición como JSON legible por máquinas."""
+
+    json.dump(
+        {"medicion": nombre, "python": sys.version.split()[0], "resultados": resultados},
+        sys.stdout,
+        indent=2,
+        ensure_ascii=False,
+    )
+    sys.stdout.write("\n")
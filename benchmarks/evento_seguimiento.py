@@ -0,0 +1,98 @@
+"""Mide tiempo y memoria por llamada al construir eventos de seguimiento.
+
+Compara la implementación original (que reconstruía etiquetas y pasos en cada
+llamada) con la tabla precalculada de ``orders.servicios``.
+
+Uso::
+
+    python -m benchmarks.evento_seguimiento [llamadas]
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+def _construir_evento_original(pedido: Any) -> Dict[str, Any]:
+    """Copia de referencia de la versión previa a la tabla precalculada."""
+
+    from orders.models import Order
+
+    etiquetas = dict(Order.Status.choices)
+    estados = list(Order.Status.values)
+    try:
+        indice_actual = estados.index(pedido.status)
+    except ValueError:
+        indice_actual = 0
+
+    pasos: List[Dict[str, Any]] = []
+    for indice, estado in enumerate(estados):
+        pasos.append(
+            {
+                "valor": estado,
+                "etiqueta": etiquetas[estado],
+                "alcanzado": indice <= indice_actual,
+            }
+        )
+
+    return {
+        "tipo": "seguimiento",
+        "estado": pedido.status,
+        "descripcion_estado": etiquetas.get(pedido.status, pedido.status),
+        "actualizado": pedido.updated_at.isoformat(),
+        "progreso": {"pasos": pasos},
+    }
+
+
+def _medir(nombre: str, funcion: Callable[[Any], Any], pedido: Any, llamadas: int) -> Dict[str, Any]:
+    """Devuelve microsegundos y bytes retenidos por llamada."""
+
+    segundos = min(timeit.repeat(lambda: funcion(pedido), number=llamadas, repeat=5))
+
+    tracemalloc.start()
+    inicio, _ = tracemalloc.get_traced_memory()
+    retenidos = [funcion(pedido) for _ in range(llamadas)]
+    final, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retenidos
+
+    return {
+        "variante": nombre,
+        "us_por_llamada": segundos / llamadas * 1e6,
+        "bytes_por_evento": (final - inicio) / llamadas,
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.models import Order
+    from orders.servicios import construir_evento_seguimiento, serializar_evento_seguimiento
+
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    pedido = Order.objects.create(customer_name="Laura", status=Order.Status.SHIPPED)
+
+    reportar(
+        "evento_seguimiento",
+        [
+            _medir("original", _construir_evento_original, pedido, llamadas),
+            _medir("precalculado", construir_evento_seguimiento, pedido, llamadas),
+            _medir(
+                "original_json",
+                lambda p: json.dumps(_construir_evento_original(p)),
+                pedido,
+                llamadas,
+            ),
+            _medir("precalculado_json", serializar_evento_seguimiento, pedido, llamadas),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Mide la memoria por flujo abierto de ``pedidos/<id>/eventos/``.
+
+Abre muchos flujos de Server-Sent Events contra la aplicación ASGI de Django
+en el mismo proceso (sin red), espera el primer evento de cada uno y mide con
+``tracemalloc`` los bytes retenidos por flujo inactivo. Luego difunde un
+cambio, mide cuánto tarda en llegar a todos los flujos y los desconecta.
+
+Uso::
+
+    python -m benchmarks.flujos_eventos [flujos]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+class _Clienta:
+    """Clienta ASGI mínima que guarda los fragmentos recibidos del flujo."""
+
+    def __init__(self, ruta: str) -> None:
+        self.alcance = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": ruta,
+            "raw_path": ruta.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+        self.eventos = 0
+        self.primero = asyncio.Event()
+        self.nuevo = asyncio.Event()
+        self._pidio_cuerpo = False
+        self._desconectar = asyncio.Event()
+
+    async def recibir(self) -> Dict[str, Any]:
+        if not self._pidio_cuerpo:
+            self._pidio_cuerpo = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self._desconectar.wait()
+        return {"type": "http.disconnect"}
+
+    async def enviar(self, mensaje: Dict[str, Any]) -> None:
+        if mensaje["type"] == "http.response.body" and b"event: seguimiento" in mensaje.get(
+            "body", b""
+        ):
+            self.eventos += 1
+            self.primero.set()
+            self.nuevo.set()
+
+    def desconectar(self) -> None:
+        self._desconectar.set()
+
+
+async def _medir(cantidad: int) -> List[Dict[str, Any]]:
+    from channels.layers import get_channel_layer
+    from django.core.asgi import get_asgi_application
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    aplicacion = get_asgi_application()
+    pedido = await Order.objects.acreate(customer_name="Laura")
+    ruta = f"/pedidos/{pedido.pk}/eventos/"
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+
+    inicio = time.perf_counter()
+    clientas = [_Clienta(ruta) for _ in range(cantidad)]
+    tareas = [
+        asyncio.create_task(aplicacion(clienta.alcance, clienta.recibir, clienta.enviar))
+        for clienta in clientas
+    ]
+    for clienta in clientas:
+        await clienta.primero.wait()
+    apertura = time.perf_counter() - inicio
+    gc.collect()
+    retenida = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    for clienta in clientas:
+        clienta.nuevo.clear()
+    inicio = time.perf_counter()
+    await SujetoPedido(pedido).aactualizar_estado(Order.Status.SHIPPED)
+    for clienta in clientas:
+        await clienta.nuevo.wait()
+    difusion = time.perf_counter() - inicio
+
+    for clienta in clientas:
+        clienta.desconectar()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    suscriptos = len(get_channel_layer().groups.get(f"pedido_{pedido.pk}", {}))
+
+    return [
+        {
+            "flujos": cantidad,
+            "bytes_por_flujo": retenida / cantidad,
+            "aperturas_por_segundo": cantidad / apertura,
+            "difusion_a_todos_ms": difusion * 1000,
+            "suscripciones_tras_desconectar": suscriptos,
+        }
+    ]
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+    from django.test import override_settings
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with override_settings(
+        CHANNEL_LAYERS={
+            "default": {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": 100, "group_expiry": 86400},
+            }
+        }
+    ):
+        reportar("flujos_eventos", async_to_sync(_medir)(cantidad))
+
+
+if __name__ == "__main__":
+    main()
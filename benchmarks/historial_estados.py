@@ -0,0 +1,106 @@
+"""Mide el costo de registrar el historial de estados y de agregarlo.
+
+Compara cambios de estado con el historial escrito de a un evento por
+``INSERT`` frente al búfer con ``bulk_create`` por lotes, y el tiempo por
+estado calculado en SQL frente a recorrer los eventos en Python.
+
+Uso::
+
+    python -m benchmarks.historial_estados [cambios] [eventos]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List
+
+from benchmarks.entorno import cronometrar, preparar_entorno, reportar
+
+
+def _cambios_por_segundo(tamano_lote: int, cambios: int) -> Dict[str, Any]:
+    from unittest import mock
+
+    from orders import historial
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    registro = historial.HistorialEstados(tamano_lote=tamano_lote, intervalo=60)
+    pedido = Order.objects.create(customer_name="Laura")
+    estados = list(Order.Status.values)
+
+    def cambiar() -> None:
+        for indice in range(cambios):
+            SujetoPedido(pedido).actualizar_estado(estados[indice % len(estados)])
+        registro.vaciar()
+
+    with mock.patch("orders.observador.obtener_historial", return_value=registro):
+        segundos, _ = cronometrar(cambiar)
+    return {
+        "variante": f"historial_lote_{tamano_lote}",
+        "cambios_por_segundo": cambios / segundos,
+        "inserciones": registro.contadores()["lotes"],
+    }
+
+
+def _agregacion(eventos: int) -> List[Dict[str, Any]]:
+    from django.utils import timezone
+
+    from orders.historial import tiempo_en_estados
+    from orders.models import Order, OrderStatusEvent
+
+    aleatorio = random.Random(3)
+    estados = list(Order.Status.values)
+    pedido = Order.objects.create(customer_name="Rosa")
+    ahora = timezone.now()
+    OrderStatusEvent.objects.bulk_create(
+        (
+            OrderStatusEvent(
+                order=pedido,
+                previous_status=aleatorio.choice(estados),
+                status=aleatorio.choice(estados),
+                previous_duration=timedelta(seconds=aleatorio.randint(1, 3600)),
+                created_at=ahora - timedelta(seconds=indice),
+            )
+            for indice in range(eventos)
+        ),
+        batch_size=5000,
+    )
+    desde, hasta = ahora - timedelta(seconds=eventos // 2), ahora
+
+    def en_python() -> Dict[str, timedelta]:
+        totales: Dict[str, timedelta] = defaultdict(timedelta)
+        for evento in OrderStatusEvent.objects.filter(
+            created_at__gte=desde, created_at__lt=hasta
+        ).iterator():
+            totales[evento.previous_status] += evento.previous_duration
+        return totales
+
+    segundos_sql, resumen = cronometrar(lambda: tiempo_en_estados(desde, hasta), 5)
+    segundos_python, totales = cronometrar(en_python)
+    assert all(resumen[estado]["total"] == total for estado, total in totales.items())
+    return [
+        {"variante": "tiempo_en_estados_sql", "eventos": eventos, "ms": segundos_sql * 1000},
+        {"variante": "recorrido_en_python", "eventos": eventos, "ms": segundos_python * 1000},
+    ]
+
+
+def main() -> None:
+    preparar_entorno()
+
+    cambios = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    eventos = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    reportar(
+        "historial_estados",
+        [
+            _cambios_por_segundo(1, cambios),
+            _cambios_por_segundo(100, cambios),
+            *_agregacion(eventos),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compara la latencia p50/p99 de las rutas síncrona y asíncrona del sujeto.
+
+La ruta síncrona reproduce lo que hace una vista síncrona bajo ASGI:
+``sync_to_async`` hacia el hilo de la vista y ``async_to_sync`` para el
+``group_send``. La ruta asíncrona usa ``aactualizar_estado``. También se
+miden las vistas asíncronas completas con POST concurrentes.
+
+Uso::
+
+    python -m benchmarks.latencia_sujeto_asincrono [concurrencia] [peticiones]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+async def _carga(
+    operacion: Callable[[], Awaitable[Any]], concurrencia: int, peticiones: int
+) -> Dict[str, Any]:
+    """Lanza ``peticiones`` operaciones con ``concurrencia`` tareas simultáneas."""
+
+    muestras: List[float] = []
+    restantes = peticiones
+
+    async def trabajadora() -> None:
+        nonlocal restantes
+        while restantes > 0:
+            restantes -= 1
+            inicio = time.perf_counter()
+            await operacion()
+            muestras.append(time.perf_counter() - inicio)
+
+    inicio_total = time.perf_counter()
+    await asyncio.gather(*(trabajadora() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio_total
+    resumen = {clave: valor * 1000 for clave, valor in percentiles(muestras).items()}
+    return {
+        "peticiones_por_segundo": len(muestras) / duracion,
+        **{f"{clave}_ms": valor for clave, valor in resumen.items()},
+    }
+
+
+async def _medir(concurrencia: int, peticiones: int) -> List[Dict[str, Any]]:
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+
+    from orders.models import Order
+    from orders.observador import ObservadoraCliente, SujetoPedido
+
+    pedido = await Order.objects.acreate(customer_name="Laura")
+    estados = list(Order.Status.values)
+    contador = 0
+
+    def sujeto() -> SujetoPedido:
+        nonlocal contador
+        contador += 1
+        instancia = SujetoPedido(pedido)
+        instancia.agregar_observadora(ObservadoraCliente(nombre="Laura"))
+        return instancia
+
+    async def ruta_sincrona() -> None:
+        await sync_to_async(sujeto().actualizar_estado)(estados[contador % len(estados)])
+
+    async def ruta_asincrona() -> None:
+        await sujeto().aactualizar_estado(estados[contador % len(estados)])
+
+    cliente = AsyncClient()
+
+    async def vista_asincrona() -> None:
+        await cliente.post(
+            "/definir/",
+            {"estado": estados[contador % len(estados)]},
+            content_type="application/json",
+        )
+
+    resultados = []
+    for nombre, operacion in (
+        ("sujeto_sincrono", ruta_sincrona),
+        ("sujeto_asincrono", ruta_asincrona),
+        ("vista_definir_asincrona", vista_asincrona),
+    ):
+        resultado = await _carga(operacion, concurrencia, peticiones)
+        resultados.append({"ruta": nombre, "concurrencia": concurrencia, **resultado})
+    return resultados
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    concurrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    peticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    reportar("latencia_sujeto_asincrono", async_to_sync(_medir)(concurrencia, peticiones))
+
+
+if __name__ == "__main__":
+    main()
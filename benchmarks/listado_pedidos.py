@@ -0,0 +1,135 @@
+"""Mide el listado de pedidos sobre una tabla SQLite sembrada con un millón de filas.
+
+Compara la paginación con ``OFFSET`` contra la paginación por cursor del
+listado ``pedidos/``, con y sin los índices de la migración ``0003``. También
+registra el plan de consulta de SQLite, las consultas por página de la vista y
+la búsqueda por nombre de la clienta.
+
+Uso::
+
+    python -m benchmarks.listado_pedidos [filas] [profundidad]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from benchmarks.entorno import cronometrar, preparar_entorno, reportar
+
+_LIMITE = 50
+
+
+def _sembrar(filas: int) -> None:
+    """Inserta ``filas`` pedidos con fechas crecientes y algunas repetidas."""
+
+    from django.db import connection, transaction
+
+    from orders.models import Order
+
+    aleatorio = random.Random(7)
+    estados = list(Order.Status.values)
+    base = datetime(2024, 1, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for inicio in range(0, filas, 50_000):
+            lote = []
+            for indice in range(inicio, min(inicio + 50_000, filas)):
+                fecha = (base + timedelta(seconds=indice // 2)).strftime("%Y-%m-%d %H:%M:%S.%f")
+                lote.append((f"Clienta {indice % 100_000}", aleatorio.choice(estados), fecha, fecha))
+            cursor.executemany(
+                "INSERT INTO orders_order (customer_name, status, created_at, updated_at)"
+                " VALUES (%s, %s, %s, %s)",
+                lote,
+            )
+
+
+def _plan(consulta: Any) -> str:
+    """Devuelve el plan de SQLite resumido en una línea."""
+
+    from django.db import connection
+
+    sql, parametros = consulta.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, parametros)
+        return " | ".join(str(fila[-1]) for fila in cursor.fetchall())
+
+
+def _medir(profundidad: int) -> Dict[str, Any]:
+    from django.db import connection
+    from django.db.models import Q
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from orders.models import Order
+    from orders.servicios import codificar_cursor
+
+    ordenados = Order.objects.filter(status=Order.Status.SHIPPED).order_by("-created_at", "-id")
+    desplazamiento = profundidad * _LIMITE
+    pagina_offset = ordenados.values_list("id", "customer_name", "status", "created_at")[
+        desplazamiento : desplazamiento + _LIMITE
+    ]
+    ultimo_id, ultimo_creado = ordenados.values_list("id", "created_at")[desplazamiento - 1]
+    pagina_cursor = ordenados.filter(
+        Q(created_at__lt=ultimo_creado) | Q(created_at=ultimo_creado, id__lt=ultimo_id),
+        created_at__lte=ultimo_creado,
+    ).values_list("id", "customer_name", "status", "created_at")[:_LIMITE]
+    busqueda = Order.objects.filter(customer_name="Clienta 4242").values_list("id")
+
+    segundos_offset, _ = cronometrar(lambda: list(pagina_offset.all()), 5)
+    segundos_cursor, _ = cronometrar(lambda: list(pagina_cursor.all()), 5)
+    segundos_busqueda, _ = cronometrar(lambda: list(busqueda.all()), 5)
+
+    cliente = Client()
+    cursor = codificar_cursor(ultimo_creado, ultimo_id)
+    with CaptureQueriesContext(connection) as consultas:
+        segundos_vista, respuesta = cronometrar(
+            lambda: cliente.get("/pedidos/", {"estado": "shipped", "cursor": cursor}), 5
+        )
+    assert respuesta.status_code == 200
+
+    return {
+        "profundidad_paginas": profundidad,
+        "offset_ms": segundos_offset * 1000,
+        "cursor_ms": segundos_cursor * 1000,
+        "vista_cursor_ms": segundos_vista * 1000,
+        "consultas_por_pagina_vista": len(consultas) / 5,
+        "busqueda_cliente_ms": segundos_busqueda * 1000,
+        "plan_offset": _plan(pagina_offset),
+        "plan_cursor": _plan(pagina_cursor),
+        "plan_busqueda": _plan(busqueda),
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from django.db import connection
+
+    from orders.models import Order
+
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    profundidad = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    _sembrar(filas)
+
+    resultados: List[Dict[str, Any]] = []
+    indices = Order._meta.indexes
+    with connection.schema_editor() as editor:
+        for indice in indices:
+            editor.remove_index(Order, indice)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    resultados.append({"indices": "sin_indices", "filas": filas, **_medir(profundidad)})
+
+    with connection.schema_editor() as editor:
+        for indice in indices:
+            editor.add_index(Order, indice)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    resultados.append({"indices": "migracion_0003", "filas": filas, **_medir(profundidad)})
+    reportar("listado_pedidos", resultados)
+
+
+if __name__ == "__main__":
+    main()
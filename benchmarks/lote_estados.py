@@ -0,0 +1,69 @@
+"""Compara ``SujetoPedidos.actualizar_estados`` contra un bucle de ``actualizar_estado``.
+
+Uso::
+
+    python -m benchmarks.lote_estados [cantidad ...]
+"""
+
+from __future__ import annotations
+
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.entorno import cronometrar, preparar_entorno, reportar
+
+
+def medir(cantidad: int) -> Dict[str, Any]:
+    """Mide ambas rutas para ``cantidad`` pedidos recién creados."""
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from orders.models import Order
+    from orders.observador import ObservadoraCliente, SujetoPedido, SujetoPedidos
+
+    def crear_pedidos() -> List[Order]:
+        Order.objects.all().delete()
+        Order.objects.bulk_create(
+            Order(customer_name=f"Clienta {indice}") for indice in range(cantidad)
+        )
+        return list(Order.objects.all())
+
+    pedidos = crear_pedidos()
+
+    def ruta_individual() -> None:
+        for pedido in pedidos:
+            sujeto = SujetoPedido(pedido)
+            sujeto.agregar_observadora(ObservadoraCliente(nombre=pedido.customer_name))
+            sujeto.actualizar_estado(Order.Status.SHIPPED)
+
+    with CaptureQueriesContext(connection) as consultas_individuales:
+        segundos_individual, _ = cronometrar(ruta_individual)
+
+    pedidos = crear_pedidos()
+    sujeto_lote = SujetoPedidos()
+    sujeto_lote.agregar_observadora(ObservadoraCliente(nombre="Laura"))
+
+    with CaptureQueriesContext(connection) as consultas_lote:
+        segundos_lote, _ = cronometrar(
+            lambda: sujeto_lote.actualizar_estados(pedidos, Order.Status.SHIPPED)
+        )
+
+    return {
+        "pedidos": cantidad,
+        "individual_s": segundos_individual,
+        "lote_s": segundos_lote,
+        "aceleracion": segundos_individual / segundos_lote if segundos_lote else None,
+        "consultas_individual": len(consultas_individuales),
+        "consultas_lote": len(consultas_lote),
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+    cantidades = [int(valor) for valor in sys.argv[1:]] or [100, 1000, 5000]
+    reportar("lote_estados", [medir(cantidad) for cantidad in cantidades])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Micro-medición de las llamadas calientes de la máquina de estados.
+
+Compara ``obtener_siguiente_estado``, ``esta_completado`` y la validación de
+estados de ``definir/`` con sus versiones previas (lista de ``Status.values``
+con ``.index()`` y ``dict(Order.Status.choices)`` por petición).
+
+Uso::
+
+    python -m benchmarks.maquina_estados [llamadas]
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+from typing import Any, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+def _siguiente_original(pedido: Any) -> str:
+    """Copia de la versión previa de ``obtener_siguiente_estado``."""
+
+    orden_estados = list(pedido.Status.values)
+    try:
+        indice_actual = orden_estados.index(pedido.status)
+    except ValueError:
+        return pedido.Status.PREPARING
+    if indice_actual < len(orden_estados) - 1:
+        return orden_estados[indice_actual + 1]
+    return pedido.status
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.models import Order
+
+    llamadas = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    pedidos = [Order(customer_name="Laura", status=estado) for estado in Order.Status.values]
+
+    casos = {
+        "siguiente_estado": (
+            lambda: [_siguiente_original(p) for p in pedidos],
+            lambda: [p.obtener_siguiente_estado() for p in pedidos],
+        ),
+        "esta_completado": (
+            lambda: [p.status == Order.Status.DELIVERED for p in pedidos],
+            lambda: [p.esta_completado() for p in pedidos],
+        ),
+        "validar_estado_definir": (
+            lambda: [p.status in dict(Order.Status.choices) for p in pedidos],
+            lambda: [p.status in Order.ESTADOS_VALIDOS for p in pedidos],
+        ),
+        "validar_transicion": (
+            lambda: [_siguiente_original(p) == "delivered" for p in pedidos],
+            lambda: [Order.es_transicion_valida(p.status, "delivered") for p in pedidos],
+        ),
+    }
+
+    resultados: List[Dict[str, Any]] = []
+    for nombre, (original, tabla) in casos.items():
+        repeticiones = llamadas // len(pedidos)
+        por_llamada = {
+            variante: min(timeit.repeat(funcion, number=repeticiones, repeat=3))
+            / (repeticiones * len(pedidos))
+            * 1e9
+            for variante, funcion in (("original", original), ("tabla", tabla))
+        }
+        resultados.append(
+            {
+                "llamada": nombre,
+                "original_ns": por_llamada["original"],
+                "tabla_ns": por_llamada["tabla"],
+                "aceleracion": por_llamada["original"] / por_llamada["tabla"],
+            }
+        )
+    reportar("maquina_estados", resultados)
+
+
+if __name__ == "__main__":
+    main()
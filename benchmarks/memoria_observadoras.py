@@ -0,0 +1,83 @@
+"""Mide con ``tracemalloc`` los bytes por observadora de larga vida.
+
+Crea muchas observadoras, les entrega una secuencia de cambios de estado y
+compara la memoria retenida por :class:`ObservadoraCliente` (``dataclass``
+con lista sin límite) y :class:`ObservadoraClienteCompacta` (``__slots__``,
+búfer circular y mensajes armados una vez por estado). También mide el
+tiempo por notificación.
+
+Uso::
+
+    python -m benchmarks.memoria_observadoras [observadoras] [notificaciones]
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+def _medir(nombre: str, crear: Callable[[int], Any], cantidad: int, notificaciones: int) -> Dict[str, Any]:
+    from orders.models import Order
+
+    pedidos = [Order(customer_name="Laura", status=estado) for estado in Order.Status.values]
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    observadoras = [crear(indice) for indice in range(cantidad)]
+    vacias = tracemalloc.get_traced_memory()[0] - base
+
+    inicio = time.perf_counter()
+    for indice in range(notificaciones):
+        pedido = pedidos[indice % len(pedidos)]
+        for observadora in observadoras:
+            observadora.actualizar(pedido)
+    duracion = time.perf_counter() - inicio
+    gc.collect()
+    llenas = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    return {
+        "observadora": nombre,
+        "observadoras": cantidad,
+        "notificaciones_por_observadora": notificaciones,
+        "bytes_por_observadora_vacia": vacias / cantidad,
+        "bytes_por_observadora_tras_notificar": llenas / cantidad,
+        "us_por_notificacion": duracion / (cantidad * notificaciones) * 1e6,
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.observador import ObservadoraCliente, ObservadoraClienteCompacta
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    notificaciones = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reportar(
+        "memoria_observadoras",
+        [
+            _medir(
+                "dataclass_lista",
+                lambda indice: ObservadoraCliente(nombre=f"Clienta {indice}"),
+                cantidad,
+                notificaciones,
+            ),
+            _medir(
+                "slots_bufer_circular",
+                lambda indice: ObservadoraClienteCompacta(nombre=f"Clienta {indice}"),
+                cantidad,
+                notificaciones,
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
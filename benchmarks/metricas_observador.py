@@ -0,0 +1,93 @@
+"""Mide el costo de la instrumentación del observador, encendida y apagada.
+
+Primero cronometra un bloque ``with medir(...)`` vacío frente a un bucle sin
+instrumentar, y luego ``SujetoPedido.actualizar_estado`` completo con las
+métricas apagadas y encendidas. Las variantes se alternan en varias rondas y
+se toma la mejor de cada una para reducir el ruido.
+
+Uso::
+
+    python -m benchmarks.metricas_observador [iteraciones] [cambios]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+_RONDAS = 5
+
+
+def _mejor_por_operacion(funcion: Callable[[], Any], operaciones: int) -> float:
+    """Devuelve los nanosegundos por operación de la mejor ronda."""
+
+    mejor = float("inf")
+    for _ in range(_RONDAS):
+        inicio = time.perf_counter_ns()
+        funcion()
+        mejor = min(mejor, (time.perf_counter_ns() - inicio) / operaciones)
+    return mejor
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders import metricas
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cambios = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    registro = metricas.obtener_metricas()
+    medir = metricas.medir
+
+    def sin_instrumentar() -> None:
+        for _ in range(iteraciones):
+            pass
+
+    def instrumentado() -> None:
+        for _ in range(iteraciones):
+            with medir("etapa"):
+                pass
+
+    pedido = Order.objects.create(customer_name="Laura")
+    sujeto = SujetoPedido(pedido)
+    estados = Order.ORDEN_ESTADOS
+
+    def actualizar() -> None:
+        for indice in range(cambios):
+            sujeto.actualizar_estado(estados[indice % len(estados)])
+
+    base = _mejor_por_operacion(sin_instrumentar, iteraciones)
+    resultados: List[Dict[str, Any]] = []
+    for habilitado in (False, True):
+        registro.habilitado = habilitado
+        resultados.append(
+            {
+                "metricas": "encendidas" if habilitado else "apagadas",
+                "bloque_with_ns": _mejor_por_operacion(instrumentado, iteraciones) - base,
+                "actualizar_estado_us": float("inf"),
+            }
+        )
+    # Las rondas completas se alternan porque el historial y la base crecen.
+    for _ in range(_RONDAS):
+        for resultado in resultados:
+            registro.habilitado = resultado["metricas"] == "encendidas"
+            inicio = time.perf_counter_ns()
+            actualizar()
+            resultado["actualizar_estado_us"] = min(
+                resultado["actualizar_estado_us"],
+                (time.perf_counter_ns() - inicio) / cambios / 1000,
+            )
+    apagadas, encendidas = resultados
+    encendidas["sobrecosto_actualizar_estado"] = (
+        encendidas["actualizar_estado_us"] / apagadas["actualizar_estado_us"] - 1
+    )
+    reportar("metricas_observador", resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Seguir muchos pedidos con un socket por pedido o con un único socket.
+
+Para ``pedidos`` pedidos compara:
+
+- ``sockets``: una conexión a ``ws/pedidos/<id>/`` por pedido.
+- ``multiplex``: una sola conexión a ``ws/pedidos/`` que se suscribe a todos.
+
+Mide el CPU y la memoria (``tracemalloc``, incluye a las clientas de prueba)
+de conectar y recibir las instantáneas iniciales con la caché vacía, y el CPU
+por ronda de difusión de un cambio en cada pedido hasta que llegan todos.
+
+Uso::
+
+    python -m benchmarks.multiplex_seguimiento [pedidos] [rondas]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+async def _conectar_sockets(pedidos: List[int]) -> Tuple[List[Any], Callable[[], Awaitable[None]]]:
+    from channels.testing import WebsocketCommunicator
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+
+    comunicadores = []
+    for pedido_id in pedidos:
+        comunicador = WebsocketCommunicator(
+            ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido_id}/"
+        )
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido_id}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        comunicadores.append(comunicador)
+
+    async def recibir_ronda() -> None:
+        for comunicador in comunicadores:
+            await comunicador.receive_from()
+
+    return comunicadores, recibir_ronda
+
+
+async def _conectar_multiplex(pedidos: List[int]) -> Tuple[List[Any], Callable[[], Awaitable[None]]]:
+    from channels.testing import WebsocketCommunicator
+
+    from orders.consumers import ConsumidorSeguimientoPedidos
+
+    comunicador = WebsocketCommunicator(ConsumidorSeguimientoPedidos.as_asgi(), "/ws/pedidos/")
+    await comunicador.connect()
+    await comunicador.send_json_to({"accion": "suscribir", "pedidos": pedidos})
+    await comunicador.receive_from()
+    for _ in pedidos:
+        await comunicador.receive_from()
+
+    async def recibir_ronda() -> None:
+        for _ in pedidos:
+            await comunicador.receive_from(timeout=5)
+
+    return [comunicador], recibir_ronda
+
+
+async def _medir(
+    nombre: str,
+    conectar: Callable[..., Any],
+    pedidos: List[int],
+    mensajes: List[Tuple[str, Dict[str, Any]]],
+    rondas: int,
+) -> Dict[str, Any]:
+    from channels.layers import get_channel_layer
+
+    from orders.instantaneas import obtener_cache_instantaneas
+
+    capa = get_channel_layer()
+    resultado: Dict[str, Any] = {"variante": nombre, "pedidos": len(pedidos)}
+
+    # Primera pasada sin tracemalloc para el CPU; la segunda mide memoria.
+    for con_memoria in (False, True):
+        obtener_cache_instantaneas().limpiar()
+        if con_memoria:
+            tracemalloc.start()
+        cpu = time.process_time()
+        inicio = time.perf_counter()
+        comunicadores, recibir_ronda = await conectar(pedidos)
+        if con_memoria:
+            actual, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            resultado["memoria_kb"] = round(actual / 1024, 1)
+        else:
+            resultado["conexion_cpu_ms"] = round((time.process_time() - cpu) * 1000, 1)
+            resultado["conexion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            resultado["sockets"] = len(comunicadores)
+            resultado["membresias_de_grupo"] = sum(len(canales) for canales in capa.groups.values())
+
+            cpu = time.process_time()
+            for _ in range(rondas):
+                await asyncio.gather(*(capa.group_send(grupo, mensaje) for grupo, mensaje in mensajes))
+                await recibir_ronda()
+            resultado["ronda_cpu_ms"] = round((time.process_time() - cpu) * 1000 / rondas, 2)
+        for comunicador in comunicadores:
+            await comunicador.disconnect()
+    return resultado
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.models import Order
+    from orders.servicios import construir_mensaje_difusion, nombre_grupo_pedido
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rondas = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    Order.objects.bulk_create(Order(customer_name=f"Clienta {numero}") for numero in range(cantidad))
+    pedidos = list(Order.objects.order_by("pk"))
+    mensajes = [
+        (nombre_grupo_pedido(pedido.pk), construir_mensaje_difusion(pedido)) for pedido in pedidos
+    ]
+    identificadores = [pedido.pk for pedido in pedidos]
+
+    resultados = [
+        asyncio.run(_medir(nombre, conectar, identificadores, mensajes, rondas))
+        for nombre, conectar in (("sockets", _conectar_sockets), ("multiplex", _conectar_multiplex))
+    ]
+    reportar("multiplex_seguimiento", resultados)
+
+
+if __name__ == "__main__":
+    main()
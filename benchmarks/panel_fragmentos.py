@@ -0,0 +1,86 @@
+"""Compara el tiempo de armado del panel del pedido con y sin caché de fragmentos.
+
+Sin caché (``DummyCache``) la plantilla completa se vuelve a dibujar en cada
+petición, como antes. Con la caché en memoria o en archivos solo se dibujan
+las partes que no se guardan. También se mide la primera petición después de
+un cambio de estado, que solo debe renovar la línea de tiempo.
+
+Uso::
+
+    python -m benchmarks.panel_fragmentos [peticiones]
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.entorno import percentiles, preparar_entorno, reportar
+
+
+def _medir(nombre: str, peticiones: int) -> Dict[str, Any]:
+    from django.core.cache import caches
+    from django.test import RequestFactory
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+    from orders.views import PanelPedidoVista
+
+    caches["fragmentos"].clear()
+    vista = PanelPedidoVista.as_view()
+    fabrica = RequestFactory()
+    pedido = Order.objects.create(customer_name="Laura")
+    ruta = f"/pedidos/{pedido.pk}/"
+
+    def dibujar() -> float:
+        inicio = time.perf_counter()
+        vista(fabrica.get(ruta), pedido_id=pedido.pk).render()
+        return time.perf_counter() - inicio
+
+    dibujar()
+    muestras = [dibujar() for _ in range(peticiones)]
+
+    tras_cambio: List[float] = []
+    estados = Order.ORDEN_ESTADOS
+    for indice in range(min(peticiones, 200)):
+        SujetoPedido(pedido).actualizar_estado(estados[(indice + 1) % len(estados)])
+        tras_cambio.append(dibujar())
+
+    return {
+        "cache": nombre,
+        "peticiones": peticiones,
+        "promedio_ms": sum(muestras) / len(muestras) * 1000,
+        **{f"{clave}_ms": valor * 1000 for clave, valor in percentiles(muestras).items()},
+        "tras_cambio_p50_ms": percentiles(tras_cambio)["p50"] * 1000,
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from django.test import override_settings
+
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    variantes = {
+        "sin_cache": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+        "memoria": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "archivo": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(),
+        },
+    }
+    resultados = []
+    for nombre, configuracion in variantes.items():
+        configuracion_caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "fragmentos": configuracion,
+        }
+        with override_settings(CACHES=configuracion_caches):
+            resultados.append(_medir(nombre, peticiones))
+    reportar("panel_fragmentos", resultados)
+
+
+if __name__ == "__main__":
+    main()
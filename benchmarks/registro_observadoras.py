@@ -0,0 +1,125 @@
+"""Compara altas, bajas y notificación con 10 000 observadoras por pedido.
+
+La variante ``lista`` reproduce el almacenamiento anterior de
+``SujetoPedido`` (lista con ``in`` y ``remove``, que compara por igualdad).
+``conjunto`` usa :class:`ConjuntoObservadoras` y ``registro`` suscribe las
+observadoras por pedido en :class:`RegistroObservadoras` con referencias
+débiles, donde la mitad escucha un estado que no cambia y no se recorre.
+
+Uso::
+
+    python -m benchmarks.registro_observadoras [observadoras]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+class _ListaObservadoras:
+    """Copia del almacenamiento previo basado en una lista."""
+
+    def __init__(self) -> None:
+        self._observadoras: List[Any] = []
+
+    def agregar(self, observadora: Any) -> None:
+        if observadora not in self._observadoras:
+            self._observadoras.append(observadora)
+
+    def remover(self, observadora: Any) -> None:
+        if observadora in self._observadoras:
+            self._observadoras.remove(observadora)
+
+    def __iter__(self):
+        return iter(list(self._observadoras))
+
+
+def _medir(
+    nombre: str,
+    agregar: Callable[[Any], None],
+    remover: Callable[[Any], None],
+    recorrer: Callable[[], List[Any]],
+    observadoras: List[Any],
+    pedido: Any,
+) -> Dict[str, Any]:
+    from orders.observador import _notificar_observadoras
+
+    inicio = time.perf_counter()
+    for observadora in observadoras:
+        agregar(observadora)
+    alta = time.perf_counter() - inicio
+
+    notificacion = float("inf")
+    notificadas = 0
+    for _ in range(5):
+        inicio = time.perf_counter()
+        notificadas = len(list(_notificar_observadoras(recorrer(), pedido)))
+        notificacion = min(notificacion, time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for observadora in observadoras:
+        remover(observadora)
+    baja = time.perf_counter() - inicio
+
+    cantidad = len(observadoras)
+    return {
+        "variante": nombre,
+        "observadoras": cantidad,
+        "alta_us_por_observadora": alta / cantidad * 1e6,
+        "baja_us_por_observadora": baja / cantidad * 1e6,
+        "notificacion_ms": notificacion * 1000,
+        "notificadas": notificadas,
+    }
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from orders.models import Order
+    from orders.observador import ObservadoraCliente
+    from orders.registro import ConjuntoObservadoras, RegistroObservadoras
+
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    pedido = Order.objects.create(customer_name="Laura", status=Order.Status.SHIPPED)
+    observadoras = [ObservadoraCliente(nombre=f"Clienta {indice}") for indice in range(cantidad)]
+
+    lista = _ListaObservadoras()
+    conjunto = ConjuntoObservadoras()
+    registro = RegistroObservadoras()
+    estados = (Order.Status.SHIPPED, Order.Status.DELIVERED)
+    estado_de = {id(o): estados[indice % 2] for indice, o in enumerate(observadoras)}
+
+    def agregar_en_registro(observadora: Any) -> None:
+        registro.agregar(observadora, pedido.pk, estado_de[id(observadora)])
+
+    def remover_de_registro(observadora: Any) -> None:
+        registro.remover(observadora, pedido.pk, estado_de[id(observadora)])
+
+    resultados = [
+        _medir("lista", lista.agregar, lista.remover, lambda: list(lista), observadoras, pedido),
+        _medir(
+            "conjunto",
+            conjunto.agregar,
+            conjunto.remover,
+            lambda: list(conjunto),
+            observadoras,
+            pedido,
+        ),
+        _medir(
+            "registro_por_estado",
+            agregar_en_registro,
+            remover_de_registro,
+            lambda: registro.observadoras_para(pedido.pk, pedido.status),
+            observadoras,
+            pedido,
+        ),
+    ]
+    reportar("registro_observadoras", resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compara la ruta del pedido de demostración con las rutas por ``pedido_id``.
+
+La ruta original resuelve cada petición con ``get_or_create`` sobre
+``customer_name="Laura"``; las rutas nuevas hacen una única búsqueda por clave
+primaria con ``.only()``. Se miden peticiones por segundo para ``datos/`` y
+para el tablero, con varias clientas concurrentes.
+
+Uso::
+
+    python -m benchmarks.rutas_por_pedido [concurrencia] [peticiones]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+async def _carga(ruta: str, concurrencia: int, peticiones: int) -> Dict[str, Any]:
+    from django.test import AsyncClient
+
+    restantes = peticiones
+
+    async def trabajadora() -> None:
+        nonlocal restantes
+        cliente = AsyncClient()
+        while restantes > 0:
+            restantes -= 1
+            respuesta = await cliente.get(ruta)
+            assert respuesta.status_code == 200, respuesta.status_code
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajadora() for _ in range(concurrencia)))
+    return {"peticiones_por_segundo": peticiones / (time.perf_counter() - inicio)}
+
+
+async def _medir(concurrencia: int, peticiones: int) -> List[Dict[str, Any]]:
+    from orders.models import Order
+
+    pedido = await Order.objects.acreate(customer_name="Rosa")
+    # El pedido de demostración existe de antemano para medir solo el SELECT.
+    await Order.objects.aget_or_create(customer_name="Laura")
+
+    resultados = []
+    for nombre, ruta in (
+        ("datos_demo_get_or_create", "/datos/"),
+        ("datos_por_pedido", f"/pedidos/{pedido.pk}/datos/"),
+        ("tablero_demo_get_or_create", "/"),
+        ("tablero_por_pedido", f"/pedidos/{pedido.pk}/"),
+    ):
+        resultado = await _carga(ruta, concurrencia, peticiones)
+        resultados.append({"ruta": nombre, "concurrencia": concurrencia, **resultado})
+    return resultados
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    concurrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    peticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    reportar("rutas_por_pedido", async_to_sync(_medir)(concurrencia, peticiones))
+
+
+if __name__ == "__main__":
+    main()
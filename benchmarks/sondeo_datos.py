@@ -0,0 +1,67 @@
+"""Compara el costo de sondear ``datos/`` con y sin validación condicional.
+
+Mide peticiones por segundo y bytes de cuerpo por petición para el GET
+completo y para el GET con ``If-None-Match`` que responde ``304``. También
+cuenta cuántas peticiones hace una clienta en una ventana de tiempo con
+sondeo corto frente a sondeo largo (``?espera=``).
+
+Uso::
+
+    python -m benchmarks.sondeo_datos [peticiones]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+async def _medir(peticiones: int) -> list:
+    from django.test import AsyncClient
+
+    cliente = AsyncClient()
+    primera = await cliente.get("/datos/")
+    etag = primera["ETag"]
+
+    resultados = []
+    for variante, cabeceras in (("completo", None), ("condicional_304", {"if-none-match": etag})):
+        bytes_totales = 0
+        inicio = time.perf_counter()
+        for _ in range(peticiones):
+            respuesta = await cliente.get("/datos/", headers=cabeceras)
+            bytes_totales += len(respuesta.content)
+        duracion = time.perf_counter() - inicio
+        resultados.append(
+            {
+                "variante": variante,
+                "peticiones_por_segundo": peticiones / duracion,
+                "bytes_por_peticion": bytes_totales / peticiones,
+            }
+        )
+
+    ventana = 1.0
+    for variante, parametros in (("sondeo_corto_50ms", None), ("sondeo_largo", {"espera": ventana})):
+        realizadas = 0
+        limite = time.perf_counter() + ventana
+        while time.perf_counter() < limite:
+            await cliente.get("/datos/", parametros, headers={"if-none-match": etag})
+            realizadas += 1
+            if parametros is None:
+                await asyncio.sleep(0.05)
+        resultados.append({"variante": variante, "peticiones_en_1s_sin_cambios": realizadas})
+    return resultados
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    reportar("sondeo_datos", async_to_sync(_medir)(peticiones))
+
+
+if __name__ == "__main__":
+    main()
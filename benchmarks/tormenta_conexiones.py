@@ -0,0 +1,96 @@
+"""Simula una tormenta de reconexiones contra ``ConsumidorSeguimientoPedido``.
+
+Abre muchas conexiones a la vez sobre pocos pedidos y compara la lectura
+original (una consulta por socket) con la caché de instantáneas, tanto en frío
+(los fallos simultáneos comparten consulta) como en caliente.
+
+Uso::
+
+    python -m benchmarks.tormenta_conexiones [conexiones] [pedidos]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+async def _tormenta(consumidor: Any, pedidos: List[int], conexiones: int) -> float:
+    from channels.testing import WebsocketCommunicator
+
+    comunicadores = []
+    for indice in range(conexiones):
+        pedido_id = pedidos[indice % len(pedidos)]
+        comunicador = WebsocketCommunicator(consumidor.as_asgi(), f"/ws/pedidos/{pedido_id}/")
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido_id}}
+        comunicadores.append(comunicador)
+
+    async def conectar(comunicador: Any) -> None:
+        await comunicador.connect()
+        await comunicador.receive_from(timeout=30)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(conectar(c) for c in comunicadores))
+    duracion = time.perf_counter() - inicio
+    await asyncio.gather(*(c.disconnect() for c in comunicadores))
+    return duracion
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from asgiref.sync import async_to_sync
+    from channels.db import database_sync_to_async
+
+    from orders.consumers import ConsumidorSeguimientoPedido
+    from orders.instantaneas import obtener_cache_instantaneas
+    from orders.models import Order
+    from orders.servicios import serializar_evento_seguimiento
+
+    lecturas = 0
+
+    class ConsumidorOriginal(ConsumidorSeguimientoPedido):
+        """Lee el pedido de la base en cada conexión, como antes de la caché."""
+
+        async def _enviar_estado_actual(self) -> None:
+            nonlocal lecturas
+            lecturas += 1
+            pedido = await database_sync_to_async(Order.objects.get)(pk=self.pedido_id)
+            await self.send(text_data=serializar_evento_seguimiento(pedido))
+
+    conexiones = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    cantidad_pedidos = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    pedidos = [
+        Order.objects.create(customer_name=f"Clienta {indice}").pk
+        for indice in range(cantidad_pedidos)
+    ]
+    cache = obtener_cache_instantaneas()
+
+    resultados: List[Dict[str, Any]] = []
+    duracion = async_to_sync(_tormenta)(ConsumidorOriginal, pedidos, conexiones)
+    resultados.append(
+        {"variante": "original", "conexiones_por_segundo": conexiones / duracion, "consultas": lecturas}
+    )
+
+    for variante in ("cache_fria", "cache_caliente"):
+        if variante == "cache_fria":
+            cache.limpiar()
+        cargas_previas = cache.cargas
+        duracion = async_to_sync(_tormenta)(ConsumidorSeguimientoPedido, pedidos, conexiones)
+        resultados.append(
+            {
+                "variante": variante,
+                "conexiones_por_segundo": conexiones / duracion,
+                "consultas": cache.cargas - cargas_previas,
+            }
+        )
+
+    reportar("tormenta_conexiones", resultados)
+
+
+if __name__ == "__main__":
+    main()
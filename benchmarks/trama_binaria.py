@@ -0,0 +1,79 @@
+"""Tamaño y costo de codificar una actualización: JSON frente a la trama binaria.
+
+Para cada estado compara el evento JSON completo, el delta JSON, el evento
+comprimido como lo haría ``permessage-deflate`` sin contexto compartido y la
+trama de :data:`orders.servicios.SUBPROTOCOLO_BINARIO`. Informa también el
+catálogo que la variante binaria envía una vez por conexión.
+
+Uso::
+
+    python -m benchmarks.trama_binaria [repeticiones]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import zlib
+from datetime import timedelta
+from typing import Any, Callable, Dict, List
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+def _desinflar(texto: str) -> bytes:
+    """Comprime un mensaje como ``permessage-deflate`` sin reutilizar el diccionario."""
+
+    compresor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compresor.compress(texto.encode()) + compresor.flush(zlib.Z_SYNC_FLUSH)[:-4]
+
+
+def _microsegundos(funcion: Callable[[], Any], repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main() -> None:
+    preparar_entorno()
+
+    from django.utils import timezone
+
+    from orders.models import Order
+    from orders.servicios import (
+        CATALOGO_BINARIO,
+        empaquetar_estado_binario,
+        serializar_delta_seguimiento,
+        serializar_evento_seguimiento,
+        version_seguimiento,
+    )
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    pedido = Order(pk=1, customer_name="Laura", updated_at=timezone.now())
+    anterior = pedido.updated_at - timedelta(seconds=1)
+
+    resultados: List[Dict[str, Any]] = []
+    for estado in Order.ORDEN_ESTADOS:
+        pedido.status = estado
+        variantes: Dict[str, Callable[[], Any]] = {
+            "json_completo": lambda: serializar_evento_seguimiento(pedido),
+            "json_delta": lambda: serializar_delta_seguimiento(pedido, anterior),
+            "json_desinflado": lambda: _desinflar(serializar_evento_seguimiento(pedido)),
+            "binario": lambda: empaquetar_estado_binario(
+                pedido.status, version_seguimiento(pedido)
+            ),
+        }
+        resultado: Dict[str, Any] = {"estado": estado, "bytes": {}, "codificar_us": {}}
+        for nombre, codificar in variantes.items():
+            datos = codificar()
+            resultado["bytes"][nombre] = len(datos if isinstance(datos, bytes) else datos.encode())
+            resultado["codificar_us"][nombre] = _microsegundos(codificar, repeticiones)
+        resultados.append(resultado)
+
+    resultados.append({"catalogo_por_conexion_bytes": len(CATALOGO_BINARIO)})
+    reportar("trama_binaria", resultados)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Martilla ``actualizar/`` desde muchos hilos y cuenta transiciones repetidas.
+
+Compara el avance anterior (leer, calcular el siguiente estado y guardar sin
+condición) con la vista ``actualizar/``, que usa la comparación atómica de
+:meth:`SujetoPedido.avanzar_estado`.
+Para cada pedido, todos los hilos hacen clic a la vez; el avance es correcto
+si cada estado se notifica una sola vez. Usa una base SQLite en archivo para
+que los hilos escriban con conexiones propias.
+
+Uso::
+
+    python -m benchmarks.transiciones_concurrentes [hilos] [pedidos]
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from benchmarks.entorno import preparar_entorno, reportar
+
+
+def _clic_sin_condicion(pedido_id: int) -> Optional[str]:
+    """Reproduce el avance previo: el guardado no comprueba el estado leído."""
+
+    from orders.models import Order
+    from orders.observador import SujetoPedido
+
+    pedido = Order.objects.only(
+        "customer_name", "status", "status_changed_at", "updated_at"
+    ).get(pk=pedido_id)
+    if pedido.esta_completado():
+        return None
+    SujetoPedido(pedido).actualizar_estado(pedido.obtener_siguiente_estado())
+    return pedido.status
+
+
+def _clic_en_vista(pedido_id: int) -> Optional[str]:
+    """Hace clic en ``actualizar/`` y devuelve el estado alcanzado, si lo hubo."""
+
+    from django.test import Client
+
+    respuesta = Client().post(f"/pedidos/{pedido_id}/actualizar/")
+    if respuesta.status_code != 200:
+        return None
+    datos = respuesta.json()
+    return None if "ya fue entregado" in datos["notificaciones"][0] else datos["estado"]
+
+
+def _medir(nombre: str, clic: Callable[[int], Optional[str]], hilos: int, pedidos: int) -> Dict[str, Any]:
+    from django.db import connection
+
+    from orders.models import Order
+
+    transiciones: Counter = Counter()
+    cerrojo = threading.Lock()
+    duracion = 0.0
+
+    for _ in range(pedidos):
+        pedido_id = Order.objects.create(customer_name="Laura").pk
+        barrera = threading.Barrier(hilos)
+
+        def hacer_clic(_: int) -> None:
+            try:
+                barrera.wait()
+                alcanzado = clic(pedido_id)
+                if alcanzado is not None:
+                    with cerrojo:
+                        transiciones[(pedido_id, alcanzado)] += 1
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(hilos) as ejecutor:
+            list(ejecutor.map(hacer_clic, range(hilos)))
+        duracion += time.perf_counter() - inicio
+
+    return {
+        "avance": nombre,
+        "hilos": hilos,
+        "pedidos": pedidos,
+        "transiciones_notificadas": sum(transiciones.values()),
+        "transiciones_distintas": len(transiciones),
+        "transiciones_repetidas": sum(veces - 1 for veces in transiciones.values()),
+        "clics_por_segundo": hilos * pedidos / duracion,
+    }
+
+
+def main() -> None:
+    ruta = os.path.join(tempfile.mkdtemp(), "transiciones.sqlite3")
+    preparar_entorno(nombre_base=ruta)
+    # Los 409 esperados se registran como avisos por cada clic perdedor.
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    pedidos = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    reportar(
+        "transiciones_concurrentes",
+        [
+            _medir("leer_y_guardar", _clic_sin_condicion, hilos, pedidos),
+            _medir("vista_comparar_y_asignar", _clic_en_vista, hilos, pedidos),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
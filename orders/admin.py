@@ -12,3 +12,5 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ("customer_name", "status", "updated_at")
     list_filter = ("status",)
     search_fields = ("customer_name",)
+    # Evita el ``COUNT(*)`` sobre toda la tabla al filtrar o buscar.
+    show_full_result_count = False
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class OrdersConfig(AppConfig):
@@ -7,3 +8,10 @@ class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "orders"
     verbose_name = "Gestor de pedidos con observador"
+
+    def ready(self) -> None:
+        from .base_datos import configurar_conexion_sqlite
+
+        connection_created.connect(
+            configurar_conexion_sqlite, dispatch_uid="pedidos_configurar_sqlite"
+        )
@@ -0,0 +1,193 @@
+"""Bandeja de salida en memoria para diferir las difusiones por WebSocket."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Set
+
+from asgiref.sync import SyncToAsync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _bucle_del_servidor() -> Optional[asyncio.AbstractEventLoop]:
+    """Devuelve el bucle del servidor ASGI visible desde el hilo actual, si hay uno.
+
+    Desde una corrutina es el bucle en curso; desde el hilo de una vista
+    síncrona es el que ``sync_to_async`` deja registrado para ``async_to_sync``.
+    """
+
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    if getattr(SyncToAsync.threadlocal, "main_event_loop_pid", None) != os.getpid():
+        return None
+    return getattr(SyncToAsync.threadlocal, "main_event_loop", None)
+
+
+class BandejaSalida:
+    """Cola acotada que envía los eventos de los pedidos fuera de la petición.
+
+    Los eventos pendientes se guardan por grupo (``pedido_{pk}``): si llega un
+    estado nuevo para un grupo que todavía no se envió, reemplaza al anterior y
+    solo se difunde el último. Una tarea ``asyncio`` vacía la bandeja, de modo
+    que la respuesta HTTP no espera a la capa de canales.
+
+    La tarea corre en el bucle del servidor ASGI que encoló el evento, porque
+    capas como ``InMemoryChannelLayer`` usan colas ``asyncio`` que solo pueden
+    tocarse desde el bucle de sus consumidores. Únicamente cuando no hay un
+    bucle de servidor (WSGI, comandos de gestión) se recurre a un hilo propio.
+    """
+
+    def __init__(self, capacidad: int = 1000, autoiniciar: bool = True) -> None:
+        self.capacidad = capacidad
+        self.autoiniciar = autoiniciar
+        self.encolados = 0
+        self.fusionados = 0
+        self.descartados = 0
+        self.enviados = 0
+        self._pendientes: Dict[str, Dict[str, Any]] = {}
+        self._cerrojo = threading.Lock()
+        self._vacia = threading.Event()
+        self._vacia.set()
+        self._programada = False
+        self._tareas: Set["asyncio.Task[None]"] = set()
+        self._hilo: Optional[threading.Thread] = None
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._lista = threading.Event()
+
+    def encolar(self, grupo: str, mensaje: Dict[str, Any]) -> bool:
+        """Agrega el mensaje del grupo y devuelve ``False`` si la bandeja está llena."""
+
+        with self._cerrojo:
+            if grupo in self._pendientes:
+                self.fusionados += 1
+            elif len(self._pendientes) >= self.capacidad:
+                self.descartados += 1
+                logger.warning("Bandeja de salida llena, se descarta el evento de %s", grupo)
+                return False
+            self._pendientes[grupo] = mensaje
+            self.encolados += 1
+            self._vacia.clear()
+            programar = not self._programada
+            self._programada = True
+
+        if programar:
+            self._programar(_bucle_del_servidor())
+        return True
+
+    def iniciar(self) -> None:
+        """Arranca el hilo de respaldo que vacía la bandeja si todavía no está corriendo."""
+
+        with self._cerrojo:
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._ejecutar, name="bandeja-salida-pedidos", daemon=True
+                )
+                self._hilo.start()
+            programar = bool(self._pendientes) and not self._programada
+            self._programada = self._programada or programar
+        self._lista.wait()
+        if programar:
+            self._bucle.call_soon_threadsafe(self._lanzar_drenado)
+
+    def esperar_vaciado(self, tiempo_maximo: Optional[float] = None) -> bool:
+        """Bloquea hasta que no queden eventos pendientes de envío."""
+
+        return self._vacia.wait(tiempo_maximo)
+
+    def contadores(self) -> Dict[str, int]:
+        """Devuelve los contadores de eventos encolados, fusionados y descartados."""
+
+        with self._cerrojo:
+            return {
+                "encolados": self.encolados,
+                "fusionados": self.fusionados,
+                "descartados": self.descartados,
+                "enviados": self.enviados,
+                "pendientes": len(self._pendientes),
+            }
+
+    def _programar(self, bucle: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Lanza el vaciado en ``bucle`` o, si no hay ninguno, en el hilo de respaldo."""
+
+        if bucle is not None:
+            try:
+                bucle.call_soon_threadsafe(self._lanzar_drenado)
+                return
+            except RuntimeError:
+                # El bucle ya se cerró: se usa el hilo de respaldo.
+                pass
+        if self._bucle is None:
+            with self._cerrojo:
+                self._programada = False
+            if self.autoiniciar:
+                self.iniciar()
+            return
+        self._bucle.call_soon_threadsafe(self._lanzar_drenado)
+
+    def _lanzar_drenado(self) -> None:
+        """Crea la tarea de vaciado en el bucle actual y conserva su referencia."""
+
+        tarea = asyncio.get_running_loop().create_task(self._drenar())
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def _ejecutar(self) -> None:
+        """Punto de entrada del hilo de respaldo."""
+
+        bucle = asyncio.new_event_loop()
+        asyncio.set_event_loop(bucle)
+        self._bucle = bucle
+        self._lista.set()
+        bucle.run_forever()
+
+    async def _drenar(self) -> None:
+        """Envía los eventos pendientes hasta que la bandeja queda vacía."""
+
+        while True:
+            with self._cerrojo:
+                lote, self._pendientes = self._pendientes, {}
+                if not lote:
+                    self._programada = False
+                    self._vacia.set()
+                    return
+
+            capa = get_channel_layer()
+            if capa is not None:
+                resultados = await asyncio.gather(
+                    *(capa.group_send(grupo, mensaje) for grupo, mensaje in lote.items()),
+                    return_exceptions=True,
+                )
+                for resultado in resultados:
+                    if isinstance(resultado, Exception):
+                        logger.error("No se pudo difundir un evento diferido", exc_info=resultado)
+
+            with self._cerrojo:
+                self.enviados += len(lote)
+
+
+_bandeja_salida: Optional[BandejaSalida] = None
+_cerrojo_bandeja = threading.Lock()
+
+
+def obtener_bandeja_salida() -> Optional[BandejaSalida]:
+    """Devuelve la bandeja del proceso o ``None`` si la difusión diferida está apagada."""
+
+    global _bandeja_salida
+
+    if not getattr(settings, "PEDIDOS_DIFUSION_DIFERIDA", False):
+        return None
+    if _bandeja_salida is None:
+        with _cerrojo_bandeja:
+            if _bandeja_salida is None:
+                _bandeja_salida = BandejaSalida(
+                    capacidad=getattr(settings, "PEDIDOS_BANDEJA_CAPACIDAD", 1000)
+                )
+    return _bandeja_salida
@@ -0,0 +1,23 @@
+"""Ajustes de cada conexión SQLite para convivir con escrituras concurrentes."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+def configurar_conexion_sqlite(sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any) -> None:
+    """Aplica ``PEDIDOS_SQLITE_PRAGMAS`` a cada conexión SQLite nueva.
+
+    Se conecta a ``connection_created``, así que con conexiones persistentes
+    (``CONN_MAX_AGE``) los ``PRAGMA`` se ejecutan una vez por conexión y no
+    una vez por petición. Las bases de otros motores se ignoran.
+    """
+
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "PEDIDOS_SQLITE_PRAGMAS", {})
+    for nombre, valor in pragmas.items():
+        connection.connection.execute(f"PRAGMA {nombre} = {valor}")
@@ -0,0 +1,501 @@
+"""Capa de canales para varios procesos ASGI en un mismo equipo.
+
+Los procesos se conectan por un socket Unix a un concentrador que conoce los
+grupos y reenvía cada mensaje al proceso dueño del canal de destino. No hace
+falta ningún servicio externo: el primer proceso que obtiene el cerrojo del
+archivo ``<ruta>.lock`` aloja el concentrador y el resto se conecta a él. Si
+ese proceso termina, otro toma su lugar y las suscripciones se reenvían.
+
+Se configura desde ``CHANNEL_LAYERS``::
+
+    "BACKEND": "orders.capa_local.CapaCanalesLocal",
+    "CONFIG": {"ruta": "/run/patrones/canales.sock"},
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import copy
+import fcntl
+import json
+import logging
+import os
+import random
+import string
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from typing import IO, Any, Awaitable, Dict, List, Optional, Set, TypeVar
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_CABECERA = struct.Struct("!I")
+_LIMITE_BUFFER_ESCRITURA = 8 * 1024 * 1024
+
+
+def ruta_por_defecto() -> str:
+    """Ruta del socket usada cuando la configuración no indica otra."""
+
+    return os.path.join(tempfile.gettempdir(), "patrones-canales.sock")
+
+
+def tomar_cerrojo_concentrador(ruta: str) -> Optional[IO[str]]:
+    """Toma el cerrojo que da derecho a alojar el concentrador de ``ruta``.
+
+    Devuelve el archivo abierto, que debe mantenerse vivo mientras dure el
+    concentrador, o ``None`` si otro proceso ya lo tiene.
+    """
+
+    archivo = open(f"{ruta}.lock", "a")
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        archivo.close()
+        return None
+    return archivo
+
+
+def _clave_ruta(canal: str) -> str:
+    """Devuelve la parte del canal que identifica al proceso que lo recibe."""
+
+    indice = canal.find("!")
+    return canal[: indice + 1] if indice >= 0 else canal
+
+
+def _por_defecto(valor: Any) -> Any:
+    if isinstance(valor, bytes):
+        return {"__bytes__": base64.b64encode(valor).decode("ascii")}
+    raise TypeError(f"No se puede enviar {type(valor).__name__} por la capa de canales.")
+
+
+def _restaurar(objeto: Dict[str, Any]) -> Any:
+    if len(objeto) == 1 and "__bytes__" in objeto:
+        return base64.b64decode(objeto["__bytes__"])
+    return objeto
+
+
+def _codificar(datos: Any) -> bytes:
+    return json.dumps(datos, default=_por_defecto, separators=(",", ":")).encode()
+
+
+def _decodificar(cuerpo: bytes) -> Any:
+    return json.loads(cuerpo, object_hook=_restaurar)
+
+
+def _marco(cuerpo: bytes) -> bytes:
+    return _CABECERA.pack(len(cuerpo)) + cuerpo
+
+
+async def _leer_marco(lector: asyncio.StreamReader) -> bytes:
+    cabecera = await lector.readexactly(_CABECERA.size)
+    (longitud,) = _CABECERA.unpack(cabecera)
+    return await lector.readexactly(longitud)
+
+
+class ConcentradorCanales:
+    """Servidor que enruta mensajes y grupos entre los procesos conectados."""
+
+    def __init__(self, ruta: str) -> None:
+        self.ruta = ruta
+        self._rutas: Dict[str, asyncio.StreamWriter] = {}
+        self._grupos: Dict[str, Set[str]] = {}
+        self._servidor: Optional[asyncio.AbstractServer] = None
+
+    async def iniciar(self) -> None:
+        """Abre el socket Unix y empieza a aceptar procesos."""
+
+        self._servidor = await asyncio.start_unix_server(self._atender, path=self.ruta)
+        os.chmod(self.ruta, 0o600)
+
+    async def servir_por_siempre(self) -> None:
+        """Atiende conexiones hasta que se cancele la tarea."""
+
+        if self._servidor is None:
+            await self.iniciar()
+        async with self._servidor:
+            await self._servidor.serve_forever()
+
+    async def cerrar(self) -> None:
+        """Deja de aceptar conexiones y cierra las existentes."""
+
+        if self._servidor is not None:
+            self._servidor.close()
+            self._servidor = None
+            if os.path.exists(self.ruta):
+                os.unlink(self.ruta)
+        for escritor in set(self._rutas.values()):
+            escritor.close()
+        self._rutas.clear()
+        self._grupos.clear()
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                self._procesar(_decodificar(await _leer_marco(lector)), escritor)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # La cancelación llega al cerrar el concentrador; la tarea termina
+            # de forma normal para que ``asyncio.streams`` no la reporte.
+            pass
+        finally:
+            self._olvidar(escritor)
+            escritor.close()
+
+    def _procesar(self, peticion: Dict[str, Any], escritor: asyncio.StreamWriter) -> None:
+        operacion = peticion["o"]
+        if operacion == "escuchar":
+            self._rutas[peticion["clave"]] = escritor
+        elif operacion == "enviar":
+            self._entregar({_clave_ruta(peticion["c"]): [peticion["c"]]}, peticion["m"])
+        elif operacion == "grupo_agregar":
+            self._grupos.setdefault(peticion["g"], set()).add(peticion["c"])
+        elif operacion == "grupo_quitar":
+            miembros = self._grupos.get(peticion["g"])
+            if miembros is not None:
+                miembros.discard(peticion["c"])
+                if not miembros:
+                    del self._grupos[peticion["g"]]
+        elif operacion == "grupo_enviar":
+            por_proceso: Dict[str, List[str]] = {}
+            for canal in self._grupos.get(peticion["g"], ()):
+                por_proceso.setdefault(_clave_ruta(canal), []).append(canal)
+            self._entregar(por_proceso, peticion["m"])
+        elif operacion == "vaciar":
+            self._grupos.clear()
+
+    def _entregar(self, por_proceso: Dict[str, List[str]], mensaje: Any) -> None:
+        """Escribe el mensaje una sola vez por proceso con la lista de canales."""
+
+        mensaje_codificado: Optional[bytes] = None
+        for clave, canales in por_proceso.items():
+            escritor = self._rutas.get(clave)
+            if escritor is None or escritor.is_closing():
+                continue
+            if escritor.transport.get_write_buffer_size() > _LIMITE_BUFFER_ESCRITURA:
+                logger.warning("Proceso lento en la capa de canales, se descarta un mensaje")
+                continue
+            if mensaje_codificado is None:
+                mensaje_codificado = _codificar(mensaje)
+            cuerpo = b'{"c":' + _codificar(canales) + b',"m":' + mensaje_codificado + b"}"
+            escritor.write(_marco(cuerpo))
+
+    def _olvidar(self, escritor: asyncio.StreamWriter) -> None:
+        """Elimina las rutas y los miembros de grupo de un proceso desconectado."""
+
+        claves = {clave for clave, actual in self._rutas.items() if actual is escritor}
+        for clave in claves:
+            del self._rutas[clave]
+        for grupo in list(self._grupos):
+            miembros = {canal for canal in self._grupos[grupo] if _clave_ruta(canal) not in claves}
+            if miembros:
+                self._grupos[grupo] = miembros
+            else:
+                del self._grupos[grupo]
+
+
+class CapaCanalesLocal(BaseChannelLayer):
+    """Capa de canales compartida por los procesos de un mismo equipo.
+
+    Toda la comunicación con el concentrador ocurre en un hilo propio con su
+    bucle de eventos, de modo que la capa puede usarse desde cualquier bucle
+    (el del servidor ASGI o los temporales de ``async_to_sync``). Cada cola
+    admite hasta ``capacity`` mensajes, que vencen a los ``expiry`` segundos;
+    los vencidos se descartan en cada operación junto con las colas vacías.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        ruta: Optional[str] = None,
+        autoiniciar: bool = True,
+        expiry: int = 60,
+        capacity: int = 100,
+        channel_capacity: Optional[Dict[str, int]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.ruta = ruta or ruta_por_defecto()
+        self.autoiniciar = autoiniciar
+        self.id_cliente = uuid.uuid4().hex[:12]
+        self._cerrojo_hilo = threading.Lock()
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._escritor: Optional[asyncio.StreamWriter] = None
+        self._cerrojo_conexion: Optional[asyncio.Lock] = None
+        self._colas: Dict[str, asyncio.Queue] = {}
+        self._claves: Set[str] = set()
+        self._grupos: Dict[str, Set[str]] = {}
+        self._concentrador: Optional[ConcentradorCanales] = None
+        self._archivo_cerrojo: Optional[IO[str]] = None
+        self._cerrada = False
+
+    # API de la capa de canales
+
+    async def send(self, channel: str, message: Dict[str, Any]) -> None:
+        """Envía un mensaje a un canal, sea de este proceso o de otro."""
+
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._en_hilo(self._enviar(channel, message))
+
+    async def receive(self, channel: str) -> Dict[str, Any]:
+        """Espera el primer mensaje que llegue al canal."""
+
+        self.require_valid_channel_name(channel)
+        return await self._en_hilo(self._recibir(channel))
+
+    async def new_channel(self, prefix: str = "specific.") -> str:
+        """Crea un canal específico cuyos mensajes se enrutan a este proceso."""
+
+        aleatorio = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        canal = f"{prefix}.{self.id_cliente}!{aleatorio}"
+        await self._en_hilo(self._escuchar(_clave_ruta(canal)))
+        return canal
+
+    async def group_add(self, group: str, channel: str) -> None:
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._en_hilo(self._agregar_a_grupo(group, channel))
+
+    async def group_discard(self, group: str, channel: str) -> None:
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._en_hilo(self._quitar_de_grupo(group, channel))
+
+    async def group_send(self, group: str, message: Dict[str, Any]) -> None:
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._en_hilo(self._escribir({"o": "grupo_enviar", "g": group, "m": message}))
+
+    async def flush(self) -> None:
+        await self._en_hilo(self._vaciar())
+
+    async def close(self) -> None:
+        """Cierra la conexión, el concentrador alojado y el hilo de la capa."""
+
+        if self._bucle is None or self._cerrada:
+            return
+        self._cerrada = True
+        await self._en_hilo(self._cerrar())
+        self._bucle.call_soon_threadsafe(self._bucle.stop)
+        if self._archivo_cerrojo is not None:
+            self._archivo_cerrojo.close()
+            self._archivo_cerrojo = None
+
+    # Puente entre el bucle de quien llama y el hilo de la capa
+
+    def _asegurar_hilo(self) -> asyncio.AbstractEventLoop:
+        with self._cerrojo_hilo:
+            if self._bucle is None:
+                listo = threading.Event()
+
+                def ejecutar() -> None:
+                    bucle = asyncio.new_event_loop()
+                    asyncio.set_event_loop(bucle)
+                    self._cerrojo_conexion = asyncio.Lock()
+                    self._bucle = bucle
+                    listo.set()
+                    bucle.run_forever()
+                    bucle.close()
+
+                threading.Thread(target=ejecutar, name="capa-canales-local", daemon=True).start()
+                listo.wait()
+        return self._bucle
+
+    async def _en_hilo(self, corrutina: Awaitable[T]) -> T:
+        bucle = self._asegurar_hilo()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(corrutina, bucle))
+
+    # Operaciones que corren en el hilo de la capa
+
+    def _es_local(self, canal: str) -> bool:
+        return _clave_ruta(canal) in self._claves
+
+    def _cola(self, canal: str) -> asyncio.Queue:
+        cola = self._colas.get(canal)
+        if cola is None:
+            cola = self._colas[canal] = asyncio.Queue(maxsize=self.get_capacity(canal))
+        return cola
+
+    def _limpiar_vencidas(self) -> None:
+        """Descarta los mensajes vencidos y las colas que quedan vacías.
+
+        Como en ``InMemoryChannelLayer``, un canal con mensajes vencidos ya no
+        tiene quien lo lea, así que además se lo saca de sus grupos.
+        """
+
+        ahora = time.monotonic()
+        abandonados = []
+        for canal, cola in list(self._colas.items()):
+            if cola.empty() or cola._queue[0][0] >= ahora:
+                continue
+            while not cola.empty() and cola._queue[0][0] < ahora:
+                cola.get_nowait()
+            if cola.empty():
+                del self._colas[canal]
+            abandonados.append(canal)
+        if abandonados:
+            asyncio.get_running_loop().create_task(self._quitar_de_grupos(abandonados))
+
+    async def _quitar_de_grupos(self, canales: List[str]) -> None:
+        for canal in canales:
+            for grupo in [grupo for grupo, miembros in self._grupos.items() if canal in miembros]:
+                await self._quitar_de_grupo(grupo, canal)
+
+    def _depositar(self, canal: str, mensaje: Dict[str, Any]) -> None:
+        try:
+            self._cola(canal).put_nowait((time.monotonic() + self.expiry, mensaje))
+        except asyncio.QueueFull:
+            raise ChannelFull(canal)
+
+    async def _enviar(self, canal: str, mensaje: Dict[str, Any]) -> None:
+        self._limpiar_vencidas()
+        if self._es_local(canal):
+            self._depositar(canal, copy.deepcopy(mensaje))
+            return
+        await self._escribir({"o": "enviar", "c": canal, "m": mensaje})
+
+    async def _recibir(self, canal: str) -> Dict[str, Any]:
+        clave = _clave_ruta(canal)
+        if clave not in self._claves:
+            await self._escuchar(clave)
+        self._limpiar_vencidas()
+        cola = self._cola(canal)
+        try:
+            while True:
+                expira, mensaje = await cola.get()
+                if expira >= time.monotonic():
+                    return mensaje
+        finally:
+            if cola.empty() and self._colas.get(canal) is cola:
+                del self._colas[canal]
+
+    async def _escuchar(self, clave: str) -> None:
+        if clave in self._claves:
+            return
+        self._claves.add(clave)
+        await self._escribir({"o": "escuchar", "clave": clave})
+
+    async def _agregar_a_grupo(self, grupo: str, canal: str) -> None:
+        self._grupos.setdefault(grupo, set()).add(canal)
+        await self._escribir({"o": "grupo_agregar", "g": grupo, "c": canal})
+
+    async def _quitar_de_grupo(self, grupo: str, canal: str) -> None:
+        miembros = self._grupos.get(grupo)
+        if miembros is not None:
+            miembros.discard(canal)
+            if not miembros:
+                del self._grupos[grupo]
+        await self._escribir({"o": "grupo_quitar", "g": grupo, "c": canal})
+
+    async def _vaciar(self) -> None:
+        self._colas.clear()
+        self._grupos.clear()
+        await self._escribir({"o": "vaciar"})
+
+    async def _escribir(self, peticion: Dict[str, Any]) -> None:
+        escritor = await self._conectar()
+        escritor.write(_marco(_codificar(peticion)))
+        await escritor.drain()
+
+    async def _conectar(self) -> asyncio.StreamWriter:
+        """Devuelve la conexión al concentrador, creándola si hace falta."""
+
+        if self._escritor is not None and not self._escritor.is_closing():
+            return self._escritor
+
+        async with self._cerrojo_conexion:
+            if self._escritor is not None and not self._escritor.is_closing():
+                return self._escritor
+
+            espera = 0.01
+            for _ in range(50):
+                try:
+                    lector, escritor = await asyncio.open_unix_connection(self.ruta)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if self.autoiniciar and await self._alojar_concentrador():
+                        continue
+                    await asyncio.sleep(espera)
+                    espera = min(espera * 2, 0.5)
+            else:
+                raise ConnectionError(f"No se pudo conectar a la capa de canales en {self.ruta}.")
+
+            # Al reconectar se reenvían las rutas y los grupos de este proceso.
+            for clave in self._claves:
+                escritor.write(_marco(_codificar({"o": "escuchar", "clave": clave})))
+            for grupo, canales in self._grupos.items():
+                for canal in canales:
+                    escritor.write(_marco(_codificar({"o": "grupo_agregar", "g": grupo, "c": canal})))
+            await escritor.drain()
+
+            self._escritor = escritor
+            asyncio.get_running_loop().create_task(self._leer(lector, escritor))
+            return escritor
+
+    async def _alojar_concentrador(self) -> bool:
+        """Intenta alojar el concentrador en este proceso usando un cerrojo de archivo."""
+
+        if self._concentrador is not None:
+            return True
+        archivo = tomar_cerrojo_concentrador(self.ruta)
+        if archivo is None:
+            return False
+
+        if os.path.exists(self.ruta):
+            os.unlink(self.ruta)
+        concentrador = ConcentradorCanales(self.ruta)
+        await concentrador.iniciar()
+        self._archivo_cerrojo = archivo
+        self._concentrador = concentrador
+        logger.info("Concentrador de canales alojado en %s", self.ruta)
+        return True
+
+    async def _leer(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        """Distribuye en las colas locales los mensajes que llegan del concentrador."""
+
+        try:
+            while True:
+                entrega = _decodificar(await _leer_marco(lector))
+                canales, mensaje = entrega["c"], entrega["m"]
+                self._limpiar_vencidas()
+                for canal in canales:
+                    try:
+                        self._depositar(canal, mensaje if len(canales) == 1 else dict(mensaje))
+                    except ChannelFull:
+                        logger.warning("Canal %s lleno, se descarta un mensaje", canal)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+            if self._escritor is escritor:
+                self._escritor = None
+            if not self._cerrada and (self._claves or self._grupos):
+                # El concentrador se cayó: se reconecta para no perder suscripciones.
+                asyncio.get_running_loop().create_task(self._reconectar())
+
+    async def _reconectar(self) -> None:
+        try:
+            await self._conectar()
+        except ConnectionError:
+            logger.exception("No se pudo recuperar la conexión con la capa de canales")
+
+    async def _cerrar(self) -> None:
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+        if self._concentrador is not None:
+            await self._concentrador.cerrar()
+            self._concentrador = None
+        pendientes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarea in pendientes:
+            tarea.cancel()
+        await asyncio.gather(*pendientes, return_exceptions=True)
@@ -2,49 +2,398 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
 
+from .instantaneas import obtener_cache_instantaneas
+from .metricas import incrementar, medir
 from .models import Order
-from .servicios import construir_evento_seguimiento
+from .servicios import (
+    CATALOGO_BINARIO,
+    SUBPROTOCOLO_BINARIO,
+    actualizado_de_evento,
+    codificar_json,
+    empaquetar_evento_binario,
+    enmarcar_evento_pedido,
+    identificador_valido,
+    nombre_grupo_pedido,
+    serializar_evento_seguimiento,
+    version_seguimiento,
+)
+
+
+@database_sync_to_async
+def _cargar_instantanea(pedido_id: int) -> Optional[Tuple[str, int]]:
+    """Lee el pedido de la base y devuelve su evento serializado y su versión."""
+
+    pedido = Order.objects.only("status", "updated_at").filter(pk=pedido_id).first()
+    if pedido is None:
+        return None
+    return serializar_evento_seguimiento(pedido), version_seguimiento(pedido)
+
+
+@database_sync_to_async
+def _cargar_instantaneas(pedidos: Sequence[int]) -> Dict[int, Tuple[str, int]]:
+    """Lee varios pedidos en una sola consulta y devuelve su evento y versión por id."""
+
+    return {
+        pedido.pk: (serializar_evento_seguimiento(pedido), version_seguimiento(pedido))
+        for pedido in Order.objects.only("status", "updated_at").filter(pk__in=pedidos)
+    }
+
+
+# Código de cierre para las clientas que no alcanzan a leer las actualizaciones.
+CIERRE_CLIENTA_LENTA = 4008
 
 
 class ConsumidorSeguimientoPedido(AsyncJsonWebsocketConsumer):
-    """Canal WebSocket que entrega actualizaciones del pedido."""
+    """Canal WebSocket que entrega actualizaciones del pedido.
+
+    Las difusiones no se envían desde el manejador del evento: se dejan en
+    ``_pendientes``, una entrada por pedido, y una tarea las escribe en el
+    socket. Mientras una escritura está en curso, cada estado nuevo reemplaza
+    al pendiente del mismo pedido, así que una clienta lenta solo recibe el más
+    reciente y la cola del canal en la capa no crece. Si una escritura sigue
+    en curso o la clienta sigue atrasada más de
+    ``PEDIDOS_CONSUMIDOR_ATRASO_MAXIMO`` segundos, se cierra el socket con el
+    código :data:`CIERRE_CLIENTA_LENTA`.
+
+    Todo esto depende de que ``send`` espere al transporte, como en servidores
+    que aplican contrapresión (Uvicorn). Daphne acepta cada mensaje sin
+    esperar y lo acumula en el búfer de Twisted, así que ahí nunca hay atraso
+    visible y la cola y el cierre no tienen efecto.
+
+    Tras el evento completo inicial se envían deltas (``"tipo": "delta"``)
+    cuando su ``base`` es el ``actualizado`` que tendrá la clienta; si no, o
+    si el delta reemplazaría a otro pendiente, se envía el evento completo.
+    La clienta que detecta un salto envía ``{"accion": "resincronizar"}``.
+
+    Si la clienta pide el subprotocolo :data:`SUBPROTOCOLO_BINARIO`, recibe
+    el catálogo de estados una vez y luego tramas binarias de 10 bytes con el
+    estado completo en lugar de JSON.
+    """
 
     pedido_id: int
     grupo_pedido: str
 
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._pendientes: Dict[int, Union[str, bytes]] = {}
+        self._envio: Optional[asyncio.Task] = None
+        self._atrasada_desde: Optional[float] = None
+        self._descartada = False
+        self._descarte: Optional[asyncio.Task] = None
+        # ``actualizado`` del último evento encolado de cada pedido: el estado
+        # que tendrá la clienta al recibir todo lo pendiente.
+        self._actualizados: Dict[int, Optional[str]] = {}
+        self._binario = False
+
     async def connect(self) -> None:
         """Suscribe el socket al grupo correspondiente al pedido."""
 
         self.pedido_id = int(self.scope["url_route"]["kwargs"]["pedido_id"])
-        self.grupo_pedido = f"pedido_{self.pedido_id}"
-        await self.channel_layer.group_add(self.grupo_pedido, self.channel_name)
-        await self.accept()
-        await self._enviar_estado_actual()
+        self.grupo_pedido = nombre_grupo_pedido(self.pedido_id)
+        self._binario = SUBPROTOCOLO_BINARIO in self.scope.get("subprotocols", ())
+        with medir("consumidor_conexion"):
+            await self.channel_layer.group_add(self.grupo_pedido, self.channel_name)
+            if self._binario:
+                await self.accept(subprotocol=SUBPROTOCOLO_BINARIO)
+                await self.send(bytes_data=CATALOGO_BINARIO)
+            else:
+                await self.accept()
+            await self._enviar_estado_actual()
 
     async def disconnect(self, close_code: int) -> None:  # noqa: D401
         """Cancela la suscripción al grupo del pedido al desconectarse."""
 
+        self._cancelar_envio()
         await self.channel_layer.group_discard(self.grupo_pedido, self.channel_name)
 
+    async def receive_json(self, contenido: Any, **kwargs: Any) -> None:
+        """Entrega los mensajes de la clienta a :meth:`recibir_comando`."""
+
+        await self.recibir_comando(contenido)
+
     async def recibir_comando(self, contenido: Dict[str, Any]) -> None:
-        """Método de compatibilidad en caso de comandos futuros."""
+        """Atiende ``resincronizar``, que vuelve a enviar el evento completo."""
 
-        # Se deja como placeholder para ampliar la funcionalidad.
-        return None
+        if isinstance(contenido, dict) and contenido.get("accion") == "resincronizar":
+            await self._resincronizar([self.pedido_id])
 
     async def enviar_actualizacion(self, evento: Dict[str, Any]) -> None:
         """Recibe el evento del canal y lo reenvía a la clienta."""
 
-        await self.send_json(evento["contenido"])
+        await self._encolar(self.pedido_id, self._elegir_texto(self.pedido_id, evento))
+
+    @classmethod
+    async def encode_json(cls, contenido: Any) -> str:
+        """Codifica los mensajes JSON con el codificador más rápido disponible."""
+
+        return codificar_json(contenido)
+
+    def _elegir_texto(self, clave: int, evento: Dict[str, Any]) -> Union[str, bytes]:
+        """Devuelve el delta del evento si la clienta tendrá su base; si no, el texto completo."""
+
+        if self._binario and "binario" in evento:
+            return evento["binario"]
+        delta = evento.get("delta")
+        usar_delta = (
+            delta is not None
+            and clave not in self._pendientes
+            and self._actualizados.get(clave) == evento["base"]
+        )
+        self._actualizados[clave] = evento.get("actualizado")
+        return self._enmarcar(clave, delta if usar_delta else evento["texto"])
+
+    def _enmarcar(self, clave: int, texto: str) -> Union[str, bytes]:
+        """Prepara el texto de un pedido para este socket: tal cual o como trama binaria."""
+
+        if self._binario:
+            return empaquetar_evento_binario(texto)
+        return texto
+
+    async def _encolar_instantanea(self, clave: int, texto: str) -> None:
+        """Encola el evento completo de un pedido, base de los deltas siguientes."""
+
+        self._actualizados[clave] = actualizado_de_evento(texto)
+        await self._encolar(clave, self._enmarcar(clave, texto))
+
+    async def _resincronizar(self, pedidos: Sequence[int]) -> None:
+        """Vuelve a enviar el evento completo de cada pedido."""
+
+        instantaneas = obtener_cache_instantaneas()
+        for pedido_id in pedidos:
+            texto = await instantaneas.aobtener_o_cargar(pedido_id, _cargar_instantanea)
+            if texto is not None:
+                await self._encolar_instantanea(pedido_id, texto)
+
+    async def _encolar(self, clave: int, texto: Union[str, bytes]) -> None:
+        """Deja ``texto`` como último estado pendiente de ``clave`` y arranca el envío."""
+
+        if self._descartada:
+            return
+        if clave in self._pendientes:
+            incrementar("mensajes_combinados")
+            ahora = time.monotonic()
+            if self._atrasada_desde is None:
+                self._atrasada_desde = ahora
+            elif ahora - self._atrasada_desde > self._atraso_maximo():
+                await self._descartar()
+                return
+        self._pendientes[clave] = texto
+        if self._envio is None:
+            self._envio = asyncio.ensure_future(self._enviar_pendientes())
+
+    def _atraso_maximo(self) -> float:
+        """Segundos de atraso a partir de los cuales se cierra el socket."""
+
+        return getattr(settings, "PEDIDOS_CONSUMIDOR_ATRASO_MAXIMO", 10.0)
+
+    async def _enviar_pendientes(self) -> None:
+        """Escribe los estados pendientes en el orden en que llegaron."""
+
+        bucle = asyncio.get_running_loop()
+        try:
+            while self._pendientes:
+                texto = self._pendientes.pop(next(iter(self._pendientes)))
+                # Una escritura trabada cuenta como atraso aunque no lleguen
+                # estados nuevos que lo detecten en ``_encolar``.
+                vencimiento = bucle.call_later(self._atraso_maximo(), self._vencer_envio)
+                try:
+                    with medir("consumidor_envio"):
+                        await self._enviar(texto)
+                finally:
+                    vencimiento.cancel()
+        finally:
+            self._envio = None
+            self._atrasada_desde = None
+
+    async def _enviar(self, datos: Union[str, bytes]) -> None:
+        """Escribe un mensaje de texto o una trama binaria en el socket."""
+
+        if isinstance(datos, bytes):
+            await self.send(bytes_data=datos)
+        else:
+            await self.send(text_data=datos)
+
+    def _vencer_envio(self) -> None:
+        """Descarta el socket cuando una escritura supera el atraso máximo."""
+
+        if not self._descartada:
+            self._descarte = asyncio.ensure_future(self._descartar())
+
+    async def _descartar(self) -> None:
+        """Cierra el socket de una clienta que no alcanza a leer las actualizaciones."""
+
+        self._descartada = True
+        self._pendientes.clear()
+        self._cancelar_envio()
+        incrementar("consumidores_descartados")
+        await self.close(code=CIERRE_CLIENTA_LENTA)
+
+    def _cancelar_envio(self) -> None:
+        if self._envio is not None:
+            self._envio.cancel()
+            self._envio = None
 
     async def _enviar_estado_actual(self) -> None:
-        """Obtiene el estado actual desde la base de datos y lo envía."""
+        """Envía el estado actual desde la caché o, ante un fallo, desde la base."""
+
+        texto = await obtener_cache_instantaneas().aobtener_o_cargar(
+            self.pedido_id, _cargar_instantanea
+        )
+        if texto is None:
+            await self.close()
+            return
+        self._actualizados[self.pedido_id] = actualizado_de_evento(texto)
+        await self._enviar(self._enmarcar(self.pedido_id, texto))
+
+
+class ConsumidorSeguimientoPedidos(ConsumidorSeguimientoPedido):
+    """Un solo WebSocket que sigue varios pedidos a la vez.
+
+    La clienta envía ``{"accion": "suscribir", "pedidos": [1, 2]}`` o
+    ``{"accion": "desuscribir", "pedidos": [...]}`` y recibe un acuse
+    ``{"tipo": "suscripcion", ...}`` con los pedidos seguidos y los que no
+    existen o superan ``PEDIDOS_MULTIPLEX_MAXIMO``; un id que no cabe en 64
+    bits rechaza el comando con ``pedido_fuera_de_rango``. Cada evento o delta es el
+    mismo del socket de un pedido con la clave ``"pedido"`` al principio, y
+    ``resincronizar`` recibe también la lista de ``pedidos``. Las
+    instantáneas iniciales que no están en caché se leen en una sola
+    consulta, y la cola de envío combina los estados por pedido.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._suscripciones: Set[int] = set()
+        # Pedidos recién suscritos que todavía no recibieron ningún estado.
+        self._sin_instantanea: Set[int] = set()
+
+    async def connect(self) -> None:
+        """Acepta el socket; los pedidos llegan luego con ``suscribir``."""
+
+        with medir("consumidor_conexion"):
+            await self.accept()
+
+    async def disconnect(self, close_code: int) -> None:  # noqa: D401
+        """Cancela todas las suscripciones al desconectarse."""
+
+        self._cancelar_envio()
+        for pedido_id in self._suscripciones:
+            await self.channel_layer.group_discard(nombre_grupo_pedido(pedido_id), self.channel_name)
+        self._suscripciones.clear()
+
+    @classmethod
+    async def decode_json(cls, texto: str) -> Any:
+        """Decodifica el comando; un JSON inválido se trata como comando desconocido."""
+
+        try:
+            return json.loads(texto)
+        except ValueError:
+            return None
+
+    async def recibir_comando(self, contenido: Any) -> None:
+        """Atiende los comandos ``suscribir`` y ``desuscribir``."""
+
+        accion = contenido.get("accion") if isinstance(contenido, dict) else None
+        pedidos = contenido.get("pedidos") if isinstance(contenido, dict) else None
+        if (
+            accion not in ("suscribir", "desuscribir", "resincronizar")
+            or not isinstance(pedidos, list)
+            or not all(type(pedido_id) is int for pedido_id in pedidos)
+        ):
+            await self.send_json({"tipo": "error", "error": "comando_invalido"})
+            return
+        if not all(-(2**63) <= pedido_id < 2**63 for pedido_id in pedidos):
+            # No caben en un entero de 64 bits ni pueden devolverse en el acuse.
+            await self.send_json({"tipo": "error", "error": "pedido_fuera_de_rango"})
+            return
+        if accion == "suscribir":
+            await self._suscribir(pedidos)
+        elif accion == "desuscribir":
+            await self._desuscribir(pedidos)
+        else:
+            await self._resincronizar(
+                [pedido_id for pedido_id in pedidos if pedido_id in self._suscripciones]
+            )
+
+    async def enviar_actualizacion(self, evento: Dict[str, Any]) -> None:
+        """Reenvía el evento de un pedido seguido con su identificador delante."""
+
+        pedido_id = evento.get("pedido")
+        texto = evento.get("texto")
+        if pedido_id not in self._suscripciones or texto is None:
+            return
+        self._sin_instantanea.discard(pedido_id)
+        await self._encolar(pedido_id, self._elegir_texto(pedido_id, evento))
+
+    def _enmarcar(self, clave: int, texto: str) -> str:
+        return enmarcar_evento_pedido(clave, texto)
+
+    async def _suscribir(self, pedidos: List[int]) -> None:
+        """Se une a los grupos de los pedidos y envía el estado actual de cada uno."""
+
+        maximo = getattr(settings, "PEDIDOS_MULTIPLEX_MAXIMO", 1000)
+        # Un id que no es una clave primaria posible no se busca ni se suscribe.
+        fuera_de_rango = [
+            pedido_id for pedido_id in dict.fromkeys(pedidos) if not identificador_valido(pedido_id)
+        ]
+        nuevos = [
+            pedido_id
+            for pedido_id in dict.fromkeys(pedidos)
+            if identificador_valido(pedido_id) and pedido_id not in self._suscripciones
+        ]
+        disponibles = max(maximo - len(self._suscripciones), 0)
+        nuevos, excedentes = nuevos[:disponibles], nuevos[disponibles:]
+
+        # Primero se suscribe, para no perder un cambio ocurrido mientras se
+        # leen las instantáneas.
+        for pedido_id in nuevos:
+            await self.channel_layer.group_add(nombre_grupo_pedido(pedido_id), self.channel_name)
+        self._suscripciones.update(nuevos)
+        self._sin_instantanea.update(nuevos)
+
+        instantaneas = obtener_cache_instantaneas()
+        textos = {pedido_id: instantaneas.obtener(pedido_id) for pedido_id in nuevos}
+        faltantes = [pedido_id for pedido_id, texto in textos.items() if texto is None]
+        if faltantes:
+            for pedido_id, (texto, version) in (await _cargar_instantaneas(faltantes)).items():
+                instantaneas.guardar(pedido_id, texto, version)
+                textos[pedido_id] = texto
+
+        ausentes = [pedido_id for pedido_id, texto in textos.items() if texto is None]
+        await self._desuscribir(ausentes, acusar=False)
+        desconocidos = fuera_de_rango + ausentes
+        await self.send_json(
+            {
+                "tipo": "suscripcion",
+                "pedidos": sorted(self._suscripciones),
+                "desconocidos": desconocidos,
+                "rechazados": excedentes,
+            }
+        )
+        for pedido_id, texto in textos.items():
+            # Si ya llegó una difusión, es más reciente que la instantánea.
+            if texto is not None and pedido_id in self._sin_instantanea:
+                self._sin_instantanea.discard(pedido_id)
+                await self._encolar_instantanea(pedido_id, texto)
+
+    async def _desuscribir(self, pedidos: List[int], acusar: bool = True) -> None:
+        """Sale de los grupos de los pedidos y descarta sus estados pendientes."""
 
-        pedido = await database_sync_to_async(Order.objects.get)(pk=self.pedido_id)
-        datos = construir_evento_seguimiento(pedido)
-        await self.send_json(datos)
+        for pedido_id in pedidos:
+            if pedido_id not in self._suscripciones:
+                continue
+            self._suscripciones.discard(pedido_id)
+            self._sin_instantanea.discard(pedido_id)
+            self._pendientes.pop(pedido_id, None)
+            self._actualizados.pop(pedido_id, None)
+            await self.channel_layer.group_discard(nombre_grupo_pedido(pedido_id), self.channel_name)
+        if acusar:
+            await self.send_json({"tipo": "suscripcion", "pedidos": sorted(self._suscripciones)})
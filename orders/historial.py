@@ -0,0 +1,259 @@
+"""Historial de cambios de estado escrito en lotes y consultas agregadas."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Sum
+
+from .models import Order, OrderStatusEvent
+
+logger = logging.getLogger(__name__)
+
+
+def construir_evento(pedido: Order, estado_anterior: str, inicio_anterior: datetime) -> OrderStatusEvent:
+    """Arma el cambio de estado recién aplicado a ``pedido`` sin guardarlo.
+
+    ``inicio_anterior`` es el ``status_changed_at`` previo al cambio; no se usa
+    ``updated_at`` porque otros guardados lo mueven sin cambiar el estado.
+    """
+
+    return OrderStatusEvent(
+        order_id=pedido.pk,
+        previous_status=estado_anterior,
+        status=pedido.status,
+        previous_duration=pedido.status_changed_at - inicio_anterior,
+        created_at=pedido.status_changed_at,
+    )
+
+
+class HistorialEstados:
+    """Acumula los cambios de estado y los inserta con ``bulk_create``.
+
+    Dentro de una transacción los eventos solo entran al búfer cuando se
+    confirma, así nunca se registra un cambio revertido. El búfer se vacía al
+    llegar a ``tamano_lote`` eventos o cuando el más antiguo supera
+    ``intervalo`` segundos; para esto último, si ``temporizador`` está
+    activo, se arma un temporizador con el primer evento, de modo que no hace
+    falta que llegue otro. Un lote que no se puede escribir vuelve al búfer
+    hasta ``reintentos`` veces antes de descartarse.
+    """
+
+    def __init__(
+        self,
+        tamano_lote: int = 100,
+        intervalo: float = 1.0,
+        temporizador: bool = True,
+        reintentos: int = 3,
+    ) -> None:
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.temporizador = temporizador
+        self.reintentos = reintentos
+        self.descartados = 0
+        self.registrados = 0
+        self.escritos = 0
+        self.lotes = 0
+        self._pendientes: List[OrderStatusEvent] = []
+        self._primero: Optional[float] = None
+        self._temporizador: Optional[threading.Timer] = None
+        self._fallos = 0
+        self._cerrojo = threading.Lock()
+
+    def registrar(self, eventos: Iterable[OrderStatusEvent]) -> None:
+        """Agrega eventos desde código síncrono, esperando al ``commit`` si hace falta."""
+
+        eventos = list(eventos)
+        if connection.in_atomic_block:
+            transaction.on_commit(partial(self._registrar_confirmados, eventos))
+        else:
+            self._registrar_confirmados(eventos)
+
+    async def aregistrar(self, eventos: Iterable[OrderStatusEvent]) -> None:
+        """Versión asíncrona de :meth:`registrar` para las rutas ASGI.
+
+        Corre en el hilo de la base de datos, que es donde se ve si hay una
+        transacción abierta a cuyo ``commit`` esperar.
+        """
+
+        await sync_to_async(self.registrar)(list(eventos))
+
+    def vaciar(self) -> int:
+        """Inserta los eventos pendientes y devuelve cuántos se escribieron."""
+
+        with self._cerrojo:
+            lote, self._pendientes = self._pendientes, []
+            self._primero = None
+            self._desarmar_temporizador()
+        if not lote:
+            return 0
+        try:
+            OrderStatusEvent.objects.bulk_create(lote, batch_size=self.tamano_lote)
+        except Exception:
+            self._reponer(lote)
+            return 0
+        with self._cerrojo:
+            self._fallos = 0
+            self.escritos += len(lote)
+            self.lotes += 1
+        return len(lote)
+
+    def limpiar(self) -> None:
+        """Descarta los eventos pendientes sin escribirlos."""
+
+        with self._cerrojo:
+            self._pendientes = []
+            self._primero = None
+            self._desarmar_temporizador()
+
+    def contadores(self) -> Dict[str, int]:
+        """Devuelve los eventos registrados, escritos, descartados, lotes y pendientes."""
+
+        with self._cerrojo:
+            return {
+                "registrados": self.registrados,
+                "escritos": self.escritos,
+                "descartados": self.descartados,
+                "lotes": self.lotes,
+                "pendientes": len(self._pendientes),
+            }
+
+    def _reponer(self, lote: List[OrderStatusEvent]) -> None:
+        """Devuelve al búfer un lote que falló o lo descarta tras ``reintentos`` fallos."""
+
+        with self._cerrojo:
+            self._fallos += 1
+            if self._fallos > self.reintentos:
+                self._fallos = 0
+                self.descartados += len(lote)
+                reponer = False
+            else:
+                self._pendientes[:0] = lote
+                if self._primero is None:
+                    self._primero = time.monotonic()
+                    self._armar_temporizador()
+                reponer = True
+        if reponer:
+            logger.warning(
+                "No se pudieron guardar %d cambios de estado; se reintentará",
+                len(lote),
+                exc_info=True,
+            )
+        else:
+            logger.exception("Se descartan %d cambios de estado tras varios fallos", len(lote))
+
+    def _registrar_confirmados(self, eventos: List[OrderStatusEvent]) -> None:
+        """Agrega eventos ya confirmados y vacía el búfer si corresponde."""
+
+        if self._agregar(eventos):
+            self.vaciar()
+
+    def _agregar(self, eventos: Iterable[OrderStatusEvent]) -> bool:
+        """Suma eventos al búfer e indica si corresponde vaciarlo."""
+
+        ahora = time.monotonic()
+        with self._cerrojo:
+            antes = len(self._pendientes)
+            self._pendientes.extend(eventos)
+            self.registrados += len(self._pendientes) - antes
+            if self._primero is None and self._pendientes:
+                self._primero = ahora
+                self._armar_temporizador()
+            return len(self._pendientes) >= self.tamano_lote or (
+                self._primero is not None and ahora - self._primero >= self.intervalo
+            )
+
+    def _armar_temporizador(self) -> None:
+        """Programa el vaciado por antigüedad; se llama con el cerrojo tomado."""
+
+        if not self.temporizador:
+            return
+        self._temporizador = threading.Timer(self.intervalo, self._vaciar_por_tiempo)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _desarmar_temporizador(self) -> None:
+        """Cancela el vaciado programado; se llama con el cerrojo tomado."""
+
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def _vaciar_por_tiempo(self) -> None:
+        """Vacía el búfer desde el hilo del temporizador y cierra su conexión."""
+
+        try:
+            self.vaciar()
+        finally:
+            connection.close()
+
+
+_historial: Optional[HistorialEstados] = None
+_cerrojo_historial = threading.Lock()
+
+
+def obtener_historial() -> HistorialEstados:
+    """Devuelve el historial de estados del proceso."""
+
+    global _historial
+
+    if _historial is None:
+        with _cerrojo_historial:
+            if _historial is None:
+                _historial = HistorialEstados(
+                    tamano_lote=getattr(settings, "PEDIDOS_HISTORIAL_LOTE", 100),
+                    intervalo=getattr(settings, "PEDIDOS_HISTORIAL_INTERVALO", 1.0),
+                    reintentos=getattr(settings, "PEDIDOS_HISTORIAL_REINTENTOS", 3),
+                )
+                # Lo que quede en el búfer se escribe al terminar el proceso.
+                atexit.register(_historial.vaciar)
+    return _historial
+
+
+def tiempo_en_estados(
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    pedidos: Optional[Iterable[int]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Suma en SQL el tiempo que los pedidos pasaron en cada estado.
+
+    Cuenta las estadías que terminaron entre ``desde`` (incluido) y ``hasta``
+    (excluido). Devuelve, por estado, el total, el promedio y la cantidad de
+    estadías, con una sola consulta que usa el índice ``(created_at,
+    previous_status)``.
+    """
+
+    consulta = OrderStatusEvent.objects.all()
+    if desde is not None:
+        consulta = consulta.filter(created_at__gte=desde)
+    if hasta is not None:
+        consulta = consulta.filter(created_at__lt=hasta)
+    if pedidos is not None:
+        consulta = consulta.filter(order_id__in=list(pedidos))
+
+    filas = (
+        consulta.order_by()
+        .values("previous_status")
+        .annotate(
+            total=Sum("previous_duration"),
+            promedio=Avg("previous_duration"),
+            cantidad=Count("id"),
+        )
+    )
+    return {
+        fila["previous_status"]: {
+            "total": fila["total"],
+            "promedio": fila["promedio"],
+            "cantidad": fila["cantidad"],
+        }
+        for fila in filas
+    }
@@ -0,0 +1,162 @@
+"""Caché compartida con el último evento de seguimiento de cada pedido."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+CargadorInstantanea = Callable[[int], Awaitable[Optional[Tuple[str, int]]]]
+
+
+class _Entrada(NamedTuple):
+    texto: str
+    version: int
+    expira: float
+
+
+class CacheInstantaneas:
+    """Guarda el evento ya serializado por pedido con desalojo LRU y TTL.
+
+    ``SujetoPedido`` la actualiza en cada cambio de estado y los sockets que se
+    conectan leen de aquí su primer mensaje. Solo se consulta la base de datos
+    ante un fallo, y los fallos simultáneos del mismo pedido comparten una
+    única consulta.
+    """
+
+    def __init__(self, capacidad: int = 10000, ttl: float = 30.0) -> None:
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.cargas = 0
+        self._entradas: "OrderedDict[int, _Entrada]" = OrderedDict()
+        self._en_vuelo: Dict[int, asyncio.Future] = {}
+        self._cerrojo = threading.Lock()
+
+    def obtener(self, pedido_id: int) -> Optional[str]:
+        """Devuelve el texto vigente del pedido o ``None`` si no está o venció."""
+
+        with self._cerrojo:
+            entrada = self._entradas.get(pedido_id)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            if entrada.expira < time.monotonic():
+                del self._entradas[pedido_id]
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(pedido_id)
+            self.aciertos += 1
+            return entrada.texto
+
+    def guardar(self, pedido_id: int, texto: str, version: int) -> None:
+        """Registra el evento del pedido salvo que ya haya uno más reciente."""
+
+        if self.capacidad <= 0:
+            return
+        with self._cerrojo:
+            actual = self._entradas.get(pedido_id)
+            if actual is not None and actual.version > version:
+                return
+            self._entradas[pedido_id] = _Entrada(texto, version, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(pedido_id)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, pedido_id: int) -> None:
+        """Elimina el evento guardado de un pedido."""
+
+        with self._cerrojo:
+            self._entradas.pop(pedido_id, None)
+
+    def limpiar(self) -> None:
+        """Vacía la caché por completo."""
+
+        with self._cerrojo:
+            self._entradas.clear()
+
+    def contadores(self) -> Dict[str, int]:
+        """Devuelve aciertos, fallos, cargas desde la base y tamaño actual."""
+
+        with self._cerrojo:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "cargas": self.cargas,
+                "entradas": len(self._entradas),
+            }
+
+    async def aobtener_o_cargar(
+        self, pedido_id: int, cargador: CargadorInstantanea
+    ) -> Optional[str]:
+        """Devuelve el texto del pedido, cargándolo una sola vez ante fallos simultáneos."""
+
+        texto = self.obtener(pedido_id)
+        if texto is not None:
+            return texto
+
+        bucle = asyncio.get_running_loop()
+        futuro = self._en_vuelo.get(pedido_id)
+        if futuro is not None and futuro.get_loop() is bucle:
+            try:
+                return await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise
+                # Se canceló la carga que compartíamos; se vuelve a intentar.
+                return await self.aobtener_o_cargar(pedido_id, cargador)
+
+        futuro = bucle.create_future()
+        self._en_vuelo[pedido_id] = futuro
+        try:
+            with self._cerrojo:
+                self.cargas += 1
+            cargado = await cargador(pedido_id)
+            if cargado is not None:
+                self.guardar(pedido_id, *cargado)
+                # Si mientras tanto llegó un estado más reciente, se usa ese.
+                texto = self._vigente(pedido_id) or cargado[0]
+            futuro.set_result(texto)
+            return texto
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as error:
+            futuro.set_exception(error)
+            # Evita el aviso de excepción no recuperada si nadie más esperaba.
+            futuro.exception()
+            raise
+        finally:
+            if self._en_vuelo.get(pedido_id) is futuro:
+                del self._en_vuelo[pedido_id]
+
+    def _vigente(self, pedido_id: int) -> Optional[str]:
+        """Lee el texto guardado sin alterar los contadores ni el orden LRU."""
+
+        with self._cerrojo:
+            entrada = self._entradas.get(pedido_id)
+        return entrada.texto if entrada is not None else None
+
+
+_cache_instantaneas: Optional[CacheInstantaneas] = None
+_cerrojo_cache = threading.Lock()
+
+
+def obtener_cache_instantaneas() -> CacheInstantaneas:
+    """Devuelve la caché de instantáneas del proceso."""
+
+    global _cache_instantaneas
+
+    if _cache_instantaneas is None:
+        with _cerrojo_cache:
+            if _cache_instantaneas is None:
+                _cache_instantaneas = CacheInstantaneas(
+                    capacidad=getattr(settings, "PEDIDOS_INSTANTANEAS_CAPACIDAD", 10000),
+                    ttl=getattr(settings, "PEDIDOS_INSTANTANEAS_TTL", 30.0),
+                )
+    return _cache_instantaneas
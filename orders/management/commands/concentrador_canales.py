@@ -0,0 +1,41 @@
+"""Comando para ejecutar el concentrador de la capa de canales local."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.capa_local import ConcentradorCanales, ruta_por_defecto, tomar_cerrojo_concentrador
+
+
+class Command(BaseCommand):
+    """Atiende el socket Unix que comparten los procesos ASGI del equipo."""
+
+    help = "Ejecuta el concentrador de CapaCanalesLocal en primer plano."
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            "--ruta",
+            help="Ruta del socket Unix. Por defecto se toma de CHANNEL_LAYERS.",
+        )
+
+    def handle(self, *args: Any, **opciones: Any) -> None:
+        configuracion = settings.CHANNEL_LAYERS.get("default", {}).get("CONFIG", {})
+        ruta = opciones["ruta"] or configuracion.get("ruta") or ruta_por_defecto()
+        cerrojo = tomar_cerrojo_concentrador(ruta)
+        if cerrojo is None:
+            raise CommandError(f"Ya hay un concentrador de canales activo en {ruta}.")
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+
+        self.stdout.write(f"Concentrador de canales escuchando en {ruta}")
+        try:
+            asyncio.run(ConcentradorCanales(ruta).servir_por_siempre())
+        except KeyboardInterrupt:
+            self.stdout.write("Concentrador detenido.")
+        finally:
+            cerrojo.close()
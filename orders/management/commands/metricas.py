@@ -0,0 +1,60 @@
+"""Comando para consultar las métricas del observador de un servidor en marcha."""
+
+from __future__ import annotations
+
+import json
+import urllib.error
+import urllib.request
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.metricas import estimar_percentil
+
+
+class Command(BaseCommand):
+    """Muestra por etapa cuántas veces corrió y cuánto tardó."""
+
+    help = (
+        "Lee metricas/ de un servidor en marcha y resume cada etapa del observador. "
+        "Las métricas son por proceso: con varios procesos se ve el que atienda la petición."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000/metricas/",
+            help="Dirección de la vista de métricas.",
+        )
+        parser.add_argument(
+            "--prometheus",
+            action="store_true",
+            help="Muestra el texto de Prometheus tal como lo devuelve la vista.",
+        )
+
+    def handle(self, *args: Any, **opciones: Any) -> None:
+        url = opciones["url"]
+        if not opciones["prometheus"]:
+            url += ("&" if "?" in url else "?") + "formato=json"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as respuesta:
+                cuerpo = respuesta.read().decode()
+        except (urllib.error.URLError, OSError) as error:
+            raise CommandError(f"No se pudo leer {url}: {error}")
+
+        if opciones["prometheus"]:
+            self.stdout.write(cuerpo, ending="")
+            return
+
+        datos = json.loads(cuerpo)
+        self.stdout.write(
+            f"{'etapa':<28}{'cantidad':>10}{'promedio ms':>14}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for etapa, histograma in datos["etapas"].items():
+            cantidad = histograma["cantidad"]
+            promedio = histograma["suma"] / cantidad * 1000 if cantidad else 0.0
+            p50 = (estimar_percentil(histograma, 0.5) or 0.0) * 1000
+            p99 = (estimar_percentil(histograma, 0.99) or 0.0) * 1000
+            self.stdout.write(f"{etapa:<28}{cantidad:>10}{promedio:>14.3f}{p50:>10.3f}{p99:>10.3f}")
+        for nombre, valor in datos["contadores"].items():
+            self.stdout.write(f"{nombre}: {valor}")
@@ -0,0 +1,226 @@
+"""Histogramas y contadores de las etapas del observador en formato Prometheus."""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+# Límites superiores en segundos; cubren desde un envío en memoria hasta un
+# guardado que esperó un bloqueo de la base.
+CUBETAS_SEGUNDOS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+class Histograma:
+    """Cuenta duraciones por cubeta y acumula su suma, como un histograma de Prometheus."""
+
+    __slots__ = ("limites", "cubetas", "suma", "cantidad", "_cerrojo")
+
+    def __init__(self, limites: Sequence[float] = CUBETAS_SEGUNDOS) -> None:
+        self.limites = tuple(limites)
+        # Una cubeta por límite más la de los valores que los superan a todos.
+        self.cubetas = [0] * (len(self.limites) + 1)
+        self.suma = 0.0
+        self.cantidad = 0
+        self._cerrojo = threading.Lock()
+
+    def observar(self, segundos: float) -> None:
+        """Registra una duración."""
+
+        indice = bisect_left(self.limites, segundos)
+        with self._cerrojo:
+            self.cubetas[indice] += 1
+            self.suma += segundos
+            self.cantidad += 1
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Devuelve las cubetas acumuladas, la suma y la cantidad."""
+
+        with self._cerrojo:
+            cubetas, suma, cantidad = list(self.cubetas), self.suma, self.cantidad
+        acumuladas: List[Tuple[str, int]] = []
+        total = 0
+        for limite, cuenta in zip(self.limites, cubetas):
+            total += cuenta
+            acumuladas.append((repr(limite), total))
+        acumuladas.append(("+Inf", cantidad))
+        return {"cubetas": acumuladas, "suma": suma, "cantidad": cantidad}
+
+
+class _Medicion:
+    """Cronometra el bloque ``with`` y lo suma al histograma de la etapa."""
+
+    __slots__ = ("registro", "etapa", "inicio")
+
+    def __init__(self, registro: "RegistroMetricas", etapa: str) -> None:
+        self.registro = registro
+        self.etapa = etapa
+
+    def __enter__(self) -> "_Medicion":
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion: Any) -> None:
+        self.registro.observar(self.etapa, time.perf_counter() - self.inicio)
+
+
+class _MedicionNula:
+    """Bloque ``with`` vacío que se usa cuando las métricas están apagadas."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_MedicionNula":
+        return self
+
+    def __exit__(self, *excepcion: Any) -> None:
+        return None
+
+
+_MEDICION_NULA = _MedicionNula()
+
+
+class RegistroMetricas:
+    """Métricas del proceso: un histograma por etapa y contadores monótonos.
+
+    Con ``habilitado`` en falso, :meth:`medir` devuelve siempre el mismo
+    bloque vacío y :meth:`incrementar` sale en la primera línea, así que las
+    rutas instrumentadas no leen el reloj ni toman cerrojos.
+    """
+
+    def __init__(self, habilitado: bool = True, limites: Sequence[float] = CUBETAS_SEGUNDOS) -> None:
+        self.habilitado = habilitado
+        self.limites = tuple(limites)
+        self._histogramas: Dict[str, Histograma] = {}
+        self._contadores: Dict[str, int] = {}
+        self._cerrojo = threading.Lock()
+
+    def medir(self, etapa: str) -> Any:
+        """Devuelve un bloque ``with`` que cronometra la etapa."""
+
+        if not self.habilitado:
+            return _MEDICION_NULA
+        return _Medicion(self, etapa)
+
+    def observar(self, etapa: str, segundos: float) -> None:
+        """Suma una duración ya medida al histograma de la etapa."""
+
+        histograma = self._histogramas.get(etapa)
+        if histograma is None:
+            with self._cerrojo:
+                histograma = self._histogramas.setdefault(etapa, Histograma(self.limites))
+        histograma.observar(segundos)
+
+    def incrementar(self, nombre: str, cantidad: int = 1) -> None:
+        """Suma ``cantidad`` al contador ``nombre``."""
+
+        if not self.habilitado:
+            return
+        with self._cerrojo:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def limpiar(self) -> None:
+        """Descarta todas las mediciones."""
+
+        with self._cerrojo:
+            self._histogramas.clear()
+            self._contadores.clear()
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Devuelve los histogramas por etapa y los contadores actuales."""
+
+        with self._cerrojo:
+            histogramas = dict(self._histogramas)
+            contadores = dict(self._contadores)
+        return {
+            "etapas": {
+                etapa: histograma.instantanea()
+                for etapa, histograma in sorted(histogramas.items())
+            },
+            "contadores": dict(sorted(contadores.items())),
+        }
+
+    def exportar_prometheus(self) -> str:
+        """Devuelve las métricas en el formato de texto de Prometheus."""
+
+        datos = self.instantanea()
+        lineas = [
+            "# HELP pedidos_etapa_segundos Duración de cada etapa del flujo del observador.",
+            "# TYPE pedidos_etapa_segundos histogram",
+        ]
+        for etapa, histograma in datos["etapas"].items():
+            for limite, cuenta in histograma["cubetas"]:
+                lineas.append(
+                    f'pedidos_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {cuenta}'
+                )
+            lineas.append(f'pedidos_etapa_segundos_sum{{etapa="{etapa}"}} {histograma["suma"]!r}')
+            lineas.append(f'pedidos_etapa_segundos_count{{etapa="{etapa}"}} {histograma["cantidad"]}')
+        for nombre, valor in datos["contadores"].items():
+            lineas.append(f"# TYPE pedidos_{nombre}_total counter")
+            lineas.append(f"pedidos_{nombre}_total {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+def estimar_percentil(histograma: Dict[str, Any], fraccion: float) -> Optional[float]:
+    """Estima un percentil desde las cubetas acumuladas de :meth:`Histograma.instantanea`.
+
+    Interpola dentro de la cubeta, como ``histogram_quantile`` de Prometheus.
+    Devuelve ``None`` si no hay observaciones.
+    """
+
+    cantidad = histograma["cantidad"]
+    if not cantidad:
+        return None
+    objetivo = fraccion * cantidad
+    anterior_limite, anterior_cuenta = 0.0, 0
+    for limite, cuenta in histograma["cubetas"]:
+        if cuenta >= objetivo:
+            if limite == "+Inf":
+                return anterior_limite
+            superior = float(limite)
+            if cuenta == anterior_cuenta:
+                return superior
+            proporcion = (objetivo - anterior_cuenta) / (cuenta - anterior_cuenta)
+            return anterior_limite + (superior - anterior_limite) * proporcion
+        anterior_limite, anterior_cuenta = float(limite), cuenta
+    return anterior_limite
+
+
+_metricas: Optional[RegistroMetricas] = None
+_cerrojo_metricas = threading.Lock()
+
+
+def obtener_metricas() -> RegistroMetricas:
+    """Devuelve el registro de métricas del proceso."""
+
+    global _metricas
+
+    if _metricas is None:
+        with _cerrojo_metricas:
+            if _metricas is None:
+                _metricas = RegistroMetricas(
+                    habilitado=getattr(settings, "PEDIDOS_METRICAS", True)
+                )
+    return _metricas
+
+
+def medir(etapa: str) -> Any:
+    """Atajo de :meth:`RegistroMetricas.medir` sobre el registro del proceso."""
+
+    # Repite la comprobación de ``RegistroMetricas.medir`` para ahorrar una
+    # llamada en cada etapa cuando las métricas están apagadas.
+    registro = _metricas or obtener_metricas()
+    if not registro.habilitado:
+        return _MEDICION_NULA
+    return _Medicion(registro, etapa)
+
+
+def incrementar(nombre: str, cantidad: int = 1) -> None:
+    """Atajo de :meth:`RegistroMetricas.incrementar` sobre el registro del proceso."""
+
+    (_metricas or obtener_metricas()).incrementar(nombre, cantidad)
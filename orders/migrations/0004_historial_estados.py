@@ -0,0 +1,41 @@
+"""Agrega el historial inmutable de cambios de estado de los pedidos."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ESTADOS = [
+    ("preparing", "Preparando pedido"),
+    ("shipped", "En camino"),
+    ("outside", "Afuera"),
+    ("delivered", "Entregado"),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_indices_listado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderStatusEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("previous_status", models.CharField(choices=ESTADOS, help_text="Estado en el que estaba el pedido antes del cambio.", max_length=20)),
+                ("status", models.CharField(choices=ESTADOS, help_text="Estado al que pasó el pedido.", max_length=20)),
+                ("previous_duration", models.DurationField(help_text="Tiempo que el pedido permaneció en el estado anterior.")),
+                ("created_at", models.DateTimeField(help_text="Momento del cambio; coincide con el ``updated_at`` del pedido.")),
+                ("order", models.ForeignKey(db_constraint=False, help_text="Pedido al que pertenece el cambio de estado.", on_delete=django.db.models.deletion.DO_NOTHING, related_name="eventos_estado", to="orders.order")),
+            ],
+            options={
+                "ordering": ("created_at",),
+                "verbose_name": "Cambio de estado",
+                "verbose_name_plural": "Cambios de estado",
+                "indexes": [
+                    models.Index(fields=["created_at", "previous_status"], name="evento_creado_estado_idx"),
+                    models.Index(fields=["order", "created_at"], name="evento_pedido_creado_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+"""Guarda en el pedido el inicio de su estado actual para medir cada estadía."""
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copiar_actualizacion(apps, schema_editor):
+    # Sin otro dato, el último guardado es la mejor aproximación al último cambio.
+    Order = apps.get_model("orders", "Order")
+    Order.objects.update(status_changed_at=models.F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_historial_estados"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="status_changed_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="Momento en el que el pedido pasó a su estado actual.",
+            ),
+        ),
+        migrations.RunPython(copiar_actualizacion, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="orderstatusevent",
+            name="created_at",
+            field=models.DateTimeField(
+                help_text="Momento del cambio; coincide con el ``status_changed_at`` del pedido.",
+            ),
+        ),
+    ]
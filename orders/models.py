@@ -1,6 +1,9 @@
 """Modelos de la aplicación de pedidos."""
 
+from typing import ClassVar, Dict, FrozenSet, Tuple
+
 from django.db import models
+from django.utils import timezone
 
 
 class Order(models.Model):
@@ -31,9 +34,38 @@ class Order(models.Model):
         auto_now=True,
         help_text="Marca temporal de la última actualización del pedido.",
     )
+    # A diferencia de ``updated_at``, solo cambia con el estado: es el inicio
+    # de la estadía actual que mide el historial.
+    status_changed_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Momento en el que el pedido pasó a su estado actual.",
+    )
+
+    # Máquina de estados calculada una sola vez al definir la clase: cada
+    # estado avanza al siguiente de ``Status`` y el último es terminal.
+    ORDEN_ESTADOS: ClassVar[Tuple[str, ...]] = tuple(Status.values)
+    ESTADOS_VALIDOS: ClassVar[FrozenSet[str]] = frozenset(ORDEN_ESTADOS)
+    INDICE_ESTADO: ClassVar[Dict[str, int]] = {
+        estado: indice for indice, estado in enumerate(ORDEN_ESTADOS)
+    }
+    SIGUIENTE_ESTADO: ClassVar[Dict[str, str]] = dict(zip(ORDEN_ESTADOS, ORDEN_ESTADOS[1:]))
+    ESTADOS_FINALES: ClassVar[FrozenSet[str]] = frozenset({Status.DELIVERED.value})
+    TRANSICIONES_PERMITIDAS: ClassVar[Dict[str, FrozenSet[str]]] = dict(
+        zip(
+            ORDEN_ESTADOS,
+            [frozenset({siguiente}) for siguiente in ORDEN_ESTADOS[1:]] + [frozenset()],
+        )
+    )
 
     class Meta:
         ordering = ("-created_at",)
+        # Acompañan al orden por defecto, al filtro por estado del admin y del
+        # listado paginado por cursor, y a la búsqueda por nombre de la clienta.
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="pedido_creado_idx"),
+            models.Index(fields=["status", "-created_at", "-id"], name="pedido_estado_creado_idx"),
+            models.Index(fields=["customer_name"], name="pedido_cliente_idx"),
+        ]
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
 
@@ -45,15 +77,15 @@ class Order(models.Model):
     def obtener_siguiente_estado(self) -> str:
         """Obtiene el siguiente estado disponible para el pedido."""
 
-        orden_estados = list(self.Status.values)
-        try:
-            indice_actual = orden_estados.index(self.status)
-        except ValueError:
-            return self.Status.PREPARING
+        if self.status in self.ESTADOS_FINALES:
+            return self.status
+        return self.SIGUIENTE_ESTADO.get(self.status, self.Status.PREPARING)
+
+    @classmethod
+    def es_transicion_valida(cls, actual: str, nuevo: str) -> bool:
+        """Indica si la máquina de estados permite pasar de ``actual`` a ``nuevo``."""
 
-        if indice_actual < len(orden_estados) - 1:
-            return orden_estados[indice_actual + 1]
-        return self.status
+        return nuevo in cls.TRANSICIONES_PERMITIDAS.get(actual, ())
 
     def siguiente_estado(self) -> str:
         """Alias en español para compatibilidad semántica."""
@@ -68,9 +100,57 @@ class Order(models.Model):
     def esta_completado(self) -> bool:
         """Indica si el pedido ya llegó a su estado final."""
 
-        return self.status == self.Status.DELIVERED
+        return self.status in self.ESTADOS_FINALES
 
     def is_completed(self) -> bool:
         """Método de compatibilidad con el nombre anterior en inglés."""
 
         return self.esta_completado()
+
+
+class OrderStatusEvent(models.Model):
+    """Registro inmutable de cada cambio de estado de un pedido.
+
+    Cada fila guarda el estado del que sale el pedido y cuánto tiempo estuvo en
+    él, de modo que el tiempo por estado se suma directamente en SQL.
+    """
+
+    # Sin restricción en la base: el historial se escribe en lotes diferidos y
+    # se conserva aunque el pedido se borre.
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="eventos_estado",
+        help_text="Pedido al que pertenece el cambio de estado.",
+    )
+    previous_status = models.CharField(
+        max_length=20,
+        choices=Order.Status.choices,
+        help_text="Estado en el que estaba el pedido antes del cambio.",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Order.Status.choices,
+        help_text="Estado al que pasó el pedido.",
+    )
+    previous_duration = models.DurationField(
+        help_text="Tiempo que el pedido permaneció en el estado anterior.",
+    )
+    created_at = models.DateTimeField(
+        help_text="Momento del cambio; coincide con el ``status_changed_at`` del pedido.",
+    )
+
+    class Meta:
+        ordering = ("created_at",)
+        verbose_name = "Cambio de estado"
+        verbose_name_plural = "Cambios de estado"
+        indexes = [
+            models.Index(fields=["created_at", "previous_status"], name="evento_creado_estado_idx"),
+            models.Index(fields=["order", "created_at"], name="evento_pedido_creado_idx"),
+        ]
+
+    def __str__(self) -> str:
+        """Devuelve una representación legible del cambio."""
+
+        return f"{self.order_id}: {self.previous_status} → {self.status}"
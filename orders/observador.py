@@ -2,14 +2,31 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Iterable, List, Protocol
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple, Union
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
 
+from .bandeja_salida import obtener_bandeja_salida
+from .historial import construir_evento, obtener_historial
+from .instantaneas import obtener_cache_instantaneas
+from .metricas import incrementar, medir
 from .models import Order
-from .servicios import construir_evento_seguimiento
+from .registro import ConjuntoObservadoras, obtener_registro_observadoras
+from .servicios import construir_mensaje_difusion, nombre_grupo_pedido
+
+logger = logging.getLogger(__name__)
 
 
 class ObservadoraPedido(Protocol):
@@ -45,61 +62,532 @@ class ObservadoraCliente:
         return self.actualizar(pedido)
 
 
+# Parte fija de la notificación de cada estado, armada una sola vez.
+_SUFIJOS_NOTIFICACION: Dict[str, str] = {
+    estado: f" recibe una notificación: tu pedido ahora está '{etiqueta}'."
+    for estado, etiqueta in Order.Status.choices
+}
+
+
+class ObservadoraClienteCompacta:
+    """Variante liviana de :class:`ObservadoraCliente` para observadoras de larga vida.
+
+    Usa ``__slots__``, conserva solo las últimas ``maximo`` notificaciones y
+    arma cada mensaje una única vez por estado: las notificaciones repetidas
+    comparten el mismo objeto ``str``.
+    """
+
+    __slots__ = ("nombre", "maximo", "_bufer", "_inicio", "_mensajes", "__weakref__")
+
+    def __init__(self, nombre: str, maximo: Optional[int] = None) -> None:
+        if maximo is None:
+            maximo = getattr(settings, "PEDIDOS_NOTIFICACIONES_MAXIMO", 50)
+        self.nombre = nombre
+        self.maximo = max(1, maximo)
+        # Lista que crece hasta ``maximo`` y luego se sobrescribe en círculo.
+        self._bufer: List[str] = []
+        self._inicio = 0
+        self._mensajes: Dict[str, str] = {}
+
+    @property
+    def notificaciones(self) -> List[str]:
+        """Devuelve las últimas notificaciones de la más vieja a la más nueva."""
+
+        return self._bufer[self._inicio :] + self._bufer[: self._inicio]
+
+    def actualizar(self, pedido: Order) -> str:
+        """Registra y devuelve el mensaje del estado actual del pedido."""
+
+        mensaje = self._mensajes.get(pedido.status)
+        if mensaje is None:
+            sufijo = _SUFIJOS_NOTIFICACION.get(pedido.status) or (
+                f" recibe una notificación: tu pedido ahora está '{pedido.get_status_display()}'."
+            )
+            mensaje = self._mensajes[pedido.status] = self.nombre + sufijo
+        if len(self._bufer) < self.maximo:
+            self._bufer.append(mensaje)
+        else:
+            self._bufer[self._inicio] = mensaje
+            self._inicio = (self._inicio + 1) % self.maximo
+        return mensaje
+
+    def update(self, pedido: Order) -> str:  # pragma: no cover - compatibilidad
+        """Alias en inglés para integraciones existentes."""
+
+        return self.actualizar(pedido)
+
+    def __repr__(self) -> str:
+        return f"ObservadoraClienteCompacta(nombre={self.nombre!r})"
+
+
+def _notificar_observadoras(
+    observadoras: Sequence[ObservadoraPedido], pedido: Order
+) -> Iterable[str]:
+    """Entrega el pedido a cada observadora y produce sus mensajes en orden."""
+
+    for observadora in observadoras:
+        if hasattr(observadora, "actualizar"):
+            yield observadora.actualizar(pedido)
+        else:  # pragma: no cover - ruta de compatibilidad
+            yield observadora.update(pedido)
+
+
+async def _anotificar_observadoras(
+    observadoras: Sequence[ObservadoraPedido], pedido: Order
+) -> List[str]:
+    """Versión asíncrona de :func:`_notificar_observadoras`.
+
+    Las observadoras con ``actualizar`` asíncrono se esperan en el bucle; las
+    síncronas pueden bloquear o usar el ORM, así que corren con
+    ``sync_to_async``, agrupando las consecutivas en un solo salto de hilo.
+    """
+
+    mensajes: List[str] = []
+    sincronas: List[ObservadoraPedido] = []
+    for observadora in observadoras:
+        metodo = getattr(observadora, "actualizar", None) or observadora.update
+        if not asyncio.iscoroutinefunction(metodo):
+            sincronas.append(observadora)
+            continue
+        if sincronas:
+            mensajes.extend(await _anotificar_sincronas(sincronas, pedido))
+            sincronas = []
+        mensajes.append(await metodo(pedido))
+    if sincronas:
+        mensajes.extend(await _anotificar_sincronas(sincronas, pedido))
+    return mensajes
+
+
+@sync_to_async(thread_sensitive=True)
+def _anotificar_sincronas(observadoras: Sequence[ObservadoraPedido], pedido: Order) -> List[str]:
+    """Notifica observadoras síncronas fuera del bucle de eventos."""
+
+    return list(_notificar_observadoras(observadoras, pedido))
+
+
+_pool_observadoras: Optional[ThreadPoolExecutor] = None
+_cerrojo_pool = threading.Lock()
+
+
+def _obtener_pool_observadoras() -> ThreadPoolExecutor:
+    """Devuelve el grupo acotado de hilos para las observadoras síncronas."""
+
+    global _pool_observadoras
+
+    if _pool_observadoras is None:
+        with _cerrojo_pool:
+            if _pool_observadoras is None:
+                _pool_observadoras = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "PEDIDOS_OBSERVADORAS_HILOS", 8),
+                    thread_name_prefix="observadoras-pedidos",
+                )
+    return _pool_observadoras
+
+
+def _despacho_concurrente() -> bool:
+    """Indica si las observadoras se notifican en paralelo según la configuración."""
+
+    return getattr(settings, "PEDIDOS_DESPACHO_OBSERVADORAS", "secuencial") == "concurrente"
+
+
+async def _anotificar_concurrente(
+    observadoras: Sequence[ObservadoraPedido], pedido: Order
+) -> List[str]:
+    """Notifica a todas las observadoras a la vez, cada una con su tiempo máximo.
+
+    Las observadoras con ``actualizar`` asíncrono corren como tareas y las
+    síncronas en el grupo acotado de hilos. Una observadora que falla o que
+    supera su ``tiempo_maximo`` se registra en el log y se omite; los mensajes
+    del resto se devuelven en el orden de las observadoras.
+    """
+
+    bucle = asyncio.get_running_loop()
+    grupo_hilos = _obtener_pool_observadoras()
+    tiempo_por_defecto = getattr(settings, "PEDIDOS_OBSERVADORAS_TIEMPO_MAXIMO", 5.0)
+
+    def lanzar(observadora: ObservadoraPedido) -> Any:
+        metodo = getattr(observadora, "actualizar", None) or observadora.update
+        if asyncio.iscoroutinefunction(metodo):
+            pendiente = metodo(pedido)
+        else:
+            # Al vencer el plazo deja de esperarse, pero el hilo sigue ocupado
+            # hasta que la observadora termina.
+            pendiente = bucle.run_in_executor(grupo_hilos, metodo, pedido)
+        return asyncio.wait_for(
+            pendiente, getattr(observadora, "tiempo_maximo", tiempo_por_defecto)
+        )
+
+    resultados = await asyncio.gather(
+        *(lanzar(observadora) for observadora in observadoras), return_exceptions=True
+    )
+    mensajes: List[str] = []
+    for observadora, resultado in zip(observadoras, resultados):
+        if isinstance(resultado, asyncio.TimeoutError):
+            incrementar("observadoras_vencidas")
+            logger.warning("La observadora %r superó su tiempo máximo", observadora)
+        elif isinstance(resultado, BaseException):
+            incrementar("observadoras_fallidas")
+            logger.error("Falló la observadora %r", observadora, exc_info=resultado)
+        else:
+            mensajes.append(resultado)
+    return mensajes
+
+
+def _notificar(observadoras: Sequence[ObservadoraPedido], pedido: Order) -> Iterable[str]:
+    """Notifica en el modo configurado: en orden (por defecto) o en paralelo."""
+
+    if observadoras and _despacho_concurrente():
+        return async_to_sync(_anotificar_concurrente)(observadoras, pedido)
+    return _notificar_observadoras(observadoras, pedido)
+
+
 class SujetoPedido:
-    """Gestiona la lista de observadoras y emite notificaciones."""
+    """Gestiona las observadoras del pedido y emite notificaciones.
+
+    Además de las observadoras propias del sujeto, notifica a las suscriptas en
+    el registro del proceso para este pedido o para el estado nuevo.
+    """
 
     def __init__(self, pedido: Order) -> None:
         self.pedido = pedido
-        self._observadoras: List[ObservadoraPedido] = []
+        self._observadoras = ConjuntoObservadoras()
 
     def agregar_observadora(self, observadora: ObservadoraPedido) -> None:
         """Agrega una nueva observadora a la lista de suscriptoras."""
 
-        if observadora not in self._observadoras:
-            self._observadoras.append(observadora)
+        self._observadoras.agregar(observadora)
 
     def remover_observadora(self, observadora: ObservadoraPedido) -> None:
         """Elimina una observadora de la lista de suscriptoras."""
 
-        if observadora in self._observadoras:
-            self._observadoras.remove(observadora)
+        self._observadoras.remover(observadora)
 
     def notificar(self) -> Iterable[str]:
         """Notifica a todas las suscriptoras y devuelve los mensajes emitidos."""
 
-        for observadora in list(self._observadoras):
-            if hasattr(observadora, "actualizar"):
-                yield observadora.actualizar(self.pedido)
-            else:  # pragma: no cover - ruta de compatibilidad
-                yield observadora.update(self.pedido)
+        yield from _notificar(self._todas_las_observadoras(), self.pedido)
+
+    async def anotificar(self) -> List[str]:
+        """Versión asíncrona de :meth:`notificar` que devuelve la lista de mensajes."""
+
+        observadoras = self._todas_las_observadoras()
+        if observadoras and _despacho_concurrente():
+            return await _anotificar_concurrente(observadoras, self.pedido)
+        return await _anotificar_observadoras(observadoras, self.pedido)
+
+    def _todas_las_observadoras(self) -> List[ObservadoraPedido]:
+        """Reúne las observadoras propias y las suscriptas en el registro."""
+
+        observadoras = list(self._observadoras)
+        observadoras.extend(
+            obtener_registro_observadoras().observadoras_para(self.pedido.pk, self.pedido.status)
+        )
+        return observadoras
 
     def actualizar_estado(self, nuevo_estado: str) -> List[str]:
         """Actualiza el estado del pedido y notifica a las observadoras."""
 
+        anterior, inicio = self.pedido.status, self.pedido.updated_at
+        cambio = self.pedido.status_changed_at
+        self.pedido.status = nuevo_estado
+        self.pedido.status_changed_at = timezone.now()
+        with medir("sujeto_guardar"):
+            self.pedido.save(update_fields=["status", "status_changed_at", "updated_at"])
+        with medir("sujeto_historial"):
+            obtener_historial().registrar([construir_evento(self.pedido, anterior, cambio)])
+        self._difundir_actualizacion_en_tiempo_real(inicio)
+        with medir("sujeto_observadoras"):
+            return list(self.notificar())
+
+    async def aactualizar_estado(self, nuevo_estado: str) -> List[str]:
+        """Versión asíncrona de :meth:`actualizar_estado` para vistas ASGI.
+
+        Guarda con ``asave`` y espera ``group_send`` directamente en el bucle
+        de eventos, sin pasar por ``async_to_sync``.
+        """
+
+        anterior, inicio = self.pedido.status, self.pedido.updated_at
+        cambio = self.pedido.status_changed_at
+        self.pedido.status = nuevo_estado
+        self.pedido.status_changed_at = timezone.now()
+        with medir("sujeto_guardar"):
+            await self.pedido.asave(update_fields=["status", "status_changed_at", "updated_at"])
+        with medir("sujeto_historial"):
+            await obtener_historial().aregistrar([construir_evento(self.pedido, anterior, cambio)])
+        await self._adifundir_actualizacion_en_tiempo_real(inicio)
+        with medir("sujeto_observadoras"):
+            return await self.anotificar()
+
+    def transicionar(self, estado_esperado: str, nuevo_estado: str) -> Optional[List[str]]:
+        """Cambia el estado solo si en la base sigue siendo ``estado_esperado``.
+
+        Usa un único ``UPDATE ... WHERE id = ? AND status = ?``. Si otra
+        petición cambió el pedido antes, no se modifica ninguna fila, no se
+        difunde nada y se devuelve ``None``. Un salto que la máquina de estados
+        de :class:`Order` no permite lanza ``ValueError`` sin consultar la base.
+        """
+
+        self._validar_transicion(estado_esperado, nuevo_estado)
+        ahora = timezone.now()
+        with medir("sujeto_guardar"):
+            cambiadas = Order.objects.filter(pk=self.pedido.pk, status=estado_esperado).update(
+                status=nuevo_estado, status_changed_at=ahora, updated_at=ahora
+            )
+        if not cambiadas:
+            incrementar("transiciones_en_conflicto")
+            return None
+        inicio, cambio = self.pedido.updated_at, self.pedido.status_changed_at
+        self.pedido.status = nuevo_estado
+        self.pedido.status_changed_at = self.pedido.updated_at = ahora
+        with medir("sujeto_historial"):
+            obtener_historial().registrar([construir_evento(self.pedido, estado_esperado, cambio)])
+        self._difundir_actualizacion_en_tiempo_real(inicio)
+        with medir("sujeto_observadoras"):
+            return list(self.notificar())
+
+    async def atransicionar(self, estado_esperado: str, nuevo_estado: str) -> Optional[List[str]]:
+        """Versión asíncrona de :meth:`transicionar`."""
+
+        self._validar_transicion(estado_esperado, nuevo_estado)
+        ahora = timezone.now()
+        with medir("sujeto_guardar"):
+            cambiadas = await Order.objects.filter(
+                pk=self.pedido.pk, status=estado_esperado
+            ).aupdate(status=nuevo_estado, status_changed_at=ahora, updated_at=ahora)
+        if not cambiadas:
+            incrementar("transiciones_en_conflicto")
+            return None
+        inicio, cambio = self.pedido.updated_at, self.pedido.status_changed_at
         self.pedido.status = nuevo_estado
-        self.pedido.save(update_fields=["status", "updated_at"])
-        self._difundir_actualizacion_en_tiempo_real()
-        return list(self.notificar())
+        self.pedido.status_changed_at = self.pedido.updated_at = ahora
+        with medir("sujeto_historial"):
+            await obtener_historial().aregistrar(
+                [construir_evento(self.pedido, estado_esperado, cambio)]
+            )
+        await self._adifundir_actualizacion_en_tiempo_real(inicio)
+        with medir("sujeto_observadoras"):
+            return await self.anotificar()
+
+    @staticmethod
+    def _validar_transicion(estado_esperado: str, nuevo_estado: str) -> None:
+        """Rechaza los saltos de estado que no figuran en la tabla de transiciones."""
+
+        if not Order.es_transicion_valida(estado_esperado, nuevo_estado):
+            raise ValueError(f"Transición no permitida: {estado_esperado} → {nuevo_estado}")
+
+    def avanzar_estado(self) -> Optional[List[str]]:
+        """Pasa al siguiente estado partiendo del estado leído del pedido."""
+
+        return self.transicionar(self.pedido.status, self.pedido.obtener_siguiente_estado())
 
-    def _difundir_actualizacion_en_tiempo_real(self) -> None:
-        """Envía el estado actual por WebSocket mediante Django Channels."""
+    async def aavanzar_estado(self) -> Optional[List[str]]:
+        """Versión asíncrona de :meth:`avanzar_estado`."""
+
+        return await self.atransicionar(
+            self.pedido.status, self.pedido.obtener_siguiente_estado()
+        )
+
+    def _difundir_actualizacion_en_tiempo_real(self, anterior: datetime) -> None:
+        """Envía el estado actual por WebSocket mediante Django Channels.
+
+        ``anterior`` es el ``updated_at`` previo al cambio, base del delta.
+        """
+
+        with medir("sujeto_construir_evento"):
+            mensaje = construir_mensaje_difusion(self.pedido, anterior)
+        # Si la transacción se revierte, ni la caché ni los sockets deben
+        # enterarse del estado.
+        transaction.on_commit(partial(self._publicar, mensaje))
+
+    def _publicar(self, mensaje: Dict[str, Any]) -> None:
+        """Guarda la instantánea y difunde el mensaje de un cambio ya confirmado."""
+
+        obtener_cache_instantaneas().guardar(self.pedido.pk, mensaje["texto"], mensaje["version"])
 
         capa = get_channel_layer()
         if capa is None:
             return
 
-        datos_seguimiento = construir_evento_seguimiento(self.pedido)
-        grupo = f"pedido_{self.pedido.pk}"
-        async_to_sync(capa.group_send)(
-            grupo,
-            {
-                "type": "enviar_actualizacion",
-                "contenido": datos_seguimiento,
-            },
-        )
+        grupo = nombre_grupo_pedido(self.pedido.pk)
+        bandeja = obtener_bandeja_salida()
+        if bandeja is not None:
+            bandeja.encolar(grupo, mensaje)
+            return
+        with medir("sujeto_group_send"):
+            async_to_sync(capa.group_send)(grupo, mensaje)
+
+    async def _adifundir_actualizacion_en_tiempo_real(self, anterior: datetime) -> None:
+        """Envía el estado actual por WebSocket desde un contexto asíncrono."""
+
+        with medir("sujeto_construir_evento"):
+            mensaje = construir_mensaje_difusion(self.pedido, anterior)
+        obtener_cache_instantaneas().guardar(self.pedido.pk, mensaje["texto"], mensaje["version"])
+
+        capa = get_channel_layer()
+        if capa is None:
+            return
+
+        grupo = nombre_grupo_pedido(self.pedido.pk)
+        bandeja = obtener_bandeja_salida()
+        if bandeja is not None:
+            # Desde el bucle de eventos no hay transacción abierta que esperar.
+            bandeja.encolar(grupo, mensaje)
+            return
+        with medir("sujeto_group_send"):
+            await capa.group_send(grupo, mensaje)
 
     # Alias de compatibilidad con la versión previa en inglés
     attach = agregar_observadora
     detach = remover_observadora
     notify = notificar
     update_status = actualizar_estado
+    aupdate_status = aactualizar_estado
+    advance_status = avanzar_estado
+    aadvance_status = aavanzar_estado
+
+
+class SujetoPedidos:
+    """Aplica un mismo cambio de estado a muchos pedidos en una sola pasada.
+
+    Reemplaza el bucle sobre :class:`SujetoPedido` durante las oleadas de
+    despacho: una sola sentencia ``UPDATE ... WHERE id IN`` por lote, una sola
+    carga útil de seguimiento compartida y los envíos a los grupos de canales
+    lanzados en paralelo sobre un único bucle de eventos.
+    """
+
+    def __init__(self) -> None:
+        self._observadoras = ConjuntoObservadoras()
+
+    def agregar_observadora(self, observadora: ObservadoraPedido) -> None:
+        """Agrega una observadora que recibirá cada pedido del lote."""
+
+        self._observadoras.agregar(observadora)
+
+    def remover_observadora(self, observadora: ObservadoraPedido) -> None:
+        """Elimina una observadora de la lista de suscriptoras."""
+
+        self._observadoras.remover(observadora)
+
+    def actualizar_estados(
+        self,
+        pedidos: Union[QuerySet, Iterable[Union[Order, int]]],
+        nuevo_estado: str,
+    ) -> Dict[int, List[str]]:
+        """Actualiza el estado de todos los pedidos y notifica a las observadoras.
+
+        ``pedidos`` puede ser un queryset, instancias de :class:`Order` o
+        identificadores. Devuelve, por clave primaria, la misma lista de
+        mensajes que produciría :meth:`SujetoPedido.actualizar_estado`.
+        """
+
+        lote = self._resolver_pedidos(pedidos)
+        if not lote:
+            return {}
+
+        ahora = timezone.now()
+        identificadores = [pedido.pk for pedido in lote]
+        tamano_bloque = connection.features.max_query_params or len(identificadores)
+        with transaction.atomic():
+            for inicio in range(0, len(identificadores), tamano_bloque):
+                Order.objects.filter(
+                    pk__in=identificadores[inicio : inicio + tamano_bloque]
+                ).update(status=nuevo_estado, status_changed_at=ahora, updated_at=ahora)
+
+        eventos = []
+        bases = {}
+        for pedido in lote:
+            anterior, inicio, cambio = pedido.status, pedido.updated_at, pedido.status_changed_at
+            pedido.status = nuevo_estado
+            pedido.status_changed_at = pedido.updated_at = ahora
+            eventos.append(construir_evento(pedido, anterior, cambio))
+            bases[pedido.pk] = inicio
+        obtener_historial().registrar(eventos)
+
+        self._difundir_actualizaciones_en_tiempo_real(lote, bases)
+
+        observadoras = list(self._observadoras)
+        registro = obtener_registro_observadoras()
+        return {
+            pedido.pk: list(
+                _notificar(observadoras + registro.observadoras_para(pedido.pk, nuevo_estado), pedido)
+            )
+            for pedido in lote
+        }
+
+    @staticmethod
+    def _resolver_pedidos(
+        pedidos: Union[QuerySet, Iterable[Union[Order, int]]],
+    ) -> List[Order]:
+        """Convierte la entrada en instancias de pedido con una sola consulta.
+
+        Cada pedido aparece una sola vez, en el orden de su primera mención,
+        para no notificarlo ni difundirlo dos veces.
+        """
+
+        if isinstance(pedidos, QuerySet):
+            return list(pedidos)
+
+        entradas = [
+            pedido if isinstance(pedido, Order) else int(pedido) for pedido in pedidos
+        ]
+        instancias = {
+            entrada.pk: entrada for entrada in reversed(entradas) if isinstance(entrada, Order)
+        }
+        faltantes = [
+            pk
+            for pk in dict.fromkeys(entrada for entrada in entradas if isinstance(entrada, int))
+            if pk not in instancias
+        ]
+        if faltantes:
+            instancias.update(Order.objects.in_bulk(faltantes))
+
+        unicos: Dict[int, Order] = {}
+        for entrada in entradas:
+            pk = entrada.pk if isinstance(entrada, Order) else entrada
+            if pk in instancias:
+                unicos.setdefault(pk, instancias[pk])
+        return list(unicos.values())
+
+    def _difundir_actualizaciones_en_tiempo_real(
+        self, lote: Sequence[Order], bases: Dict[int, datetime]
+    ) -> None:
+        """Envía el nuevo estado de todo el lote por WebSocket.
+
+        ``bases`` guarda el ``updated_at`` previo de cada pedido para su delta.
+        """
+
+        mensajes = [construir_mensaje_difusion(pedido, bases[pedido.pk]) for pedido in lote]
+        transaction.on_commit(partial(_publicar_lote, mensajes))
+
+    # Alias de compatibilidad con la nomenclatura en inglés
+    attach = agregar_observadora
+    detach = remover_observadora
+    update_statuses = actualizar_estados
+
+
+def _publicar_lote(mensajes: Sequence[Dict[str, Any]]) -> None:
+    """Guarda las instantáneas y difunde los mensajes de un lote ya confirmado."""
+
+    instantaneas = obtener_cache_instantaneas()
+    for mensaje in mensajes:
+        instantaneas.guardar(mensaje["pedido"], mensaje["texto"], mensaje["version"])
+
+    capa = get_channel_layer()
+    if capa is None:
+        return
+
+    envios = [(nombre_grupo_pedido(mensaje["pedido"]), mensaje) for mensaje in mensajes]
+    bandeja = obtener_bandeja_salida()
+    if bandeja is not None:
+        for grupo, mensaje in envios:
+            bandeja.encolar(grupo, mensaje)
+        return
+    async_to_sync(_enviar_a_grupos)(capa, envios)
+
+
+async def _enviar_a_grupos(
+    capa: Any, envios: Sequence[Tuple[str, Dict[str, Any]]]
+) -> None:
+    """Envía a cada grupo su mensaje de forma concurrente."""
+
+    await asyncio.gather(*(capa.group_send(grupo, mensaje) for grupo, mensaje in envios))
@@ -0,0 +1,182 @@
+"""Registro de observadoras por pedido y por estado con referencias débiles."""
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class _ReferenciaFuerte:
+    """Imita la interfaz de ``weakref.ref`` manteniendo viva a la observadora."""
+
+    __slots__ = ("_objeto",)
+
+    def __init__(self, objeto: Any) -> None:
+        self._objeto = objeto
+
+    def __call__(self) -> Any:
+        return self._objeto
+
+
+class ConjuntoObservadoras:
+    """Conjunto de observadoras en orden de alta con altas y bajas en O(1).
+
+    Las observadoras se identifican por identidad (``id``), no por igualdad,
+    porque las ``dataclass`` comparables no son *hashables*. Con ``debil`` se
+    guardan referencias débiles y cada observadora sale sola del conjunto
+    cuando deja de usarse en otro lado; si con eso el conjunto queda vacío se
+    llama a ``al_vaciarse``.
+    """
+
+    __slots__ = ("debil", "al_vaciarse", "_referencias", "__weakref__")
+
+    def __init__(
+        self, debil: bool = False, al_vaciarse: Optional[Callable[[], None]] = None
+    ) -> None:
+        self.debil = debil
+        self.al_vaciarse = al_vaciarse
+        self._referencias: Dict[int, Callable[[], Any]] = {}
+
+    def agregar(self, observadora: Any) -> None:
+        """Agrega la observadora si todavía no estaba."""
+
+        clave = id(observadora)
+        if clave in self._referencias:
+            return
+        if not self.debil:
+            self._referencias[clave] = _ReferenciaFuerte(observadora)
+            return
+
+        conjunto = weakref.ref(self)
+
+        def descartar(referencia: weakref.ref) -> None:
+            propio = conjunto()
+            if propio is not None and propio._referencias.get(clave) is referencia:
+                del propio._referencias[clave]
+                if not propio._referencias and propio.al_vaciarse is not None:
+                    propio.al_vaciarse()
+
+        self._referencias[clave] = weakref.ref(observadora, descartar)
+
+    def remover(self, observadora: Any) -> None:
+        """Quita la observadora si estaba en el conjunto."""
+
+        clave = id(observadora)
+        referencia = self._referencias.get(clave)
+        if referencia is not None and referencia() is observadora:
+            del self._referencias[clave]
+
+    def __contains__(self, observadora: Any) -> bool:
+        referencia = self._referencias.get(id(observadora))
+        return referencia is not None and referencia() is observadora
+
+    def __iter__(self) -> Iterator[Any]:
+        # Se recorre una copia para tolerar altas y bajas durante la notificación.
+        for referencia in list(self._referencias.values()):
+            observadora = referencia()
+            if observadora is not None:
+                yield observadora
+
+    def __len__(self) -> int:
+        return len(self._referencias)
+
+
+_Clave = Tuple[Optional[int], Optional[str]]
+
+
+class RegistroObservadoras:
+    """Observadoras del proceso agrupadas por pedido y por estado de destino.
+
+    Una suscripción sin ``pedido_id`` aplica a todos los pedidos y una sin
+    ``estado`` a todas las transiciones. Al notificar solo se recorren los
+    cuatro grupos que corresponden al pedido y al estado nuevo, en este orden:
+    generales, generales del estado, del pedido y del pedido en ese estado.
+    Los grupos que quedan vacíos, por bajas o por recolección de sus
+    observadoras, se eliminan para no acumular una clave por cada pedido.
+    """
+
+    def __init__(self, debil: bool = True) -> None:
+        self.debil = debil
+        self._grupos: Dict[_Clave, ConjuntoObservadoras] = {}
+        # Reentrante: el recolector puede descartar un grupo mientras este
+        # mismo hilo está dentro de ``agregar``.
+        self._cerrojo = threading.RLock()
+
+    def agregar(
+        self, observadora: Any, pedido_id: Optional[int] = None, estado: Optional[str] = None
+    ) -> None:
+        """Suscribe la observadora al pedido y al estado indicados."""
+
+        clave = (pedido_id, estado)
+        with self._cerrojo:
+            grupo = self._grupos.get(clave)
+            if grupo is None:
+                grupo = ConjuntoObservadoras(self.debil, self._descartador(clave))
+            grupo.agregar(observadora)
+            # Se reinserta por si la recolección vació y quitó el grupo en medio del alta.
+            self._grupos[clave] = grupo
+
+    def remover(
+        self, observadora: Any, pedido_id: Optional[int] = None, estado: Optional[str] = None
+    ) -> None:
+        """Cancela la suscripción indicada, si existía."""
+
+        with self._cerrojo:
+            grupo = self._grupos.get((pedido_id, estado))
+            if grupo is None:
+                return
+            grupo.remover(observadora)
+            if not grupo:
+                del self._grupos[(pedido_id, estado)]
+
+    def _descartador(self, clave: _Clave) -> Callable[[], None]:
+        registro = weakref.ref(self)
+
+        def descartar() -> None:
+            propio = registro()
+            if propio is None:
+                return
+            with propio._cerrojo:
+                grupo = propio._grupos.get(clave)
+                if grupo is not None and not grupo:
+                    del propio._grupos[clave]
+
+        return descartar
+
+    def observadoras_para(self, pedido_id: int, estado: str) -> List[Any]:
+        """Devuelve las observadoras interesadas en que ``pedido_id`` pase a ``estado``."""
+
+        if not self._grupos:
+            return []
+        observadoras: List[Any] = []
+        for clave in ((None, None), (None, estado), (pedido_id, None), (pedido_id, estado)):
+            grupo = self._grupos.get(clave)
+            if grupo:
+                observadoras.extend(grupo)
+        return observadoras
+
+    def limpiar(self) -> None:
+        """Elimina todas las suscripciones."""
+
+        with self._cerrojo:
+            self._grupos.clear()
+
+    def __len__(self) -> int:
+        return sum(len(grupo) for grupo in list(self._grupos.values()))
+
+
+_registro: Optional[RegistroObservadoras] = None
+_cerrojo_registro = threading.Lock()
+
+
+def obtener_registro_observadoras() -> RegistroObservadoras:
+    """Devuelve el registro de observadoras del proceso."""
+
+    global _registro
+
+    if _registro is None:
+        with _cerrojo_registro:
+            if _registro is None:
+                _registro = RegistroObservadoras()
+    return _registro
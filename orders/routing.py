@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from django.urls import path
 
-from .consumers import ConsumidorSeguimientoPedido
+from .consumers import ConsumidorSeguimientoPedido, ConsumidorSeguimientoPedidos
 
 websocket_urlpatterns = [
+    path("ws/pedidos/", ConsumidorSeguimientoPedidos.as_asgi()),
     path("ws/pedidos/<int:pedido_id>/", ConsumidorSeguimientoPedido.as_asgi()),
 ]
@@ -2,35 +2,266 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
 
 from .models import Order
 
+try:  # pragma: no cover - dependencia opcional
+    import orjson
+except ImportError:  # pragma: no cover - se usa la biblioteca estándar
+    orjson = None
+
+
+def identificador_valido(pedido_id: int) -> bool:
+    """Indica si ``pedido_id`` cabe en la clave primaria (entero positivo de 64 bits)."""
+
+    return 0 < pedido_id < 2**63
+
+
+def nombre_grupo_pedido(pedido_id: int) -> str:
+    """Devuelve el nombre del grupo de canales asociado a un pedido."""
+
+    return f"pedido_{pedido_id}"
+
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSEGUNDO = timedelta(microseconds=1)
+
+
+def version_seguimiento(pedido: Order) -> int:
+    """Devuelve la versión del evento: ``updated_at`` en microsegundos desde la época.
+
+    Crece con cada cambio de estado y permite descartar eventos viejos que
+    lleguen fuera de orden.
+    """
+
+    return (pedido.updated_at - _EPOCA) // _MICROSEGUNDO
+
+
+def codificar_json(datos: Any) -> str:
+    """Codifica en JSON compacto conservando los caracteres en español.
+
+    Usa ``orjson`` cuando está instalado y la biblioteca estándar en otro caso.
+    """
+
+    if orjson is not None:
+        return orjson.dumps(datos).decode()
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":"))
+
+
+class _PlantillaSeguimiento(NamedTuple):
+    """Partes del evento de seguimiento que solo dependen del estado."""
+
+    descripcion: str
+    pasos: Tuple[Mapping[str, Any], ...]
+    prefijo_json: str
+    sufijo_json: str
+    prefijo_delta: str
+
+
+def _armar_plantilla(estado: str, descripcion: str, indice_actual: int) -> _PlantillaSeguimiento:
+    """Precalcula los pasos y los fragmentos JSON para un estado."""
+
+    pasos = [
+        {
+            "valor": valor,
+            "etiqueta": etiqueta,
+            "alcanzado": indice <= indice_actual,
+        }
+        for indice, (valor, etiqueta) in enumerate(Order.Status.choices)
+    ]
+    prefijo_json = (
+        '{"tipo":"seguimiento","estado":'
+        f'{codificar_json(estado)},"descripcion_estado":{codificar_json(descripcion)},'
+        '"actualizado":"'
+    )
+    sufijo_json = f'","progreso":{codificar_json({"pasos": pasos})}}}'
+    prefijo_delta = f'{{"tipo":"delta","estado":{codificar_json(estado)},"actualizado":"'
+    return _PlantillaSeguimiento(
+        descripcion,
+        tuple(MappingProxyType(paso) for paso in pasos),
+        prefijo_json,
+        sufijo_json,
+        prefijo_delta,
+    )
+
+
+# Tabla construida una única vez al importar el módulo. Los pasos se comparten
+# entre todos los eventos del mismo estado, por eso se guardan de solo lectura.
+_PLANTILLAS_SEGUIMIENTO: Dict[str, _PlantillaSeguimiento] = {
+    estado: _armar_plantilla(estado, descripcion, Order.INDICE_ESTADO[estado])
+    for estado, descripcion in Order.Status.choices
+}
+
+
+def _obtener_plantilla(estado: str) -> _PlantillaSeguimiento:
+    """Devuelve la plantilla del estado, armándola al vuelo si es desconocido."""
+
+    plantilla = _PLANTILLAS_SEGUIMIENTO.get(estado)
+    if plantilla is None:
+        plantilla = _armar_plantilla(estado, estado, 0)
+    return plantilla
+
 
 def construir_evento_seguimiento(pedido: Order) -> Dict[str, Any]:
     """Arma la carga útil con la información del seguimiento del pedido."""
 
-    etiquetas = dict(Order.Status.choices)
-    estados = list(Order.Status.values)
-    try:
-        indice_actual = estados.index(pedido.status)
-    except ValueError:
-        indice_actual = 0
-
-    pasos: List[Dict[str, Any]] = []
-    for indice, estado in enumerate(estados):
-        pasos.append(
-            {
-                "valor": estado,
-                "etiqueta": etiquetas[estado],
-                "alcanzado": indice <= indice_actual,
-            }
-        )
-
+    plantilla = _obtener_plantilla(pedido.status)
     return {
         "tipo": "seguimiento",
         "estado": pedido.status,
-        "descripcion_estado": etiquetas.get(pedido.status, pedido.status),
+        "descripcion_estado": plantilla.descripcion,
         "actualizado": pedido.updated_at.isoformat(),
-        "progreso": {"pasos": pasos},
+        # Copias propias: quien recibe el evento puede modificarlo sin
+        # alterar la plantilla compartida.
+        "progreso": {"pasos": [dict(paso) for paso in plantilla.pasos]},
     }
+
+
+def serializar_evento_seguimiento(pedido: Order) -> str:
+    """Devuelve el evento de seguimiento ya codificado como texto JSON.
+
+    Equivale a codificar :func:`construir_evento_seguimiento`, pero solo
+    concatena la marca temporal entre los fragmentos precalculados del estado.
+    """
+
+    plantilla = _obtener_plantilla(pedido.status)
+    return plantilla.prefijo_json + pedido.updated_at.isoformat() + plantilla.sufijo_json
+
+
+def serializar_delta_seguimiento(pedido: Order, anterior: datetime) -> str:
+    """Devuelve el cambio de estado respecto del evento cuyo ``actualizado`` es ``anterior``.
+
+    Solo lleva ``estado``, ``actualizado`` y ``base``; la descripción y los
+    pasos alcanzados se deducen del evento completo que ya tiene la clienta.
+    Si ``base`` no coincide con su ``actualizado``, le falta un cambio y debe
+    pedir ``resincronizar``.
+    """
+
+    plantilla = _obtener_plantilla(pedido.status)
+    return f'{plantilla.prefijo_delta}{pedido.updated_at.isoformat()}","base":"{anterior.isoformat()}"}}'
+
+
+def construir_mensaje_difusion(
+    pedido: Order, anterior: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Arma el mensaje de la capa de canales con el evento ya serializado.
+
+    El texto se codifica una sola vez y cada consumidor del grupo lo reenvía
+    tal cual, sin volver a pasar por JSON; lo mismo la trama binaria. Con
+    ``anterior`` (el
+    ``updated_at`` previo al cambio) incluye además el delta, que los sockets
+    envían en lugar del evento completo cuando la clienta tiene ese estado.
+    """
+
+    plantilla = _obtener_plantilla(pedido.status)
+    actualizado = pedido.updated_at.isoformat()
+    version = version_seguimiento(pedido)
+    mensaje = {
+        "type": "enviar_actualizacion",
+        "pedido": pedido.pk,
+        "texto": plantilla.prefijo_json + actualizado + plantilla.sufijo_json,
+        "version": version,
+        "binario": empaquetar_estado_binario(pedido.status, version),
+    }
+    if anterior is not None:
+        base = anterior.isoformat()
+        mensaje["actualizado"] = actualizado
+        mensaje["base"] = base
+        mensaje["delta"] = f'{plantilla.prefijo_delta}{actualizado}","base":"{base}"}}'
+    return mensaje
+
+
+_MARCA_ACTUALIZADO = '"actualizado":"'
+
+
+def actualizado_de_evento(texto: str) -> Optional[str]:
+    """Extrae ``actualizado`` de un evento serializado sin decodificar el JSON."""
+
+    inicio = texto.find(_MARCA_ACTUALIZADO)
+    if inicio < 0:
+        return None
+    inicio += len(_MARCA_ACTUALIZADO)
+    return texto[inicio : texto.find('"', inicio)]
+
+
+def enmarcar_evento_pedido(pedido_id: int, texto: str) -> str:
+    """Antepone ``"pedido"`` a un evento serializado para los sockets de varios pedidos.
+
+    Inserta la clave en el texto ya codificado en lugar de volver a pasar
+    por JSON.
+    """
+
+    return f'{{"pedido":{int(pedido_id)},{texto[1:]}'
+
+
+# Protocolo binario opcional del socket de seguimiento, que la clienta pide
+# con este subprotocolo. La primera trama es el catálogo: el byte
+# ``TRAMA_CATALOGO`` seguido del JSON ``[[valor, etiqueta], ...]`` de los
+# estados; su posición en la lista es el código de cada uno. Después, cada
+# trama ``TRAMA_ESTADO`` lleva el estado completo en 10 bytes big-endian:
+# tipo (1), código de estado (1; 255 si es desconocido) y ``actualizado`` en
+# microsegundos desde la época (8). Los pasos alcanzados son los de código
+# menor o igual, así que no hacen falta deltas.
+SUBPROTOCOLO_BINARIO = "pedidos.binario.v1"
+TRAMA_CATALOGO = 0
+TRAMA_ESTADO = 1
+CODIGO_ESTADO_DESCONOCIDO = 255
+_TRAMA_ESTADO = struct.Struct("!BBq")
+
+CATALOGO_BINARIO = bytes([TRAMA_CATALOGO]) + codificar_json(
+    [[valor, etiqueta] for valor, etiqueta in Order.Status.choices]
+).encode()
+
+
+def empaquetar_estado_binario(estado: str, version: int) -> bytes:
+    """Arma la trama binaria de un estado con su versión en microsegundos."""
+
+    return _TRAMA_ESTADO.pack(
+        TRAMA_ESTADO, Order.INDICE_ESTADO.get(estado, CODIGO_ESTADO_DESCONOCIDO), version
+    )
+
+
+def desempaquetar_estado_binario(trama: bytes) -> Tuple[str, int]:
+    """Devuelve el estado y la versión de una trama ``TRAMA_ESTADO``."""
+
+    _, codigo, version = _TRAMA_ESTADO.unpack(trama)
+    return Order.ORDEN_ESTADOS[codigo] if codigo < len(Order.ORDEN_ESTADOS) else "", version
+
+
+_MARCA_ESTADO = '"estado":'
+
+
+def empaquetar_evento_binario(texto: str) -> bytes:
+    """Convierte un evento de seguimiento serializado en su trama binaria."""
+
+    inicio = texto.index(_MARCA_ESTADO) + len(_MARCA_ESTADO)
+    estado = json.JSONDecoder().raw_decode(texto, inicio)[0]
+    actualizado = datetime.fromisoformat(actualizado_de_evento(texto) or "")
+    return empaquetar_estado_binario(estado, (actualizado - _EPOCA) // _MICROSEGUNDO)
+
+
+def codificar_cursor(creado: datetime, pedido_id: int) -> str:
+    """Arma el cursor opaco del listado a partir de la última fila entregada."""
+
+    return f"{(creado - _EPOCA) // _MICROSEGUNDO}.{pedido_id}"
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Recupera ``(created_at, id)`` de un cursor; lanza ``ValueError`` si es inválido."""
+
+    microsegundos, separador, pedido_id = cursor.partition(".")
+    if not separador:
+        raise ValueError(cursor)
+    identificador = int(pedido_id)
+    # Un id fuera de un entero de 64 bits haría fallar a la base de datos.
+    if not 0 <= identificador < 2**63:
+        raise ValueError(cursor)
+    try:
+        return _EPOCA + int(microsegundos) * _MICROSEGUNDO, identificador
+    except OverflowError as error:
+        raise ValueError(cursor) from error
@@ -1,15 +1,74 @@
 """Pruebas automáticas para el patrón observador con canales."""
 
-from asgiref.sync import async_to_sync
+import asyncio
+import gc
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Callable
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
-from django.test import TestCase
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .bandeja_salida import BandejaSalida, obtener_bandeja_salida
+from .capa_local import CapaCanalesLocal
+from .consumers import (
+    CIERRE_CLIENTA_LENTA,
+    ConsumidorSeguimientoPedido,
+    ConsumidorSeguimientoPedidos,
+    _cargar_instantaneas,
+)
+from .instantaneas import CacheInstantaneas, obtener_cache_instantaneas
+from .historial import HistorialEstados, construir_evento, obtener_historial, tiempo_en_estados
+from .metricas import RegistroMetricas, estimar_percentil, obtener_metricas
+from .models import Order, OrderStatusEvent
+from .observador import (
+    ObservadoraCliente,
+    ObservadoraClienteCompacta,
+    SujetoPedido,
+    SujetoPedidos,
+)
+from .registro import ConjuntoObservadoras, RegistroObservadoras, obtener_registro_observadoras
+from .servicios import (
+    CATALOGO_BINARIO,
+    SUBPROTOCOLO_BINARIO,
+    construir_evento_seguimiento,
+    construir_mensaje_difusion,
+    desempaquetar_estado_binario,
+    empaquetar_evento_binario,
+    enmarcar_evento_pedido,
+    serializar_delta_seguimiento,
+    serializar_evento_seguimiento,
+    version_seguimiento,
+)
+
+
+class HistorialAislado:
+    """Mezcla que arranca cada prueba con el búfer global del historial vacío."""
 
-from .models import Order
-from .observador import ObservadoraCliente, SujetoPedido
-from .servicios import construir_evento_seguimiento
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_historial().limpiar()
 
 
-class PruebasPatronObservador(TestCase):
+def setUpModule() -> None:
+    # Sin vaciado por tiempo: el temporizador escribiría desde otro hilo
+    # mientras una prueba posterior tiene tomada la base de datos.
+    obtener_historial().temporizador = False
+
+
+class PruebasPatronObservador(HistorialAislado, TestCase):
     """Verifica que las notificaciones se generen correctamente."""
 
     def test_clienta_recibe_notificacion_al_cambiar_estado(self) -> None:
@@ -41,6 +100,68 @@ class PruebasPatronObservador(TestCase):
         self.assertEqual(evento["estado"], Order.Status.OUTSIDE)
         self.assertTrue(evento["progreso"]["pasos"][2]["alcanzado"])
 
+    def test_modificar_un_evento_no_altera_los_siguientes(self) -> None:
+        """Cada evento debe tener su propio progreso aunque la plantilla se comparta."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        evento = construir_evento_seguimiento(pedido)
+        evento["progreso"]["pasos"][0]["alcanzado"] = False
+        evento["progreso"]["pasos"].append({"valor": "extra"})
+
+        siguiente = construir_evento_seguimiento(pedido)
+        self.assertTrue(siguiente["progreso"]["pasos"][0]["alcanzado"])
+        self.assertEqual(len(siguiente["progreso"]["pasos"]), len(Order.Status.choices))
+        self.assertEqual(json.loads(serializar_evento_seguimiento(pedido)), siguiente)
+
+    def test_evento_serializado_coincide_con_el_diccionario(self) -> None:
+        """El texto precalculado debe decodificar al mismo evento de seguimiento."""
+
+        for estado in Order.Status.values:
+            pedido = Order.objects.create(customer_name="Laura", status=estado)
+            evento = json.loads(json.dumps(construir_evento_seguimiento(pedido)))
+
+            self.assertEqual(json.loads(serializar_evento_seguimiento(pedido)), evento)
+
+    def test_delta_aplicado_reproduce_el_evento_completo(self) -> None:
+        """Aplicar el delta al evento anterior debe dar el evento del nuevo estado."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        evento = json.loads(serializar_evento_seguimiento(pedido))
+        for estado in Order.ORDEN_ESTADOS[1:]:
+            anterior = pedido.updated_at
+            SujetoPedido(pedido).actualizar_estado(estado)
+            delta = json.loads(serializar_delta_seguimiento(pedido, anterior))
+
+            self.assertEqual(delta["base"], evento["actualizado"])
+            pasos = evento["progreso"]["pasos"]
+            indice = [paso["valor"] for paso in pasos].index(delta["estado"])
+            evento = {
+                **evento,
+                "estado": delta["estado"],
+                "descripcion_estado": pasos[indice]["etiqueta"],
+                "actualizado": delta["actualizado"],
+                "progreso": {
+                    "pasos": [
+                        {**paso, "alcanzado": posicion <= indice}
+                        for posicion, paso in enumerate(pasos)
+                    ]
+                },
+            }
+            self.assertEqual(evento, json.loads(serializar_evento_seguimiento(pedido)))
+
+    def test_trama_binaria_equivale_al_evento_serializado(self) -> None:
+        """La trama armada desde el texto debe coincidir con la del mensaje de difusión."""
+
+        etiquetas = json.loads(CATALOGO_BINARIO[1:])
+        for estado in Order.Status.values:
+            pedido = Order.objects.create(customer_name="Laura", status=estado)
+            trama = construir_mensaje_difusion(pedido)["binario"]
+
+            self.assertEqual(empaquetar_evento_binario(serializar_evento_seguimiento(pedido)), trama)
+            estado_trama, version = desempaquetar_estado_binario(trama)
+            self.assertEqual((estado_trama, version), (estado, version_seguimiento(pedido)))
+            self.assertEqual(etiquetas[trama[1]], [estado, pedido.get_status_display()])
+
     def test_canal_recibe_actualizacion_en_tiempo_real(self) -> None:
         """El sujeto debe enviar la actualización mediante Django Channels."""
 
@@ -56,8 +177,1494 @@ class PruebasPatronObservador(TestCase):
         grupo = f"pedido_{pedido.pk}"
         async_to_sync(capa.group_add)(grupo, nombre_canal)
 
-        sujeto.actualizar_estado(Order.Status.SHIPPED)
+        with self.captureOnCommitCallbacks(execute=True):
+            sujeto.actualizar_estado(Order.Status.SHIPPED)
 
         mensaje = async_to_sync(capa.receive)(nombre_canal)
         self.assertEqual(mensaje["type"], "enviar_actualizacion")
-        self.assertEqual(mensaje["contenido"]["estado"], Order.Status.SHIPPED)
+        self.assertEqual(json.loads(mensaje["texto"])["estado"], Order.Status.SHIPPED)
+
+
+class PruebasMaquinaEstados(HistorialAislado, TestCase):
+    """Verifica la tabla de transiciones precalculada de ``Order``."""
+
+    def test_tabla_equivale_al_orden_de_los_estados(self) -> None:
+        """Cada estado avanza al siguiente y el último es terminal."""
+
+        esperados = {
+            "preparing": "shipped",
+            "shipped": "outside",
+            "outside": "delivered",
+            "delivered": "delivered",
+            "desconocido": "preparing",
+        }
+        for actual, siguiente in esperados.items():
+            pedido = Order(status=actual)
+            self.assertEqual(pedido.obtener_siguiente_estado(), siguiente)
+            self.assertEqual(pedido.esta_completado(), actual == "delivered")
+
+    def test_rechaza_saltos_sin_consultar_la_base(self) -> None:
+        """Un salto no permitido debe fallar antes de emitir el ``UPDATE``."""
+
+        self.assertTrue(Order.es_transicion_valida("preparing", "shipped"))
+        self.assertFalse(Order.es_transicion_valida("preparing", "delivered"))
+        self.assertFalse(Order.es_transicion_valida("delivered", "preparing"))
+
+        pedido = Order.objects.create(customer_name="Laura")
+        with self.assertNumQueries(0), self.assertRaises(ValueError):
+            SujetoPedido(pedido).transicionar("preparing", "delivered")
+
+
+class PruebasVistasAsincronas(HistorialAislado, TestCase):
+    """Verifica las vistas que actualizan el estado desde el bucle de eventos."""
+
+    async def test_avance_usa_la_ruta_asincrona_del_sujeto(self) -> None:
+        """El avance debe guardar el nuevo estado y devolver la notificación."""
+
+        respuesta = await self.async_client.post("/actualizar/")
+
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos["estado"], Order.Status.SHIPPED)
+        self.assertEqual(len(datos["notificaciones"]), 1)
+        pedido = await Order.objects.aget(customer_name="Laura")
+        self.assertEqual(pedido.status, Order.Status.SHIPPED)
+
+    async def test_observadora_sincrona_puede_usar_el_orm(self) -> None:
+        """Una observadora síncrona del registro no debe correr en el bucle de eventos."""
+
+        class ObservadoraConteo:
+            def actualizar(self, pedido: Order) -> str:
+                return f"Pedidos activos: {Order.objects.count()}"
+
+        observadora = ObservadoraConteo()
+        registro = obtener_registro_observadoras()
+        registro.agregar(observadora)
+        self.addCleanup(registro.limpiar)
+
+        respuesta = await self.async_client.post("/actualizar/")
+
+        self.assertEqual(respuesta.status_code, 200)
+        total = await Order.objects.acount()
+        self.assertIn(f"Pedidos activos: {total}", respuesta.json()["notificaciones"])
+
+    async def test_definir_rechaza_estados_invalidos(self) -> None:
+        """Un estado desconocido debe responder con un error 400."""
+
+        respuesta = await self.async_client.post(
+            "/definir/", {"estado": "perdido"}, content_type="application/json"
+        )
+
+        self.assertEqual(respuesta.status_code, 400)
+
+    async def test_sujeto_asincrono_difunde_sin_async_to_sync(self) -> None:
+        """``aactualizar_estado`` debe enviar el evento al grupo del pedido."""
+
+        capa = get_channel_layer()
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        nombre_canal = await capa.new_channel("test_")
+        await capa.group_add(f"pedido_{pedido.pk}", nombre_canal)
+
+        await SujetoPedido(pedido).aactualizar_estado(Order.Status.DELIVERED)
+
+        mensaje = await capa.receive(nombre_canal)
+        self.assertEqual(json.loads(mensaje["texto"])["estado"], Order.Status.DELIVERED)
+
+
+class PruebasDatosCondicionales(HistorialAislado, TestCase):
+    """Verifica las respuestas condicionales y el sondeo largo de ``datos/``."""
+
+    async def test_responde_304_con_etag_vigente(self) -> None:
+        """Si el ETag coincide no debe volver a enviarse la carga útil."""
+
+        primera = await self.async_client.get("/datos/")
+        etag = primera["ETag"]
+
+        segunda = await self.async_client.get("/datos/", headers={"if-none-match": etag})
+
+        self.assertEqual(primera.status_code, 200)
+        self.assertIn("Last-Modified", primera)
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(segunda.content, b"")
+
+    async def test_sondeo_largo_devuelve_el_cambio_de_estado(self) -> None:
+        """Con ``espera`` la petición debe resolverse con el nuevo estado."""
+
+        primera = await self.async_client.get("/datos/")
+        pedido = await Order.objects.aget(customer_name="Laura")
+
+        async def cambiar_estado() -> None:
+            await asyncio.sleep(0.05)
+            await SujetoPedido(pedido).aactualizar_estado(Order.Status.SHIPPED)
+
+        respuesta, _ = await asyncio.gather(
+            self.async_client.get(
+                "/datos/", {"espera": "5"}, headers={"if-none-match": primera["ETag"]}
+            ),
+            cambiar_estado(),
+        )
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["estado"], Order.Status.SHIPPED)
+        self.assertNotEqual(respuesta["ETag"], primera["ETag"])
+
+    async def test_sondeo_largo_sin_cambios_responde_304(self) -> None:
+        """Si se agota la espera sin cambios la respuesta debe ser 304."""
+
+        primera = await self.async_client.get("/datos/")
+
+        respuesta = await self.async_client.get(
+            "/datos/", {"espera": "0.05"}, headers={"if-none-match": primera["ETag"]}
+        )
+
+        self.assertEqual(respuesta.status_code, 304)
+
+
+class PruebasEventosServidor(HistorialAislado, TestCase):
+    """Verifica el flujo de Server-Sent Events del seguimiento."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_cache_instantaneas().limpiar()
+
+    async def test_envia_estado_actual_y_cambios_del_grupo(self) -> None:
+        """El flujo empieza con el estado actual y sigue con cada difusión."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        grupos = get_channel_layer().groups
+        previos = set(grupos.get(f"pedido_{pedido.pk}", {}))
+        respuesta = await self.async_client.get(f"/pedidos/{pedido.pk}/eventos/")
+        self.assertEqual(respuesta["Content-Type"], "text/event-stream")
+        flujo = aiter(respuesta.streaming_content)
+        (canal,) = set(grupos[f"pedido_{pedido.pk}"]) - previos
+
+        self.assertTrue((await anext(flujo)).startswith(b"retry:"))
+        inicial = (await anext(flujo)).decode()
+        self.assertIn(f"id: {version_seguimiento(pedido)}\n", inicial)
+        self.assertIn('"estado":"preparing"', inicial)
+
+        await SujetoPedido(pedido).aactualizar_estado(Order.Status.SHIPPED)
+        cambio = (await asyncio.wait_for(anext(flujo), 1)).decode()
+        self.assertTrue(cambio.startswith(f"id: {version_seguimiento(pedido)}\nevent: seguimiento\n"))
+        self.assertIn('"estado":"shipped"', cambio)
+
+        # Al desconectarse la clienta, el servidor cancela la tarea que lee el flujo.
+        pendiente = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0.01)
+        pendiente.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pendiente
+        self.assertNotIn(canal, grupos.get(f"pedido_{pedido.pk}", {}))
+
+    @override_settings(PEDIDOS_SSE_LATIDO=0.01)
+    async def test_reanuda_sin_repetir_y_envia_latidos(self) -> None:
+        """Con ``Last-Event-ID`` al día solo deben llegar comentarios de latido."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        respuesta = await self.async_client.get(
+            f"/pedidos/{pedido.pk}/eventos/",
+            headers={"last-event-id": str(version_seguimiento(pedido))},
+        )
+        flujo = aiter(respuesta.streaming_content)
+
+        await anext(flujo)
+        self.assertEqual(await anext(flujo), b": latido\n\n")
+
+    async def test_pedido_inexistente_responde_404(self) -> None:
+        """No se debe abrir un flujo para un pedido que no existe."""
+
+        respuesta = await self.async_client.get("/pedidos/999/eventos/")
+
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertFalse(get_channel_layer().groups.get("pedido_999"))
+
+
+class PruebasRutasPorPedido(HistorialAislado, TestCase):
+    """Verifica las rutas que reciben el identificador del pedido."""
+
+    def test_datos_por_pedido_hace_una_sola_consulta(self) -> None:
+        """La consulta por clave primaria debe reemplazar al ``get_or_create``."""
+
+        pedido = Order.objects.create(customer_name="Ana", status=Order.Status.OUTSIDE)
+
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(f"/pedidos/{pedido.pk}/datos/")
+
+        self.assertEqual(respuesta.json()["estado"], Order.Status.OUTSIDE)
+        self.assertFalse(Order.objects.filter(customer_name="Laura").exists())
+
+    def test_pedido_inexistente_responde_404(self) -> None:
+        """Un identificador desconocido no debe crear ni mostrar pedidos."""
+
+        self.assertEqual(self.client.get("/pedidos/999/datos/").status_code, 404)
+        self.assertEqual(self.client.post("/pedidos/999/actualizar/").status_code, 404)
+        self.assertEqual(self.client.get("/pedidos/999/").status_code, 404)
+
+    def test_avance_y_paneles_usan_el_pedido_indicado(self) -> None:
+        """Cada pedido debe avanzar y mostrarse de forma independiente."""
+
+        ana = Order.objects.create(customer_name="Ana")
+        rosa = Order.objects.create(customer_name="Rosa")
+
+        respuesta = self.client.post(f"/pedidos/{ana.pk}/actualizar/")
+
+        self.assertIn("Ana", respuesta.json()["notificaciones"][0])
+        ana.refresh_from_db()
+        rosa.refresh_from_db()
+        self.assertEqual(ana.status, Order.Status.SHIPPED)
+        self.assertEqual(rosa.status, Order.Status.PREPARING)
+        self.assertContains(self.client.get(f"/pedidos/{rosa.pk}/control/"), "Rosa")
+        self.assertContains(self.client.get(f"/pedidos/{rosa.pk}/"), f"/pedidos/{rosa.pk}/control/")
+
+
+class PruebasFragmentosPanel(HistorialAislado, TestCase):
+    """Verifica la caché de fragmentos del panel del pedido."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        caches["fragmentos"].clear()
+
+    def test_guarda_resumen_productos_y_estado_por_separado(self) -> None:
+        """El primer panel debe dejar guardados los tres fragmentos del pedido."""
+
+        pedido = Order.objects.create(customer_name="Ana")
+
+        self.assertContains(self.client.get(f"/pedidos/{pedido.pk}/"), "BOX-CAFE-01")
+
+        cache = caches["fragmentos"]
+        version = version_seguimiento(pedido)
+        self.assertIn("BOX-CAFE-01", cache.get(make_template_fragment_key("pedido_productos", [pedido.pk])))
+        self.assertIn("EGP 66,65", cache.get(make_template_fragment_key("pedido_resumen", [pedido.pk])))
+        self.assertIn(
+            'data-estado-inicial="preparing"',
+            cache.get(make_template_fragment_key("pedido_estado", [pedido.pk, version])),
+        )
+
+    def test_cambio_de_estado_solo_renueva_la_linea_de_tiempo(self) -> None:
+        """Tras un cambio de estado el panel debe mostrarlo sin esperar al TTL."""
+
+        pedido = Order.objects.create(customer_name="Ana")
+        self.client.get(f"/pedidos/{pedido.pk}/")
+        clave_productos = make_template_fragment_key("pedido_productos", [pedido.pk])
+        caches["fragmentos"].set(clave_productos, "<p>productos en caché</p>")
+
+        SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+        respuesta = self.client.get(f"/pedidos/{pedido.pk}/")
+
+        self.assertContains(respuesta, 'data-estado-inicial="shipped"')
+        self.assertContains(respuesta, "productos en caché")
+
+
+class PruebasListadoPedidos(HistorialAislado, TestCase):
+    """Verifica el listado de pedidos paginado por cursor."""
+
+    def test_paginas_encadenadas_sin_repetir_ni_saltear(self) -> None:
+        """Recorrer las páginas con ``siguiente`` debe entregar cada pedido una vez."""
+
+        creados = [
+            Order.objects.create(customer_name=f"Clienta {indice}", status=Order.Status.SHIPPED)
+            for indice in range(7)
+        ]
+        Order.objects.create(customer_name="Otra")
+        # Fechas repetidas para ejercitar el desempate por id.
+        Order.objects.filter(pk__in=[pedido.pk for pedido in creados[:4]]).update(
+            created_at=creados[0].created_at
+        )
+
+        vistos = []
+        cursor = ""
+        while True:
+            with self.assertNumQueries(1):
+                datos = self.client.get(
+                    "/pedidos/", {"estado": "shipped", "limite": 3, "cursor": cursor}
+                ).json()
+            vistos.extend(pedido["id"] for pedido in datos["pedidos"])
+            cursor = datos["siguiente"]
+            if cursor is None:
+                break
+
+        esperados = list(
+            Order.objects.filter(status="shipped")
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(len(vistos), 7)
+
+    def test_parametros_invalidos_responden_400(self) -> None:
+        """Un estado o cursor inválido no debe llegar a la base de datos."""
+
+        self.assertEqual(self.client.get("/pedidos/", {"estado": "perdido"}).status_code, 400)
+        for cursor in ("abc", "99999999999999999999.1", "-99999999999999999999.1", f"0.{2**63}"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get("/pedidos/", {"cursor": cursor}).status_code, 400)
+
+
+class PruebasTransicionesAtomicas(HistorialAislado, TestCase):
+    """Verifica que los avances de estado no se pisen entre peticiones."""
+
+    def test_transicion_con_estado_viejo_no_modifica_ni_notifica(self) -> None:
+        """Una instancia desactualizada debe perder la comparación sin efectos."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        vieja = Order.objects.get(pk=pedido.pk)
+        SujetoPedido(pedido).avanzar_estado()
+
+        sujeto = SujetoPedido(vieja)
+        sujeto.agregar_observadora(ObservadoraCliente(nombre="Laura"))
+        capa = get_channel_layer()
+        canal = async_to_sync(capa.new_channel)()
+        async_to_sync(capa.group_add)(f"pedido_{pedido.pk}", canal)
+        self.addCleanup(async_to_sync(capa.group_discard), f"pedido_{pedido.pk}", canal)
+
+        self.assertIsNone(sujeto.avanzar_estado())
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, Order.Status.SHIPPED)
+        self.assertEqual(vieja.status, Order.Status.PREPARING)
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(capa.receive(canal), 0.05)
+
+    async def test_clics_concurrentes_no_repiten_transiciones(self) -> None:
+        """Muchas peticiones simultáneas a ``actualizar/`` deben avanzar una sola vez."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+
+        with self.assertLogs("django.request", "WARNING"):
+            respuestas = await asyncio.gather(
+                *(self.async_client.post(f"/pedidos/{pedido.pk}/actualizar/") for _ in range(16))
+            )
+
+        # Las que leyeron el mismo estado compiten y solo una gana; las demás
+        # reciben 409 en lugar de repetir la transición.
+        alcanzados = [r.json()["estado"] for r in respuestas if r.status_code == 200]
+        conflictos = [r for r in respuestas if r.status_code == 409]
+        self.assertTrue(conflictos)
+        self.assertEqual(len(alcanzados) + len(conflictos), 16)
+        self.assertEqual(len(set(alcanzados)), len(alcanzados), alcanzados)
+        await pedido.arefresh_from_db()
+        self.assertEqual(pedido.status, max(alcanzados, key=Order.Status.values.index))
+
+
+class PruebasHistorialEstados(HistorialAislado, TestCase):
+    """Verifica el historial de cambios de estado y su agregación en SQL."""
+
+    def test_inserta_en_un_lote_al_llegar_al_tamano(self) -> None:
+        """Los eventos confirmados se acumulan y se escriben en una sola consulta."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        historial = HistorialEstados(tamano_lote=3, intervalo=60)
+        evento = construir_evento(pedido, Order.Status.PREPARING, pedido.status_changed_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            historial.registrar([evento, evento])
+            self.assertEqual(historial.contadores()["pendientes"], 0)
+        self.assertEqual(historial.contadores()["pendientes"], 2)
+        self.assertFalse(OrderStatusEvent.objects.exists())
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            historial.registrar([evento])
+
+        self.assertEqual(OrderStatusEvent.objects.count(), 3)
+        self.assertEqual(historial.contadores()["lotes"], 1)
+
+    def test_vacia_por_antiguedad_sin_esperar_otro_evento(self) -> None:
+        """El primer evento del búfer arma un temporizador que lo vacía solo."""
+
+        vaciado = threading.Event()
+
+        class HistorialEspiado(HistorialEstados):
+            def vaciar(self) -> int:
+                vaciado.set()
+                return 0
+
+        pedido = Order.objects.create(customer_name="Laura")
+        historial = HistorialEspiado(tamano_lote=100, intervalo=0.05)
+        self.addCleanup(historial.limpiar)
+        with self.captureOnCommitCallbacks(execute=True):
+            historial.registrar(
+                [construir_evento(pedido, Order.Status.PREPARING, pedido.status_changed_at)]
+            )
+
+        self.assertTrue(vaciado.wait(2))
+
+    def test_lote_fallido_vuelve_al_bufer_hasta_el_limite(self) -> None:
+        """Un error al insertar no debe perder eventos mientras queden reintentos."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        historial = HistorialEstados(
+            tamano_lote=100, intervalo=60, temporizador=False, reintentos=1
+        )
+        valido = construir_evento(pedido, Order.Status.PREPARING, pedido.status_changed_at)
+        invalido = construir_evento(pedido, Order.Status.PREPARING, pedido.status_changed_at)
+        invalido.previous_duration = None
+
+        def vaciar_con_error() -> int:
+            # El fallo de ``bulk_create`` revierte solo este punto de guardado.
+            with transaction.atomic():
+                return historial.vaciar()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            historial.registrar([valido, invalido])
+        with self.assertLogs("orders.historial", "WARNING"):
+            self.assertEqual(vaciar_con_error(), 0)
+        self.assertEqual(historial.contadores()["pendientes"], 2)
+
+        invalido.previous_duration = timedelta(0)
+        self.assertEqual(historial.vaciar(), 2)
+        self.assertEqual(OrderStatusEvent.objects.filter(order=pedido).count(), 2)
+
+        invalido.previous_duration = None
+        with self.captureOnCommitCallbacks(execute=True):
+            historial.registrar([invalido])
+        with self.assertLogs("orders.historial", "WARNING"):
+            vaciar_con_error()
+        with self.assertLogs("orders.historial", "ERROR"):
+            vaciar_con_error()
+        contadores = historial.contadores()
+        self.assertEqual((contadores["pendientes"], contadores["descartados"]), (0, 1))
+
+    async def test_registro_asincrono_espera_a_la_transaccion(self) -> None:
+        """``aregistrar`` tampoco debe encolar un cambio que aún no se confirmó."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        historial = HistorialEstados(tamano_lote=100, intervalo=60, temporizador=False)
+
+        await historial.aregistrar(
+            [construir_evento(pedido, Order.Status.PREPARING, pedido.status_changed_at)]
+        )
+
+        # La prueba corre dentro de una transacción que nunca se confirma.
+        self.assertEqual(historial.contadores()["registrados"], 0)
+
+    def test_cambios_revertidos_no_se_registran(self) -> None:
+        """Un cambio cuya transacción se revierte no debe llegar al historial."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        historial = obtener_historial()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    SujetoPedido(pedido).avanzar_estado()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            SujetoPedido(Order.objects.get(pk=pedido.pk)).avanzar_estado()
+
+        historial.vaciar()
+        eventos = list(OrderStatusEvent.objects.filter(order=pedido))
+        self.assertEqual(len(eventos), 1)
+        self.assertEqual(eventos[0].previous_status, Order.Status.PREPARING)
+        self.assertEqual(eventos[0].status, Order.Status.SHIPPED)
+        self.assertGreaterEqual(eventos[0].previous_duration, timedelta(0))
+
+    def test_duracion_ignora_guardados_sin_cambio_de_estado(self) -> None:
+        """Editar otros campos no debe acortar la estadía medida en el estado."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Order.objects.filter(pk=pedido.pk).update(status_changed_at=hace_una_hora)
+        pedido.refresh_from_db()
+        pedido.customer_name = "Laura Pérez"
+        pedido.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+            SujetoPedido(pedido).avanzar_estado()
+        obtener_historial().vaciar()
+
+        primero, segundo = OrderStatusEvent.objects.filter(order=pedido).order_by("id")
+        self.assertGreaterEqual(primero.previous_duration, timedelta(hours=1))
+        self.assertEqual(primero.created_at, segundo.created_at - segundo.previous_duration)
+
+    def test_tiempo_en_estados_agrega_en_una_consulta(self) -> None:
+        """El tiempo por estado se suma y promedia dentro del rango pedido."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        inicio = pedido.created_at
+        OrderStatusEvent.objects.bulk_create(
+            [
+                OrderStatusEvent(
+                    order=pedido,
+                    previous_status=anterior,
+                    status=nuevo,
+                    previous_duration=timedelta(minutes=minutos),
+                    created_at=inicio + timedelta(hours=horas),
+                )
+                for anterior, nuevo, minutos, horas in (
+                    ("preparing", "shipped", 10, 1),
+                    ("shipped", "outside", 30, 2),
+                    ("preparing", "shipped", 20, 3),
+                    ("outside", "delivered", 5, 30),
+                )
+            ]
+        )
+
+        with self.assertNumQueries(1):
+            resumen = tiempo_en_estados(desde=inicio, hasta=inicio + timedelta(days=1))
+
+        self.assertEqual(set(resumen), {"preparing", "shipped"})
+        self.assertEqual(resumen["preparing"]["total"], timedelta(minutes=30))
+        self.assertEqual(resumen["preparing"]["promedio"], timedelta(minutes=15))
+        self.assertEqual(resumen["preparing"]["cantidad"], 2)
+        self.assertEqual(resumen["shipped"]["total"], timedelta(minutes=30))
+
+
+class PruebasRegistroObservadoras(HistorialAislado, TestCase):
+    """Verifica el registro de observadoras por pedido y por estado."""
+
+    def tearDown(self) -> None:
+        obtener_registro_observadoras().limpiar()
+
+    def test_conjunto_conserva_orden_y_usa_identidad(self) -> None:
+        """Dos observadoras iguales pero distintas se registran por separado."""
+
+        conjunto = ConjuntoObservadoras()
+        primera, segunda = ObservadoraCliente(nombre="Ana"), ObservadoraCliente(nombre="Ana")
+        for observadora in (primera, segunda, primera):
+            conjunto.agregar(observadora)
+
+        self.assertEqual([id(o) for o in conjunto], [id(primera), id(segunda)])
+        conjunto.remover(primera)
+        self.assertNotIn(primera, conjunto)
+        self.assertIn(segunda, conjunto)
+
+    def test_referencias_debiles_se_descartan_solas(self) -> None:
+        """El registro no debe mantener vivas a las observadoras."""
+
+        registro = RegistroObservadoras()
+        observadora = ObservadoraCliente(nombre="Ana")
+        registro.agregar(observadora, pedido_id=1)
+        self.assertEqual(len(registro), 1)
+
+        del observadora
+        gc.collect()
+
+        self.assertEqual(len(registro), 0)
+        self.assertEqual(registro.observadoras_para(1, Order.Status.SHIPPED), [])
+
+    def test_grupos_vacios_se_eliminan_al_recolectar(self) -> None:
+        """Sin observadoras vivas no debe quedar una clave por cada pedido observado."""
+
+        registro = RegistroObservadoras()
+        observadoras = [ObservadoraCliente(nombre="Ana") for _ in range(3)]
+        for pedido_id, observadora in enumerate(observadoras, start=1):
+            registro.agregar(observadora, pedido_id=pedido_id)
+            registro.agregar(observadora, pedido_id=pedido_id, estado=Order.Status.SHIPPED)
+        self.assertEqual(len(registro._grupos), 6)
+
+        del observadora
+        observadoras.pop()
+        gc.collect()
+        self.assertEqual(len(registro._grupos), 4)
+
+        observadoras.clear()
+        gc.collect()
+        self.assertEqual(registro._grupos, {})
+
+        nueva = ObservadoraCliente(nombre="Rosa")
+        registro.agregar(nueva, pedido_id=1)
+        self.assertEqual(registro.observadoras_para(1, Order.Status.SHIPPED), [nueva])
+
+    def test_solo_notifica_a_las_interesadas_en_la_transicion(self) -> None:
+        """Cada observadora recibe solo los pedidos y estados a los que se suscribió."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        otro = Order.objects.create(customer_name="Rosa")
+        registro = obtener_registro_observadoras()
+        general = ObservadoraCliente(nombre="General")
+        entregas = ObservadoraCliente(nombre="Entregas")
+        de_laura = ObservadoraCliente(nombre="Laura")
+        registro.agregar(general)
+        registro.agregar(entregas, estado=Order.Status.DELIVERED)
+        registro.agregar(de_laura, pedido_id=pedido.pk)
+
+        SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+        SujetoPedidos().actualizar_estados([otro], Order.Status.DELIVERED)
+
+        self.assertEqual(len(general.notificaciones), 2)
+        self.assertEqual(len(entregas.notificaciones), 1)
+        self.assertIn("Entregado", entregas.notificaciones[0])
+        self.assertEqual(len(de_laura.notificaciones), 1)
+        self.assertIn("En camino", de_laura.notificaciones[0])
+
+
+class PruebasObservadoraCompacta(HistorialAislado, TestCase):
+    """Verifica la observadora con ``__slots__`` y notificaciones acotadas."""
+
+    def test_mismo_mensaje_con_memoria_acotada(self) -> None:
+        """Debe notificar igual que la original pero guardar solo las últimas."""
+
+        pedido = Order.objects.create(customer_name="Laura", status=Order.Status.SHIPPED)
+        compacta = ObservadoraClienteCompacta(nombre="Laura", maximo=3)
+        original = ObservadoraCliente(nombre="Laura")
+
+        for estado in (*Order.Status.values, Order.Status.SHIPPED):
+            pedido.status = estado
+            self.assertEqual(compacta.actualizar(pedido), original.actualizar(pedido))
+
+        self.assertEqual(len(compacta.notificaciones), 3)
+        self.assertEqual(list(compacta.notificaciones), original.notificaciones[-3:])
+        self.assertIs(compacta.notificaciones[-1], compacta.actualizar(pedido))
+        self.assertFalse(hasattr(compacta, "__dict__"))
+
+    def test_funciona_en_el_registro_con_referencias_debiles(self) -> None:
+        """El registro debe poder guardarla como referencia débil."""
+
+        registro = RegistroObservadoras()
+        compacta = ObservadoraClienteCompacta(nombre="Laura")
+        registro.agregar(compacta, estado=Order.Status.SHIPPED)
+
+        self.assertEqual(registro.observadoras_para(1, Order.Status.SHIPPED), [compacta])
+        del compacta
+        gc.collect()
+        self.assertEqual(len(registro), 0)
+
+
+class _ObservadoraLenta:
+    """Observadora de prueba que tarda ``demora`` segundos o falla."""
+
+    def __init__(self, nombre: str, demora: float = 0.0, falla: bool = False) -> None:
+        self.nombre = nombre
+        self.demora = demora
+        self.falla = falla
+
+    def actualizar(self, pedido: Order) -> str:
+        time.sleep(self.demora)
+        if self.falla:
+            raise RuntimeError(self.nombre)
+        return f"{self.nombre}: {pedido.status}"
+
+
+class _ObservadoraAsincrona(_ObservadoraLenta):
+    """Variante con ``actualizar`` asíncrono."""
+
+    async def actualizar(self, pedido: Order) -> str:
+        await asyncio.sleep(self.demora)
+        return f"{self.nombre}: {pedido.status}"
+
+
+@override_settings(PEDIDOS_DESPACHO_OBSERVADORAS="concurrente")
+class PruebasDespachoConcurrente(HistorialAislado, TestCase):
+    """Verifica la notificación en paralelo de las observadoras."""
+
+    def test_observadoras_lentas_corren_en_paralelo_y_en_orden(self) -> None:
+        """El tiempo total se acerca al de la más lenta y el orden se conserva."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        sujeto = SujetoPedido(pedido)
+        for nombre in ("a", "b", "c", "d"):
+            sujeto.agregar_observadora(_ObservadoraLenta(nombre, demora=0.2))
+
+        inicio = time.perf_counter()
+        mensajes = list(sujeto.notificar())
+
+        self.assertLess(time.perf_counter() - inicio, 0.6)
+        self.assertEqual(mensajes, [f"{nombre}: preparing" for nombre in "abcd"])
+
+    def test_aisla_fallas_y_plazos_vencidos(self) -> None:
+        """Una observadora que falla o se demora no afecta a las demás."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        sujeto = SujetoPedido(pedido)
+        demorada = _ObservadoraLenta("lenta", demora=0.5)
+        demorada.tiempo_maximo = 0.05
+        for observadora in (
+            _ObservadoraLenta("primera"),
+            demorada,
+            _ObservadoraLenta("rota", falla=True),
+            _ObservadoraLenta("ultima"),
+        ):
+            sujeto.agregar_observadora(observadora)
+
+        with self.assertLogs("orders.observador") as registros:
+            mensajes = list(sujeto.notificar())
+
+        self.assertEqual(mensajes, ["primera: preparing", "ultima: preparing"])
+        self.assertEqual(len(registros.records), 2)
+
+    async def test_observadoras_asincronas_como_tareas(self) -> None:
+        """``aactualizar_estado`` debe esperar a las observadoras asíncronas."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        sujeto = SujetoPedido(pedido)
+        sujeto.agregar_observadora(_ObservadoraAsincrona("sms", demora=0.05))
+        sujeto.agregar_observadora(ObservadoraCliente(nombre="Laura"))
+
+        mensajes = await sujeto.aactualizar_estado(Order.Status.SHIPPED)
+
+        self.assertEqual(mensajes[0], "sms: shipped")
+        self.assertIn("En camino", mensajes[1])
+
+
+class PruebasSujetoPedidos(HistorialAislado, TestCase):
+    """Verifica las transiciones de estado en lote."""
+
+    def test_lote_actualiza_y_notifica_por_pedido(self) -> None:
+        """Cada pedido del lote debe recibir los mismos mensajes que la ruta individual."""
+
+        pedidos = [Order.objects.create(customer_name=f"Clienta {i}") for i in range(3)]
+        sujeto = SujetoPedidos()
+        observadora = ObservadoraCliente(nombre="Laura")
+        sujeto.agregar_observadora(observadora)
+
+        with self.assertNumQueries(4):  # SELECT, SAVEPOINT, UPDATE, RELEASE
+            notificaciones = sujeto.actualizar_estados(
+                Order.objects.filter(pk__in=[p.pk for p in pedidos]), Order.Status.SHIPPED
+            )
+
+        self.assertEqual(set(notificaciones), {p.pk for p in pedidos})
+        for mensajes in notificaciones.values():
+            self.assertEqual(len(mensajes), 1)
+            self.assertIn("En camino", mensajes[0])
+        self.assertEqual(
+            Order.objects.filter(status=Order.Status.SHIPPED).count(), len(pedidos)
+        )
+
+    def test_pedidos_repetidos_se_procesan_una_vez(self) -> None:
+        """Un id repetido, o junto a su instancia, no debe notificarse ni registrarse dos veces."""
+
+        primero = Order.objects.create(customer_name="Laura")
+        segundo = Order.objects.create(customer_name="Ana")
+        observadora = ObservadoraCliente(nombre="Laura")
+        sujeto = SujetoPedidos()
+        sujeto.agregar_observadora(observadora)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notificaciones = sujeto.actualizar_estados(
+                [primero.pk, segundo.pk, primero.pk, segundo], Order.Status.SHIPPED
+            )
+        obtener_historial().vaciar()
+
+        self.assertEqual(list(notificaciones), [primero.pk, segundo.pk])
+        self.assertEqual(len(observadora.notificaciones), 2)
+        eventos = OrderStatusEvent.objects.filter(order__in=[primero, segundo])
+        self.assertEqual(eventos.count(), 2)
+        self.assertFalse(eventos.filter(previous_status=Order.Status.SHIPPED).exists())
+
+    def test_lote_acepta_identificadores_y_difunde_a_cada_grupo(self) -> None:
+        """Los envíos del lote deben llegar al grupo de cada pedido."""
+
+        capa = get_channel_layer()
+        pedidos = [Order.objects.create(customer_name=f"Clienta {i}") for i in range(2)]
+        canales = []
+        for pedido in pedidos:
+            nombre_canal = async_to_sync(capa.new_channel)("test_")
+            async_to_sync(capa.group_add)(f"pedido_{pedido.pk}", nombre_canal)
+            canales.append(nombre_canal)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SujetoPedidos().actualizar_estados([p.pk for p in pedidos], Order.Status.OUTSIDE)
+
+        for nombre_canal in canales:
+            mensaje = async_to_sync(capa.receive)(nombre_canal)
+            self.assertEqual(json.loads(mensaje["texto"])["estado"], Order.Status.OUTSIDE)
+
+
+class PruebasConsumidorSeguimiento(HistorialAislado, TransactionTestCase):
+    """Verifica el reenvío de eventos por el socket de seguimiento."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_cache_instantaneas().limpiar()
+
+    def test_consumidor_reenvia_el_delta_serializado(self) -> None:
+        """Tras el evento inicial, el socket debe recibir el delta que difundió el sujeto."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        sujeto = SujetoPedido(pedido)
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(
+                ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+            )
+            comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+            conectado, _ = await comunicador.connect()
+            self.assertTrue(conectado)
+            inicial = await comunicador.receive_from()
+            self.assertEqual(json.loads(inicial)["estado"], Order.Status.PREPARING)
+
+            anterior = pedido.updated_at
+            await database_sync_to_async(sujeto.actualizar_estado)(Order.Status.SHIPPED)
+
+            recibido = await comunicador.receive_from()
+            self.assertEqual(recibido, serializar_delta_seguimiento(pedido, anterior))
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_delta_sin_base_conocida_envia_el_evento_completo(self) -> None:
+        """Un delta cuya base no tiene la clienta se reemplaza por el evento completo."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        grupo = f"pedido_{pedido.pk}"
+
+        async def escenario() -> None:
+            capa = get_channel_layer()
+            comunicador = WebsocketCommunicator(
+                ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+            )
+            comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+            await comunicador.connect()
+            await comunicador.receive_from()
+            anterior = pedido.updated_at
+
+            pedido.status = Order.Status.SHIPPED
+            pedido.updated_at = anterior + timedelta(seconds=1)
+            salteado = construir_mensaje_difusion(pedido, anterior - timedelta(seconds=1))
+            # Como al publicar un cambio confirmado: primero la caché, luego el grupo.
+            obtener_cache_instantaneas().guardar(pedido.pk, salteado["texto"], salteado["version"])
+            await capa.group_send(grupo, salteado)
+            self.assertEqual(await comunicador.receive_from(), salteado["texto"])
+
+            # La resincronización entrega el último estado guardado en la caché.
+            await comunicador.send_json_to({"accion": "resincronizar"})
+            self.assertEqual(await comunicador.receive_from(), salteado["texto"])
+
+            anterior = pedido.updated_at
+            pedido.status = Order.Status.OUTSIDE
+            pedido.updated_at = anterior + timedelta(seconds=1)
+            await capa.group_send(grupo, construir_mensaje_difusion(pedido, anterior))
+            self.assertEqual(
+                await comunicador.receive_from(), serializar_delta_seguimiento(pedido, anterior)
+            )
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_cambio_revertido_no_llega_al_socket_ni_a_la_cache(self) -> None:
+        """Un socket conectado no debe recibir un cambio cuya transacción se revierte."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+
+        @database_sync_to_async
+        def entregar_y_revertir() -> None:
+            try:
+                with transaction.atomic():
+                    SujetoPedido(Order.objects.get(pk=pedido.pk)).actualizar_estado(
+                        Order.Status.DELIVERED
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        async def conectar() -> WebsocketCommunicator:
+            comunicador = WebsocketCommunicator(
+                ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+            )
+            comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+            await comunicador.connect()
+            return comunicador
+
+        async def escenario() -> None:
+            conectada = await conectar()
+            await conectada.receive_from()
+
+            await entregar_y_revertir()
+            self.assertTrue(await conectada.receive_nothing())
+
+            nueva = await conectar()
+            inicial = json.loads(await nueva.receive_from())
+            self.assertEqual(inicial["estado"], Order.Status.PREPARING)
+            await nueva.disconnect()
+            await conectada.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_subprotocolo_binario_envia_catalogo_y_tramas(self) -> None:
+        """Con el subprotocolo binario, tras el catálogo cada estado llega en 10 bytes."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        sujeto = SujetoPedido(pedido)
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(
+                ConsumidorSeguimientoPedido.as_asgi(),
+                f"/ws/pedidos/{pedido.pk}/",
+                subprotocols=["json", SUBPROTOCOLO_BINARIO],
+            )
+            comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+            conectado, subprotocolo = await comunicador.connect()
+            self.assertTrue(conectado)
+            self.assertEqual(subprotocolo, SUBPROTOCOLO_BINARIO)
+            self.assertEqual(await comunicador.receive_from(), CATALOGO_BINARIO)
+            self.assertEqual(
+                desempaquetar_estado_binario(await comunicador.receive_from()),
+                (Order.Status.PREPARING, version_seguimiento(pedido)),
+            )
+
+            await database_sync_to_async(sujeto.actualizar_estado)(Order.Status.SHIPPED)
+
+            trama = await comunicador.receive_from()
+            self.assertEqual(len(trama), 10)
+            self.assertEqual(
+                desempaquetar_estado_binario(trama),
+                (Order.Status.SHIPPED, version_seguimiento(pedido)),
+            )
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_conexion_usa_la_instantanea_sin_consultar_la_base(self) -> None:
+        """Tras un cambio de estado, conectarse no debe leer el pedido de la base."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        SujetoPedido(pedido).actualizar_estado(Order.Status.OUTSIDE)
+        cargas_previas = obtener_cache_instantaneas().cargas
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(
+                ConsumidorSeguimientoPedido.as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+            )
+            comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+            await comunicador.connect()
+            self.assertEqual(json.loads(await comunicador.receive_from())["estado"], "outside")
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+        self.assertEqual(obtener_cache_instantaneas().cargas, cargas_previas)
+
+
+def _consumidor_trabado(compuerta: asyncio.Event, instancias: list) -> type:
+    """Consumidor cuyo transporte no acepta escrituras hasta abrir ``compuerta``."""
+
+    class ConsumidorTrabado(ConsumidorSeguimientoPedido):
+        async def connect(self) -> None:
+            await super().connect()
+            instancias.append(self)
+
+        async def send(self, *args: Any, **kwargs: Any) -> None:
+            if self in instancias:
+                await compuerta.wait()
+            await super().send(*args, **kwargs)
+
+    return ConsumidorTrabado
+
+
+async def _esperar_hasta(condicion: Any) -> None:
+    """Cede el bucle hasta que ``condicion()`` sea verdadera o pasen dos segundos."""
+
+    limite = time.monotonic() + 2
+    while not condicion():
+        if time.monotonic() > limite:
+            raise AssertionError("El consumidor no procesó el mensaje a tiempo.")
+        await asyncio.sleep(0)
+
+
+class PruebasClientasLentas(HistorialAislado, TestCase):
+    """Verifica la cola por conexión del consumidor ante clientas que no leen."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_cache_instantaneas().limpiar()
+        obtener_metricas().limpiar()
+
+    async def test_clienta_trabada_solo_guarda_el_ultimo_estado(self) -> None:
+        """La capa no debe acumular mensajes y la clienta recibe el estado final."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        capa = get_channel_layer()
+        compuerta, instancias = asyncio.Event(), []
+        comunicador = WebsocketCommunicator(
+            _consumidor_trabado(compuerta, instancias).as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+        )
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+        consumidor = instancias[0]
+
+        for numero in range(500):
+            texto = f'{{"n":{numero}}}'
+            await capa.group_send(f"pedido_{pedido.pk}", {"type": "enviar_actualizacion", "texto": texto})
+            # El primero queda en vuelo; los demás reemplazan al único pendiente.
+            await _esperar_hasta(
+                lambda: consumidor._envio is not None
+                if numero == 0
+                else consumidor._pendientes.get(pedido.pk) == texto
+            )
+            # La capa borra la cola del canal en cuanto el consumidor la vacía.
+            self.assertNotIn(consumidor.channel_name, capa.channels)
+            self.assertLessEqual(len(consumidor._pendientes), 1)
+
+        compuerta.set()
+        self.assertEqual(await comunicador.receive_from(), '{"n":0}')
+        self.assertEqual(await comunicador.receive_from(), '{"n":499}')
+        self.assertTrue(await comunicador.receive_nothing())
+        self.assertEqual(obtener_metricas().instantanea()["contadores"]["mensajes_combinados"], 498)
+        await comunicador.disconnect()
+
+    @override_settings(PEDIDOS_CONSUMIDOR_ATRASO_MAXIMO=0.0)
+    async def test_clienta_atrasada_se_desconecta(self) -> None:
+        """Una clienta que sigue atrasada más del máximo debe cerrarse con 4008."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        capa = get_channel_layer()
+        grupo = f"pedido_{pedido.pk}"
+        compuerta, instancias = asyncio.Event(), []
+        comunicador = WebsocketCommunicator(
+            _consumidor_trabado(compuerta, instancias).as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+        )
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+
+        consumidor = instancias[0]
+        for numero in range(5):
+            await capa.group_send(grupo, {"type": "enviar_actualizacion", "texto": str(numero)})
+            await _esperar_hasta(
+                lambda: consumidor._descartada
+                or consumidor._pendientes.get(pedido.pk) == str(numero)
+                or (numero == 0 and consumidor._envio is not None)
+            )
+
+        cierre = await comunicador.receive_output()
+        self.assertEqual(cierre, {"type": "websocket.close", "code": CIERRE_CLIENTA_LENTA})
+        self.assertEqual(obtener_metricas().instantanea()["contadores"]["consumidores_descartados"], 1)
+        await comunicador.disconnect()
+        self.assertNotIn(consumidor.channel_name, capa.groups.get(grupo, {}))
+
+    @override_settings(PEDIDOS_CONSUMIDOR_ATRASO_MAXIMO=0.05)
+    async def test_escritura_trabada_se_corta_sin_nuevos_estados(self) -> None:
+        """El atraso debe detectarse aunque no lleguen más difusiones."""
+
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        compuerta, instancias = asyncio.Event(), []
+        comunicador = WebsocketCommunicator(
+            _consumidor_trabado(compuerta, instancias).as_asgi(), f"/ws/pedidos/{pedido.pk}/"
+        )
+        comunicador.scope["url_route"] = {"kwargs": {"pedido_id": pedido.pk}}
+        await comunicador.connect()
+        await comunicador.receive_from()
+
+        await get_channel_layer().group_send(
+            f"pedido_{pedido.pk}", {"type": "enviar_actualizacion", "texto": "0"}
+        )
+
+        cierre = await comunicador.receive_output(timeout=2)
+        self.assertEqual(cierre, {"type": "websocket.close", "code": CIERRE_CLIENTA_LENTA})
+        self.assertTrue(instancias[0]._descartada)
+        await comunicador.disconnect()
+
+
+class PruebasConsumidorVariosPedidos(HistorialAislado, TransactionTestCase):
+    """Verifica el socket ``ws/pedidos/`` que sigue varios pedidos a la vez."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_cache_instantaneas().limpiar()
+
+    def test_instantaneas_se_leen_en_una_consulta(self) -> None:
+        """Las instantáneas que faltan en caché deben leerse con un solo ``SELECT``."""
+
+        pedidos = [Order.objects.create(customer_name=f"Clienta {numero}") for numero in range(5)]
+
+        with self.assertNumQueries(1):
+            cargadas = async_to_sync(_cargar_instantaneas)([pedido.pk for pedido in pedidos] + [0])
+
+        self.assertEqual(set(cargadas), {pedido.pk for pedido in pedidos})
+        self.assertEqual(cargadas[pedidos[0].pk][0], serializar_evento_seguimiento(pedidos[0]))
+
+    def test_identificadores_fuera_de_rango_no_tumban_el_socket(self) -> None:
+        """Un id que no cabe en la clave primaria no debe tumbar el socket."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(ConsumidorSeguimientoPedidos.as_asgi(), "/ws/pedidos/")
+            await comunicador.connect()
+
+            await comunicador.send_json_to({"accion": "suscribir", "pedidos": [pedido.pk, 10**120]})
+            self.assertEqual(
+                await comunicador.receive_json_from(),
+                {"tipo": "error", "error": "pedido_fuera_de_rango"},
+            )
+
+            await comunicador.send_json_to(
+                {"accion": "suscribir", "pedidos": [pedido.pk, -1, 2**63 - 1]}
+            )
+            acuse = await comunicador.receive_json_from()
+            self.assertEqual(acuse["pedidos"], [pedido.pk])
+            self.assertEqual(acuse["desconocidos"], [-1, 2**63 - 1])
+            self.assertEqual((await comunicador.receive_json_from())["pedido"], pedido.pk)
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_suscripcion_enmarca_los_eventos_con_el_pedido(self) -> None:
+        """Cada evento debe llegar con su pedido y cesar al desuscribirse."""
+
+        primero = Order.objects.create(customer_name="Laura")
+        segundo = Order.objects.create(customer_name="Ana")
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(ConsumidorSeguimientoPedidos.as_asgi(), "/ws/pedidos/")
+            conectado, _ = await comunicador.connect()
+            self.assertTrue(conectado)
+
+            await comunicador.send_json_to(
+                {"accion": "suscribir", "pedidos": [primero.pk, segundo.pk, 0]}
+            )
+            acuse = await comunicador.receive_json_from()
+            self.assertEqual(acuse["pedidos"], sorted([primero.pk, segundo.pk]))
+            self.assertEqual(acuse["desconocidos"], [0])
+            iniciales = {}
+            for _ in range(2):
+                evento = await comunicador.receive_json_from()
+                iniciales[evento.pop("pedido")] = evento
+            self.assertEqual(iniciales[segundo.pk]["estado"], Order.Status.PREPARING)
+
+            await database_sync_to_async(SujetoPedidos().actualizar_estados)(
+                [primero, segundo], Order.Status.SHIPPED
+            )
+            recibidos = {json.loads(await comunicador.receive_from())["pedido"] for _ in range(2)}
+            self.assertEqual(recibidos, {primero.pk, segundo.pk})
+
+            await comunicador.send_json_to({"accion": "desuscribir", "pedidos": [segundo.pk]})
+            self.assertEqual((await comunicador.receive_json_from())["pedidos"], [primero.pk])
+            await database_sync_to_async(SujetoPedido(segundo).actualizar_estado)(
+                Order.Status.OUTSIDE
+            )
+            anterior = primero.updated_at
+            await database_sync_to_async(SujetoPedido(primero).actualizar_estado)(
+                Order.Status.OUTSIDE
+            )
+            self.assertEqual(
+                await comunicador.receive_from(),
+                enmarcar_evento_pedido(primero.pk, serializar_delta_seguimiento(primero, anterior)),
+            )
+            self.assertTrue(await comunicador.receive_nothing())
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+    def test_comando_invalido_responde_error(self) -> None:
+        """Un comando mal formado no debe cerrar el socket."""
+
+        async def escenario() -> None:
+            comunicador = WebsocketCommunicator(ConsumidorSeguimientoPedidos.as_asgi(), "/ws/pedidos/")
+            await comunicador.connect()
+            for comando in ("no es json", '{"accion": "suscribir", "pedidos": "1"}'):
+                await comunicador.send_to(text_data=comando)
+                self.assertEqual(
+                    await comunicador.receive_json_from(),
+                    {"tipo": "error", "error": "comando_invalido"},
+                )
+            await comunicador.disconnect()
+
+        async_to_sync(escenario)()
+
+
+class PruebasCacheInstantaneas(HistorialAislado, TestCase):
+    """Verifica el desalojo y la carga compartida de la caché de instantáneas."""
+
+    def test_desaloja_la_entrada_menos_usada_y_respeta_versiones(self) -> None:
+        """La caché no debe superar su capacidad ni aceptar versiones viejas."""
+
+        cache = CacheInstantaneas(capacidad=2, ttl=60)
+        cache.guardar(1, "uno", version=1)
+        cache.guardar(2, "dos", version=1)
+        cache.obtener(1)
+        cache.guardar(3, "tres", version=1)
+        cache.guardar(1, "viejo", version=0)
+
+        self.assertIsNone(cache.obtener(2))
+        self.assertEqual(cache.obtener(1), "uno")
+        self.assertEqual(cache.obtener(3), "tres")
+
+    def test_cambio_revertido_no_queda_en_la_cache(self) -> None:
+        """La instantánea se guarda recién al confirmar la transacción del cambio."""
+
+        cache = obtener_cache_instantaneas()
+        cache.limpiar()
+        pedido = Order.objects.create(customer_name="Laura")
+        otro = Order.objects.create(customer_name="Rosa")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+                    SujetoPedidos().actualizar_estados([otro], Order.Status.SHIPPED)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertIsNone(cache.obtener(pedido.pk))
+        self.assertIsNone(cache.obtener(otro.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SujetoPedido(Order.objects.get(pk=pedido.pk)).actualizar_estado(
+                Order.Status.DELIVERED
+            )
+        self.assertEqual(json.loads(cache.obtener(pedido.pk))["estado"], Order.Status.DELIVERED)
+
+    def test_fallos_simultaneos_comparten_una_carga(self) -> None:
+        """Varias conexiones al mismo pedido sin caché deben hacer una sola consulta."""
+
+        cache = CacheInstantaneas(capacidad=10, ttl=60)
+        llamadas = []
+
+        async def cargador(pedido_id: int):
+            llamadas.append(pedido_id)
+            await asyncio.sleep(0.01)
+            return "texto", 1
+
+        async def escenario():
+            return await asyncio.gather(
+                *(cache.aobtener_o_cargar(7, cargador) for _ in range(20))
+            )
+
+        resultados = async_to_sync(escenario)()
+
+        self.assertEqual(llamadas, [7])
+        self.assertEqual(set(resultados), {"texto"})
+
+
+class PruebasBandejaSalida(HistorialAislado, TestCase):
+    """Verifica la difusión diferida y la fusión de eventos pendientes."""
+
+    def test_fusiona_eventos_del_mismo_grupo_y_descarta_al_llenarse(self) -> None:
+        """Solo debe quedar el último evento por grupo dentro de la capacidad."""
+
+        bandeja = BandejaSalida(capacidad=2, autoiniciar=False)
+
+        self.assertTrue(bandeja.encolar("pedido_1", {"type": "enviar_actualizacion", "texto": "a"}))
+        self.assertTrue(bandeja.encolar("pedido_1", {"type": "enviar_actualizacion", "texto": "b"}))
+        self.assertTrue(bandeja.encolar("pedido_2", {"type": "enviar_actualizacion", "texto": "c"}))
+        with self.assertLogs("orders.bandeja_salida", level="WARNING"):
+            self.assertFalse(
+                bandeja.encolar("pedido_3", {"type": "enviar_actualizacion", "texto": "d"})
+            )
+
+        contadores = bandeja.contadores()
+        self.assertEqual(contadores["encolados"], 3)
+        self.assertEqual(contadores["fusionados"], 1)
+        self.assertEqual(contadores["descartados"], 1)
+        self.assertEqual(contadores["pendientes"], 2)
+
+    @override_settings(PEDIDOS_DIFUSION_DIFERIDA=True)
+    def test_difunde_despues_de_confirmar_la_transaccion(self) -> None:
+        """El evento debe salir por el grupo recién al confirmar la transacción."""
+
+        capa = get_channel_layer()
+        pedido = Order.objects.create(customer_name="Laura")
+        nombre_canal = async_to_sync(capa.new_channel)("test_")
+        async_to_sync(capa.group_add)(f"pedido_{pedido.pk}", nombre_canal)
+        bandeja = obtener_bandeja_salida()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+            SujetoPedido(pedido).actualizar_estado(Order.Status.OUTSIDE)
+            self.assertEqual(bandeja.contadores()["pendientes"], 0)
+
+        # Por cada cambio: la publicación y el registro en el historial.
+        self.assertEqual(len(callbacks), 4)
+        self.assertTrue(bandeja.esperar_vaciado(2))
+        estados = [json.loads(async_to_sync(capa.receive)(nombre_canal)["texto"])["estado"]]
+        if estados[-1] != Order.Status.OUTSIDE:
+            estados.append(json.loads(async_to_sync(capa.receive)(nombre_canal)["texto"])["estado"])
+        self.assertEqual(estados[-1], Order.Status.OUTSIDE)
+
+    @override_settings(PEDIDOS_DIFUSION_DIFERIDA=True)
+    async def test_despierta_a_la_receptora_que_ya_espera_en_la_capa(self) -> None:
+        """El vaciado debe correr en el bucle de la receptora, no en otro hilo."""
+
+        capa = get_channel_layer()
+        pedido = await Order.objects.acreate(customer_name="Laura")
+        nombre_canal = await capa.new_channel("test_")
+        await capa.group_add(f"pedido_{pedido.pk}", nombre_canal)
+        self.addCleanup(async_to_sync(capa.group_discard), f"pedido_{pedido.pk}", nombre_canal)
+
+        # En modo depuración el bucle rechaza que otro hilo despierte a sus futuros.
+        bucle = asyncio.get_running_loop()
+        bucle.set_debug(True)
+        self.addCleanup(bucle.set_debug, False)
+
+        receptora = asyncio.create_task(capa.receive(nombre_canal))
+        await asyncio.sleep(0)
+        await SujetoPedido(pedido).aactualizar_estado(Order.Status.SHIPPED)
+        mensaje = await asyncio.wait_for(receptora, 2)
+        self.assertEqual(json.loads(mensaje["texto"])["estado"], Order.Status.SHIPPED)
+
+        # Desde el hilo de una vista síncrona se usa el bucle del servidor.
+        receptora = asyncio.create_task(capa.receive(nombre_canal))
+        await asyncio.sleep(0)
+        await sync_to_async(obtener_bandeja_salida().encolar)(
+            f"pedido_{pedido.pk}", construir_mensaje_difusion(pedido)
+        )
+        mensaje = await asyncio.wait_for(receptora, 2)
+        self.assertEqual(mensaje["texto"], construir_mensaje_difusion(pedido)["texto"])
+
+
+class PruebasMetricas(HistorialAislado, TestCase):
+    """Verifica los histogramas por etapa y su exposición en ``metricas/``."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        obtener_metricas().limpiar()
+
+    def test_actualizar_estado_registra_cada_etapa(self) -> None:
+        """Cada etapa del sujeto debe sumar una observación al histograma."""
+
+        pedido = Order.objects.create(customer_name="Laura")
+        with self.captureOnCommitCallbacks(execute=True):
+            SujetoPedido(pedido).actualizar_estado(Order.Status.SHIPPED)
+        self.assertIsNone(SujetoPedido(Order(pk=pedido.pk)).transicionar("preparing", "shipped"))
+
+        respuesta = self.client.get("/metricas/")
+
+        self.assertTrue(respuesta["Content-Type"].startswith("text/plain; version=0.0.4"))
+        for etapa in ("guardar", "historial", "construir_evento", "group_send", "observadoras"):
+            self.assertContains(respuesta, f'pedidos_etapa_segundos_count{{etapa="sujeto_{etapa}"}} ')
+        self.assertContains(respuesta, 'pedidos_etapa_segundos_bucket{etapa="sujeto_guardar",le="+Inf"} 2')
+        self.assertContains(respuesta, "pedidos_transiciones_en_conflicto_total 1")
+
+        datos = self.client.get("/metricas/?formato=json").json()
+        self.assertEqual(datos["etapas"]["sujeto_observadoras"]["cantidad"], 1)
+
+    def test_solo_personal_o_direcciones_permitidas(self) -> None:
+        """Desde otra dirección, ``metricas/`` exige una sesión de personal."""
+
+        externa = {"REMOTE_ADDR": "203.0.113.7"}
+        self.assertEqual(self.client.get("/metricas/", **externa).status_code, 403)
+
+        clienta = get_user_model().objects.create_user("clienta")
+        self.client.force_login(clienta)
+        self.assertEqual(self.client.get("/metricas/", **externa).status_code, 403)
+
+        personal = get_user_model().objects.create_user("personal", is_staff=True)
+        self.client.force_login(personal)
+        self.assertEqual(self.client.get("/metricas/", **externa).status_code, 200)
+
+        self.client.logout()
+        with self.settings(PEDIDOS_METRICAS_DIRECCIONES=["203.0.113.7"]):
+            self.assertEqual(self.client.get("/metricas/", **externa).status_code, 200)
+
+    def test_registro_apagado_no_mide_nada(self) -> None:
+        """Sin métricas, el bloque de medición es siempre el mismo objeto vacío."""
+
+        metricas = RegistroMetricas(habilitado=False)
+
+        with metricas.medir("etapa") as medicion:
+            pass
+        metricas.incrementar("contador")
+
+        self.assertIs(medicion, metricas.medir("otra"))
+        self.assertEqual(metricas.instantanea(), {"etapas": {}, "contadores": {}})
+
+    def test_estima_percentiles_desde_las_cubetas(self) -> None:
+        """El percentil se interpola dentro de la cubeta que lo contiene."""
+
+        metricas = RegistroMetricas(limites=(0.01, 0.1))
+        for segundos in (0.005, 0.005, 0.05, 0.05):
+            metricas.observar("etapa", segundos)
+
+        histograma = metricas.instantanea()["etapas"]["etapa"]
+
+        self.assertEqual(histograma["cubetas"], [("0.01", 2), ("0.1", 4), ("+Inf", 4)])
+        self.assertAlmostEqual(estimar_percentil(histograma, 0.5), 0.01)
+        self.assertAlmostEqual(estimar_percentil(histograma, 0.75), 0.055)
+
+
+class PruebasConfiguracionSqlite(HistorialAislado, TestCase):
+    """Verifica los ``PRAGMA`` aplicados a cada conexión SQLite nueva."""
+
+    @override_settings(PEDIDOS_SQLITE_PRAGMAS={"journal_mode": "WAL", "synchronous": "NORMAL"})
+    def test_conexion_nueva_usa_wal_y_synchronous_normal(self) -> None:
+        """El perfil de producción debe activar WAL al abrir la conexión."""
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            principal = connections["default"]
+            conexion = type(principal)(
+                {**principal.settings_dict, "NAME": os.path.join(carpeta, "pedidos.sqlite3")},
+                alias="pruebas_wal",
+            )
+            try:
+                with conexion.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)
+            finally:
+                conexion.close()
+
+
+class PruebasCapaCanalesLocal(HistorialAislado, TestCase):
+    """Verifica la capa de canales compartida entre procesos por socket Unix."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.ruta = os.path.join(directorio, "canales.sock")
+        # Dos instancias con la misma ruta se comportan como dos procesos.
+        self.capa_servidor = CapaCanalesLocal(ruta=self.ruta)
+        self.capa_remota = CapaCanalesLocal(ruta=self.ruta)
+
+    def tearDown(self) -> None:
+        async_to_sync(self.capa_remota.close)()
+        async_to_sync(self.capa_servidor.close)()
+
+    def test_group_send_llega_a_canales_de_otro_proceso(self) -> None:
+        """Un mensaje de grupo debe cruzar de una instancia a la otra."""
+
+        async def escenario() -> None:
+            canal = await self.capa_servidor.new_channel()
+            await self.capa_servidor.group_add("pedido_1", canal)
+            await self.capa_remota.group_send(
+                "pedido_1", {"type": "enviar_actualizacion", "texto": "hola", "datos": b"\x01"}
+            )
+
+            mensaje = await asyncio.wait_for(self.capa_servidor.receive(canal), 2)
+            self.assertEqual(mensaje["texto"], "hola")
+            self.assertEqual(mensaje["datos"], b"\x01")
+
+        async_to_sync(escenario)()
+
+    def test_grupo_descartado_no_recibe_mensajes(self) -> None:
+        """Tras ``group_discard`` el canal no debe recibir nuevos envíos."""
+
+        async def escenario() -> None:
+            canal = await self.capa_remota.new_channel()
+            await self.capa_remota.group_add("pedido_2", canal)
+            await self.capa_remota.group_discard("pedido_2", canal)
+            await self.capa_servidor.group_send("pedido_2", {"type": "enviar_actualizacion"})
+            await self.capa_servidor.send(canal, {"type": "directo"})
+
+            mensaje = await asyncio.wait_for(self.capa_remota.receive(canal), 2)
+            self.assertEqual(mensaje["type"], "directo")
+
+        async_to_sync(escenario)()
+
+    def test_colas_sin_lectora_vencen_y_se_eliminan(self) -> None:
+        """Los mensajes de un socket que se fue sin leerlos no deben acumularse."""
+
+        capa = CapaCanalesLocal(ruta=self.ruta, expiry=0)
+        self.addCleanup(async_to_sync(capa.close))
+
+        async def esperar(condicion: Callable[[], bool]) -> None:
+            for _ in range(200):
+                if condicion():
+                    return
+                await asyncio.sleep(0.01)
+            self.fail("La condición no se cumplió a tiempo.")
+
+        async def escenario() -> None:
+            destino = await self.capa_servidor.new_channel()
+            canal = await capa.new_channel()
+            await capa.group_add("pedido_3", canal)
+            # Por la misma conexión, para que el concentrador vea antes el alta.
+            await capa.group_send("pedido_3", {"type": "enviar_actualizacion"})
+            await esperar(lambda: canal in capa._colas)
+
+            await capa.send(destino, {"type": "directo"})
+
+            self.assertNotIn(canal, capa._colas)
+            await esperar(lambda: "pedido_3" not in capa._grupos)
+
+        async_to_sync(escenario)()
+
+
+def tearDownModule() -> None:
+    # Los eventos que quedaron en el búfer pertenecen a la base de pruebas, que
+    # se destruye antes de que corra el vaciado de ``atexit``.
+    historial = obtener_historial()
+    historial.limpiar()
+    historial.temporizador = True
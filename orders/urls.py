@@ -7,6 +7,9 @@ from .views import (
     ControlPedidoVista,
     DatosEstadoPedidoVista,
     DefinirEstadoPedidoVista,
+    EventosPedidoVista,
+    ListadoPedidosVista,
+    MetricasVista,
     PanelPedidoVista,
 )
 
@@ -32,4 +35,44 @@ urlpatterns = [
         AvanceEstadoPedidoVista.as_view(),
         name="order-status-update",
     ),
+    path(
+        "metricas/",
+        MetricasVista.as_view(),
+        name="order-metrics",
+    ),
+    path(
+        "pedidos/",
+        ListadoPedidosVista.as_view(),
+        name="order-list",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/",
+        PanelPedidoVista.as_view(),
+        name="order-status-detail",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/control/",
+        ControlPedidoVista.as_view(),
+        name="order-control-detail",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/datos/",
+        DatosEstadoPedidoVista.as_view(),
+        name="order-status-data-detail",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/definir/",
+        DefinirEstadoPedidoVista.as_view(),
+        name="order-status-set-detail",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/eventos/",
+        EventosPedidoVista.as_view(),
+        name="order-events",
+    ),
+    path(
+        "pedidos/<int:pedido_id>/actualizar/",
+        AvanceEstadoPedidoVista.as_view(),
+        name="order-status-update-detail",
+    ),
 ]
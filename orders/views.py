@@ -2,18 +2,41 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 
-from typing import Any, Dict, List
-
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView, View
 
+from .metricas import obtener_metricas
 from .models import Order
 from .observador import ObservadoraCliente, SujetoPedido
-from .servicios import construir_evento_seguimiento
+from .servicios import (
+    codificar_cursor,
+    codificar_json,
+    construir_evento_seguimiento,
+    construir_mensaje_difusion,
+    decodificar_cursor,
+    nombre_grupo_pedido,
+    serializar_evento_seguimiento,
+    version_seguimiento,
+)
 
 
 def _obtener_pedido_demo() -> Order:
@@ -26,45 +49,92 @@ def _obtener_pedido_demo() -> Order:
     return pedido
 
 
+async def _aobtener_pedido_demo() -> Order:
+    """Versión asíncrona de :func:`_obtener_pedido_demo`."""
+
+    pedido, _ = await Order.objects.aget_or_create(
+        customer_name="Laura",
+        defaults={"status": Order.Status.PREPARING},
+    )
+    return pedido
+
+
+def _obtener_pedido(pedido_id: Optional[int], *campos: str) -> Order:
+    """Busca el pedido por clave primaria leyendo solo ``campos``.
+
+    Sin ``pedido_id`` se usa el pedido de demostración de las rutas originales.
+    """
+
+    if pedido_id is None:
+        return _obtener_pedido_demo()
+    return get_object_or_404(Order.objects.only(*campos), pk=pedido_id)
+
+
+async def _aobtener_pedido(pedido_id: Optional[int], *campos: str) -> Order:
+    """Versión asíncrona de :func:`_obtener_pedido`."""
+
+    if pedido_id is None:
+        return await _aobtener_pedido_demo()
+    try:
+        return await Order.objects.only(*campos).aget(pk=pedido_id)
+    except Order.DoesNotExist:
+        raise Http404("No existe el pedido solicitado.")
+
+
+# El detalle de productos de la demostración no depende del pedido: se arma una
+# sola vez al importar el módulo en lugar de en cada petición.
+_PRODUCTOS_DEMO: Tuple[Dict[str, Any], ...] = tuple(
+    {**producto, "subtotal": producto["precio"] * producto["cantidad"]}
+    for producto in (
+        {
+            "nombre": "Box de pastelería artesanal",
+            "sku": "BOX-CAFE-01",
+            "cantidad": 1,
+            "precio": 34.90,
+        },
+        {
+            "nombre": "Blend de café de especialidad 250g",
+            "sku": "CAF-AR-250",
+            "cantidad": 2,
+            "precio": 12.50,
+        },
+        {
+            "nombre": "Mermelada orgánica de frutos rojos",
+            "sku": "MER-OR-125",
+            "cantidad": 1,
+            "precio": 6.75,
+        },
+    )
+)
+_RESUMEN_PRODUCTOS: Dict[str, Any] = {
+    "productos": _PRODUCTOS_DEMO,
+    "total_pedido": sum(item["subtotal"] for item in _PRODUCTOS_DEMO),
+    "total_articulos": sum(item["cantidad"] for item in _PRODUCTOS_DEMO),
+    "moneda": "EGP",
+}
+_OPCIONES_ESTADO: Tuple[Tuple[str, str], ...] = tuple(Order.Status.choices)
+
+
 class PanelPedidoVista(TemplateView):
-    """Pantalla principal con el resumen del pedido y su seguimiento."""
+    """Pantalla principal con el resumen del pedido y su seguimiento.
+
+    La plantilla guarda en la caché ``fragmentos`` el encabezado y la tabla
+    de productos por pedido, y la línea de tiempo por pedido y versión de
+    ``updated_at``, así que un cambio de estado solo vuelve a dibujar esta.
+    """
 
     template_name = "orders/order_dashboard.html"
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         contexto = super().get_context_data(**kwargs)
-        pedido = _obtener_pedido_demo()
-        productos = [
-            {
-                "nombre": "Box de pastelería artesanal",
-                "sku": "BOX-CAFE-01",
-                "cantidad": 1,
-                "precio": 34.90,
-            },
-            {
-                "nombre": "Blend de café de especialidad 250g",
-                "sku": "CAF-AR-250",
-                "cantidad": 2,
-                "precio": 12.50,
-            },
-            {
-                "nombre": "Mermelada orgánica de frutos rojos",
-                "sku": "MER-OR-125",
-                "cantidad": 1,
-                "precio": 6.75,
-            },
-        ]
-        for producto in productos:
-            producto["subtotal"] = producto["precio"] * producto["cantidad"]
-
+        pedido = _obtener_pedido(kwargs.get("pedido_id"), "status", "updated_at")
+        contexto.update(_RESUMEN_PRODUCTOS)
         contexto.update(
             {
                 "pedido": pedido,
-                "opciones_estado": list(Order.Status.choices),
-                "productos": productos,
-                "total_pedido": sum(item["subtotal"] for item in productos),
-                "total_articulos": sum(item["cantidad"] for item in productos),
-                "moneda": "EGP",
+                "opciones_estado": _OPCIONES_ESTADO,
+                "version_estado": version_seguimiento(pedido),
+                "ttl_fragmentos": getattr(settings, "PEDIDOS_FRAGMENTOS_TTL", 300),
             }
         )
         return contexto
@@ -77,11 +147,11 @@ class ControlPedidoVista(TemplateView):
 
     def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
         contexto = super().get_context_data(**kwargs)
-        pedido = _obtener_pedido_demo()
+        pedido = _obtener_pedido(kwargs.get("pedido_id"), "customer_name", "status")
         contexto.update(
             {
                 "pedido": pedido,
-                "opciones_estado": list(Order.Status.choices),
+                "opciones_estado": _OPCIONES_ESTADO,
             }
         )
         return contexto
@@ -93,8 +163,10 @@ class AvanceEstadoPedidoVista(View):
 
     http_method_names = ["post"]
 
-    def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
-        pedido = _obtener_pedido_demo()
+    async def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        pedido = await _aobtener_pedido(
+            kwargs.get("pedido_id"), "customer_name", "status", "status_changed_at", "updated_at"
+        )
         if pedido.esta_completado():
             return JsonResponse(
                 {
@@ -111,9 +183,15 @@ class AvanceEstadoPedidoVista(View):
         observadora = ObservadoraCliente(nombre=pedido.customer_name)
         sujeto.agregar_observadora(observadora)
 
-        nuevo_estado = pedido.obtener_siguiente_estado()
-        notificaciones: List[str] = sujeto.actualizar_estado(nuevo_estado)
-        pedido.refresh_from_db(fields=["status", "updated_at"])
+        notificaciones = await sujeto.aavanzar_estado()
+        if notificaciones is None:
+            return JsonResponse(
+                {
+                    "error": "El pedido cambió mientras se procesaba la petición.",
+                    "notificaciones": [],
+                },
+                status=409,
+            )
 
         return JsonResponse(
             {
@@ -125,15 +203,186 @@ class AvanceEstadoPedidoVista(View):
         )
 
 
+def _etiqueta_entidad(version: int) -> str:
+    """Arma el ``ETag`` de un evento de seguimiento a partir de su versión."""
+
+    return f'"{version}"'
+
+
+def _respuesta_seguimiento(texto: str, version: int) -> HttpResponse:
+    """Devuelve el evento serializado con sus cabeceras de validación."""
+
+    respuesta = HttpResponse(texto, content_type="application/json")
+    respuesta["ETag"] = _etiqueta_entidad(version)
+    respuesta["Last-Modified"] = http_date(version // 1_000_000)
+    respuesta["Cache-Control"] = "no-cache"
+    return respuesta
+
+
+def _segundos_espera(request: HttpRequest) -> float:
+    """Interpreta ``?espera=`` acotándolo al máximo configurado."""
+
+    try:
+        espera = float(request.GET.get("espera", 0))
+    except ValueError:
+        return 0.0
+    maximo = getattr(settings, "PEDIDOS_ESPERA_MAXIMA", 60)
+    return max(0.0, min(espera, maximo))
+
+
+async def _esperar_cambio(pedido: Order, version: int, espera: float) -> Optional[Dict[str, Any]]:
+    """Espera en el grupo del pedido un evento más nuevo que ``version``.
+
+    Devuelve el mensaje difundido por ``SujetoPedido`` o ``None`` si se agota
+    la espera sin cambios.
+    """
+
+    capa = get_channel_layer()
+    if capa is None:
+        return None
+
+    grupo = nombre_grupo_pedido(pedido.pk)
+    canal = await capa.new_channel()
+    await capa.group_add(grupo, canal)
+    try:
+        # Se vuelve a leer después de suscribirse para no perder un cambio
+        # ocurrido entre la primera lectura y el ``group_add``.
+        actual = await Order.objects.only("status", "updated_at").aget(pk=pedido.pk)
+        if version_seguimiento(actual) != version:
+            return construir_mensaje_difusion(actual)
+
+        bucle = asyncio.get_running_loop()
+        limite = bucle.time() + espera
+        while True:
+            restante = limite - bucle.time()
+            if restante <= 0:
+                return None
+            try:
+                mensaje = await asyncio.wait_for(capa.receive(canal), restante)
+            except asyncio.TimeoutError:
+                return None
+            if "texto" in mensaje and mensaje.get("version", 0) > version:
+                return mensaje
+    finally:
+        await capa.group_discard(grupo, canal)
+
+
 class DatosEstadoPedidoVista(View):
-    """Devuelve el estado actual del pedido para la pantalla informativa."""
+    """Devuelve el estado actual del pedido para la pantalla informativa.
+
+    Responde ``304`` sin armar la carga útil cuando ``If-None-Match`` o
+    ``If-Modified-Since`` coinciden con el pedido. Con ``?espera=<segundos>``
+    la petición queda abierta hasta que cambie el estado (sondeo largo).
+    """
 
     http_method_names = ["get"]
 
-    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
-        pedido = _obtener_pedido_demo()
-        datos = construir_evento_seguimiento(pedido)
-        return JsonResponse(datos)
+    async def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        pedido = await _aobtener_pedido(kwargs.get("pedido_id"), "status", "updated_at")
+        version = version_seguimiento(pedido)
+        no_modificado = get_conditional_response(
+            request,
+            etag=_etiqueta_entidad(version),
+            last_modified=version // 1_000_000,
+        )
+        if no_modificado is None:
+            return _respuesta_seguimiento(serializar_evento_seguimiento(pedido), version)
+
+        espera = _segundos_espera(request)
+        if espera:
+            mensaje = await _esperar_cambio(pedido, version, espera)
+            if mensaje is not None:
+                return _respuesta_seguimiento(mensaje["texto"], mensaje["version"])
+        return no_modificado
+
+
+def _ultimo_evento_recibido(request: HttpRequest) -> int:
+    """Lee ``Last-Event-ID`` (o ``?ultimo=``) para reanudar un flujo de eventos."""
+
+    valor = request.headers.get("Last-Event-ID") or request.GET.get("ultimo") or 0
+    try:
+        return int(valor)
+    except ValueError:
+        return 0
+
+
+def _bloque_evento(texto: str, version: int) -> str:
+    """Da formato de Server-Sent Events a un evento de seguimiento."""
+
+    return f"id: {version}\nevent: seguimiento\ndata: {texto}\n\n"
+
+
+async def _flujo_eventos(
+    capa: Any, grupo: str, canal: str, pedido: Order, ultimo: int
+) -> AsyncIterator[str]:
+    """Produce el estado actual y luego cada cambio difundido al grupo del pedido.
+
+    Mientras no hay cambios envía un comentario cada ``PEDIDOS_SSE_LATIDO``
+    segundos para que los proxies no corten la conexión. Al desconectarse la
+    clienta se cancela la suscripción al grupo.
+    """
+
+    latido = getattr(settings, "PEDIDOS_SSE_LATIDO", 15.0)
+    try:
+        yield f"retry: {getattr(settings, 'PEDIDOS_SSE_REINTENTO_MS', 3000)}\n\n"
+        version = version_seguimiento(pedido)
+        if version > ultimo:
+            ultimo = version
+            yield _bloque_evento(serializar_evento_seguimiento(pedido), version)
+        if capa is None:
+            return
+
+        while True:
+            try:
+                mensaje = await asyncio.wait_for(capa.receive(canal), latido)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            texto = mensaje.get("texto")
+            version = mensaje.get("version", 0)
+            if texto is None or version <= ultimo:
+                continue
+            ultimo = version
+            yield _bloque_evento(texto, version)
+    finally:
+        if capa is not None:
+            await capa.group_discard(grupo, canal)
+
+
+class EventosPedidoVista(View):
+    """Transmite el seguimiento del pedido como Server-Sent Events.
+
+    Alternativa para clientas cuyos proxies bloquean WebSocket. Se suscribe al
+    mismo grupo ``pedido_{pk}`` que el consumidor y usa la versión del evento
+    como ``id``, de modo que el navegador reanuda con ``Last-Event-ID`` sin
+    repetir eventos ya recibidos.
+    """
+
+    http_method_names = ["get"]
+
+    async def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        pedido_id = kwargs["pedido_id"]
+        capa = get_channel_layer()
+        grupo = nombre_grupo_pedido(pedido_id)
+        canal = ""
+        if capa is not None:
+            # Suscribirse antes de leer evita perder un cambio intermedio.
+            canal = await capa.new_channel()
+            await capa.group_add(grupo, canal)
+        try:
+            pedido = await _aobtener_pedido(pedido_id, "status", "updated_at")
+        except Http404:
+            if capa is not None:
+                await capa.group_discard(grupo, canal)
+            raise
+
+        respuesta = StreamingHttpResponse(
+            _flujo_eventos(capa, grupo, canal, pedido, _ultimo_evento_recibido(request)),
+            content_type="text/event-stream",
+        )
+        respuesta["Cache-Control"] = "no-cache"
+        respuesta["X-Accel-Buffering"] = "no"
+        return respuesta
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -142,15 +391,17 @@ class DefinirEstadoPedidoVista(View):
 
     http_method_names = ["post"]
 
-    def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
-        pedido = _obtener_pedido_demo()
+    async def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        pedido = await _aobtener_pedido(
+            kwargs.get("pedido_id"), "customer_name", "status", "status_changed_at", "updated_at"
+        )
         try:
             datos = json.loads(request.body or "{}")
         except json.JSONDecodeError:
             datos = {}
         nuevo_estado = datos.get("estado")
 
-        if nuevo_estado not in dict(Order.Status.choices):
+        if nuevo_estado not in Order.ESTADOS_VALIDOS:
             return JsonResponse(
                 {
                     "error": "El estado recibido no es válido.",
@@ -162,8 +413,7 @@ class DefinirEstadoPedidoVista(View):
         observadora = ObservadoraCliente(nombre=pedido.customer_name)
         sujeto.agregar_observadora(observadora)
 
-        notificaciones: List[str] = sujeto.actualizar_estado(nuevo_estado)
-        pedido.refresh_from_db(fields=["status", "updated_at"])
+        notificaciones: List[str] = await sujeto.aactualizar_estado(nuevo_estado)
 
         respuesta = construir_evento_seguimiento(pedido)
         respuesta.update(
@@ -172,3 +422,104 @@ class DefinirEstadoPedidoVista(View):
             }
         )
         return JsonResponse(respuesta)
+
+
+class ListadoPedidosVista(View):
+    """Lista los pedidos del más reciente al más antiguo con paginación por cursor.
+
+    ``?estado=`` filtra por estado y ``?cursor=`` continúa desde la última fila
+    de la página anterior. Cada página es una sola consulta que recorre el
+    índice ``(status, -created_at, -id)`` sin ``OFFSET``, por lo que su costo no
+    crece con la profundidad.
+    """
+
+    http_method_names = ["get"]
+
+    async def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        estado = request.GET.get("estado")
+        if estado is not None and estado not in Order.ESTADOS_VALIDOS:
+            return JsonResponse({"error": "El estado recibido no es válido."}, status=400)
+
+        try:
+            limite = int(request.GET.get("limite", 0)) or getattr(
+                settings, "PEDIDOS_LISTADO_LIMITE", 50
+            )
+        except ValueError:
+            return JsonResponse({"error": "El límite recibido no es válido."}, status=400)
+        limite = max(1, min(limite, getattr(settings, "PEDIDOS_LISTADO_LIMITE_MAXIMO", 200)))
+
+        consulta = Order.objects.order_by("-created_at", "-id")
+        if estado is not None:
+            consulta = consulta.filter(status=estado)
+        cursor = request.GET.get("cursor")
+        if cursor:
+            try:
+                creado, pedido_id = decodificar_cursor(cursor)
+            except ValueError:
+                return JsonResponse({"error": "El cursor recibido no es válido."}, status=400)
+            # El ``created_at__lte`` acota el rango del índice; el ``Q`` desempata por id.
+            consulta = consulta.filter(
+                Q(created_at__lt=creado) | Q(created_at=creado, id__lt=pedido_id),
+                created_at__lte=creado,
+            )
+
+        filas = [
+            fila
+            async for fila in consulta.values_list(
+                "id", "customer_name", "status", "created_at"
+            )[: limite + 1]
+        ]
+        siguiente = None
+        if len(filas) > limite:
+            del filas[limite:]
+            siguiente = codificar_cursor(filas[-1][3], filas[-1][0])
+
+        return HttpResponse(
+            codificar_json(
+                {
+                    "pedidos": [
+                        {
+                            "id": pedido_id,
+                            "cliente": cliente,
+                            "estado": estado_pedido,
+                            "creado": creado.isoformat(),
+                        }
+                        for pedido_id, cliente, estado_pedido, creado in filas
+                    ],
+                    "siguiente": siguiente,
+                }
+            ),
+            content_type="application/json",
+        )
+
+
+class MetricasVista(View):
+    """Expone las métricas del observador en el formato de texto de Prometheus.
+
+    Con ``?formato=json`` devuelve la misma instantánea en JSON, que es lo
+    que lee el comando ``metricas``. Las métricas son del proceso que atiende
+    la petición y solo se sirven al personal o a las direcciones de
+    ``PEDIDOS_METRICAS_DIRECCIONES``.
+    """
+
+    http_method_names = ["get"]
+
+    async def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        direcciones = getattr(settings, "PEDIDOS_METRICAS_DIRECCIONES", ("127.0.0.1", "::1"))
+        if request.META.get("REMOTE_ADDR") not in direcciones:
+            usuario = await request.auser()
+            if not usuario.is_staff:
+                return JsonResponse(
+                    {"error": "Las métricas solo están disponibles para el personal."},
+                    status=403,
+                )
+
+        metricas = obtener_metricas()
+        if request.GET.get("formato") == "json":
+            return HttpResponse(
+                codificar_json(metricas.instantanea()), content_type="application/json"
+            )
+        return HttpResponse(
+            metricas.exportar_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -1,5 +1,7 @@
 """Django settings for patrones project."""
 
+import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,13 +52,47 @@ TEMPLATES = [
 WSGI_APPLICATION = 'patrones.wsgi.application'
 ASGI_APPLICATION = 'patrones.asgi.application'
 
-DATABASES = {
-    'default': {
+# Perfil de la base elegido con PEDIDOS_PERFIL_BASE:
+# - "desarrollo": SQLite con los valores por defecto de Django.
+# - "produccion": conexiones persistentes con chequeo de salud, espera de
+#   20 s ante bloqueos y transacciones IMMEDIATE, para que dos escritoras no
+#   se bloqueen al pasar de lectura a escritura. Los PRAGMA de cada conexión
+#   (WAL y synchronous=NORMAL) se aplican en ``orders.base_datos``.
+PEDIDOS_PERFIL_BASE = os.environ.get('PEDIDOS_PERFIL_BASE', 'desarrollo')
+
+PERFILES_BASE_DISPONIBLES = {
+    'desarrollo': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'produccion': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('PEDIDOS_BASE_RUTA', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+
+PRAGMAS_SQLITE_POR_PERFIL = {
+    'desarrollo': {},
+    'produccion': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -20000,
+        'temp_store': 'MEMORY',
+    },
+}
+
+DATABASES = {
+    'default': PERFILES_BASE_DISPONIBLES[PEDIDOS_PERFIL_BASE],
 }
 
+PEDIDOS_SQLITE_PRAGMAS = PRAGMAS_SQLITE_POR_PERFIL[PEDIDOS_PERFIL_BASE]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -79,10 +115,133 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Capa de canales elegida con PEDIDOS_CAPA_CANALES:
+# - "memoria": un solo proceso (desarrollo y pruebas).
+# - "local": varios procesos ASGI en el mismo equipo mediante un socket Unix.
+# - "redis": varios equipos; requiere channels_redis y REDIS_URL.
+PEDIDOS_CAPA_CANALES = os.environ.get('PEDIDOS_CAPA_CANALES', 'memoria')
+
+# Mensajes que admite cada canal antes de descartar. Un socket de
+# ``ws/pedidos/`` recibe por un solo canal los cambios de todos sus pedidos,
+# así que debe alcanzar para un lote que los cambie a todos a la vez
+# (PEDIDOS_MULTIPLEX_MAXIMO). Los consumidores vacían su canal aunque la
+# clienta no lea, por lo que no se acumula.
+CAPACIDAD_CANALES = 1000
+
+CAPAS_CANALES_DISPONIBLES = {
+    'memoria': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'CONFIG': {
+            'capacity': CAPACIDAD_CANALES,
+        },
+    },
+    'local': {
+        'BACKEND': 'orders.capa_local.CapaCanalesLocal',
+        'CONFIG': {
+            'ruta': os.environ.get('PEDIDOS_CAPA_RUTA'),
+            'capacity': CAPACIDAD_CANALES,
+        },
+    },
+    'redis': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')],
+            'capacity': CAPACIDAD_CANALES,
+        },
+    },
+}
+
 CHANNEL_LAYERS = {
+    'default': CAPAS_CANALES_DISPONIBLES[PEDIDOS_CAPA_CANALES],
+}
+
+# Caché de los fragmentos del panel elegida con PEDIDOS_CACHE_FRAGMENTOS:
+# - "memoria": propia de cada proceso.
+# - "archivo": compartida por los procesos del equipo en PEDIDOS_CACHE_RUTA.
+PEDIDOS_CACHE_FRAGMENTOS = os.environ.get('PEDIDOS_CACHE_FRAGMENTOS', 'memoria')
+
+CACHES_FRAGMENTOS_DISPONIBLES = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pedidos-fragmentos',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'archivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'PEDIDOS_CACHE_RUTA', os.path.join(tempfile.gettempdir(), 'patrones-fragmentos')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+CACHES = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragmentos': CACHES_FRAGMENTOS_DISPONIBLES[PEDIDOS_CACHE_FRAGMENTOS],
 }
 
+# Segundos que vive cada fragmento del panel. Las claves incluyen la versión
+# del pedido, así que un cambio de estado nunca lee un fragmento viejo.
+PEDIDOS_FRAGMENTOS_TTL = 300
+
+# Difunde los cambios de estado desde una bandeja en segundo plano, después
+# de confirmar la transacción, en lugar de hacerlo dentro de la petición. El
+# vaciado corre en el bucle del servidor ASGI, el mismo de los consumidores.
+PEDIDOS_DIFUSION_DIFERIDA = False
+PEDIDOS_BANDEJA_CAPACIDAD = 1000
+
+# Caché en memoria del último evento de seguimiento de cada pedido, usada para
+# el primer mensaje de los sockets que se conectan.
+PEDIDOS_INSTANTANEAS_CAPACIDAD = 10000
+PEDIDOS_INSTANTANEAS_TTL = 30.0
+
+# Tope en segundos para el sondeo largo de ``datos/?espera=``.
+PEDIDOS_ESPERA_MAXIMA = 60
+
+# Segundos entre comentarios de latido del flujo ``eventos/`` y espera que se
+# sugiere al navegador antes de reconectarse.
+PEDIDOS_SSE_LATIDO = 15.0
+PEDIDOS_SSE_REINTENTO_MS = 3000
+
+# Tamaño de página por defecto y máximo del listado ``pedidos/``.
+PEDIDOS_LISTADO_LIMITE = 50
+PEDIDOS_LISTADO_LIMITE_MAXIMO = 200
+
+# El historial de estados se inserta en lotes de este tamaño o, como tarde,
+# cuando el evento pendiente más antiguo supera el intervalo en segundos.
+PEDIDOS_HISTORIAL_LOTE = 100
+PEDIDOS_HISTORIAL_INTERVALO = 1.0
+# Veces que un lote que no se pudo insertar vuelve al búfer antes de descartarse.
+PEDIDOS_HISTORIAL_REINTENTOS = 3
+
+# ``secuencial`` notifica a las observadoras una tras otra; ``concurrente`` las
+# lanza a la vez (hilos acotados o tareas asíncronas) con un tiempo máximo
+# por observadora, que cada una puede ajustar con su atributo ``tiempo_maximo``.
+PEDIDOS_DESPACHO_OBSERVADORAS = "secuencial"
+PEDIDOS_OBSERVADORAS_HILOS = 8
+PEDIDOS_OBSERVADORAS_TIEMPO_MAXIMO = 5.0
+
+# Notificaciones que conserva cada ``ObservadoraClienteCompacta``.
+PEDIDOS_NOTIFICACIONES_MAXIMO = 50
+
+# Cada socket de seguimiento guarda solo el último estado sin enviar de cada
+# pedido y se cierra si una escritura o el atraso duran más de estos segundos.
+# Solo actúa si el servidor hace esperar a ``send`` (Uvicorn); en Daphne los
+# envíos nunca esperan, se acumulan en el búfer de Twisted y esto no hace nada.
+PEDIDOS_CONSUMIDOR_ATRASO_MAXIMO = 10.0
+
+# Pedidos que puede seguir a la vez un socket de ``ws/pedidos/``.
+PEDIDOS_MULTIPLEX_MAXIMO = 1000
+
+# Histogramas por etapa del observador expuestos en ``metricas/``. En falso,
+# las rutas instrumentadas no leen el reloj ni toman cerrojos.
+PEDIDOS_METRICAS = True
+
+# Direcciones que pueden leer ``metricas/`` sin sesión de personal, como el
+# comando ``metricas`` o un recolector de Prometheus en el mismo equipo. Detrás
+# de un proxy inverso todas las peticiones llegan desde él: conviene vaciarla.
+PEDIDOS_METRICAS_DIRECCIONES = ["127.0.0.1", "::1"]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'